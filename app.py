@@ -1,114 +1,71 @@
 import streamlit as st
 import os
 import time
-import asyncio
-import random
-import json
+import uuid
+from background_cache import store_upload
 from logic_core import CryptoBrain
-from stream_engine import text_to_speech, start_stream, create_preview_video, get_audio_duration, trim_audio_silence
+from pipeline import BroadcastPipeline, DB_FILE, save_db
+from knowledge_base import get_knowledge_base
+from monitor_log import MonitorLog, MONITOR_DIR
+from daemon import read_status, send_command, load_config
+from control_api import control_request
+from stream_engine import read_playable_prefix
 
 # --- 初始化环境 ---
 os.makedirs("assets", exist_ok=True)
 os.makedirs("temp", exist_ok=True)
 os.makedirs("archive_videos", exist_ok=True)
-DB_FILE = "knowledge_db.json"
 
 st.set_page_config(page_title="Crypto Beauty Ultimate", page_icon="🎙️", layout="wide")
 
-# --- 数据库操作 (CMS) ---
-def load_db():
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, "r", encoding='utf-8') as f: 
-            return json.load(f)
-    return ["科普：比特币减半效应", "故事：披萨节的历史", "教学：如何保管私钥"]
-
-def save_db(topics):
-    with open(DB_FILE, "w", encoding='utf-8') as f: 
-        json.dump(topics, f, ensure_ascii=False)
-
-# --- 🔥 优化的字幕生成算法 (核心修复点) ---
-def generate_srt(text, audio_duration, output_path, start_offset=0.0):
-    """
-    将长文案切分为 SRT 字幕
-    🔥 核心修复：基于实际音频时长，而非估算语速
-    🔥 新增：起始偏移，解决字幕语音不同步问题
-    """
-    # 预处理：移除换行，变成一长串
-    full_text = text.replace("\n", " ").replace("  ", " ").strip()
-    
-    # 统计总字数
-    total_chars = len(full_text)
-    if total_chars == 0:
-        print("⚠️ 文本为空，无法生成字幕")
-        return False
-    
-    # 🔥 核心算法：基于真实音频时长计算实际语速
-    actual_speed = total_chars / audio_duration  # 真实的字/秒
-    print(f"📊 字幕同步参数: 总字数={total_chars}, 音频时长={audio_duration:.2f}s, 实际语速={actual_speed:.2f}字/秒")
-    
-    # 切分策略：智能断句，优先按标点，其次按长度
-    segments = []
-    current_seg = ""
-    
-    for i, char in enumerate(full_text):
-        current_seg += char
-        # 强断句标点
-        if char in ["。", "！", "？", ";"]:
-            if current_seg.strip():
-                segments.append(current_seg.strip())
-            current_seg = ""
-        # 弱断句标点（但只在字数超过8时才断）
-        elif char in ["，", ","] and len(current_seg) >= 8:
-            if current_seg.strip():
-                segments.append(current_seg.strip())
-            current_seg = ""
-        # 长度限制：超过18字强制断句
-        elif len(current_seg) >= 18:
-            if current_seg.strip():
-                segments.append(current_seg.strip())
-            current_seg = ""
-            
-    if current_seg.strip(): 
-        segments.append(current_seg.strip())
-    
-    if len(segments) == 0:
-        print("⚠️ 切分后无有效字幕段")
-        return False
-    
-    # 计算每个片段的字数占比，按比例分配时间
-    total_seg_chars = sum(len(seg) for seg in segments)
-    
-    # 写入 SRT 文件
-    with open(output_path, "w", encoding="utf-8") as f:
-        start_time = start_offset  # 🔥 起始偏移，补偿音频开头静音
-        for i, seg in enumerate(segments):
-            # 按字数占比分配时间
-            seg_char_ratio = len(seg) / total_seg_chars
-            duration = audio_duration * seg_char_ratio
-            
-            # 🔥 动态调整最短显示时间：短句1.5秒，长句2.5秒
-            min_duration = 1.5 if len(seg) <= 10 else 2.0
-            
-            # 但不能超过实际剩余时间
-            remaining_time = audio_duration - (start_time - start_offset)
-            if remaining_time > 0:
-                duration = max(min_duration, min(duration, remaining_time / (len(segments) - i)))
-            else:
-                duration = min_duration
-            
-            end_time = start_time + duration
-            
-            # SRT 时间格式 00:00:00,000
-            def fmt(t):
-                h, r = divmod(t, 3600)
-                m, s = divmod(r, 60)
-                return f"{int(h):02}:{int(m):02}:{int(s):02},{int((t%1)*1000):03}"
-            
-            f.write(f"{i+1}\n{fmt(start_time)} --> {fmt(end_time)}\n{seg}\n\n")
-            start_time = end_time
-    
-    print(f"✅ 字幕生成完成: {len(segments)} 行，总时长 {audio_duration:.2f}s，起始偏移 {start_offset:.2f}s")
-    return True
+
+# --- 缓存资源 ---
+# 🔥 Streamlit 每次点控件都会把整个脚本重跑一遍：大脑放进缓存，重跑时不重建
+# （话题库本身就是进程内共享的 knowledge_base 实例，带内存索引，不用再缓存一层）
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_brain(deepseek_key, tavily_key, topic, persona, target_domains):
+    """同一组 Key / 关键词 / 人设 / 信源只建一次，重复点启动直接复用（话题库由 setup 挂上）"""
+    return CryptoBrain(deepseek_key, tavily_key, topic, persona, [], target_domains)
+
+
+HISTORY_ROWS = 10       # 日志区顶部显示最近几轮的一行摘要
+PARTIAL_REDRAW_SECONDS = 30   # 快速试听边编边播时，播放器最多 30 秒换一次新片段
+
+
+def round_line(summary):
+    """一轮摘要 → 一行文字"""
+    status = "⏳" if "ok" not in summary else ("✅" if summary["ok"] else "❌")
+    parts = [f"{status} 第 {summary['round']} 轮", time.strftime("%H:%M", time.localtime(summary["started_at"]))]
+    if summary.get("kind"):
+        parts.append({"ai": "AI 节目", "replay": "插播老视频", "none": "无内容"}.get(summary["kind"], summary["kind"]))
+    if summary.get("duration"):
+        parts.append(f"{summary['duration']:.0f}s")
+    if summary.get("chars"):
+        parts.append(f"{summary['chars']} 字" + ("（备用话题）" if summary.get("backup") else ""))
+    if summary.get("error"):
+        parts.append(summary["error"][:80])
+    return " | ".join(parts)
+
+
+@st.fragment
+def round_history(monitor_log):
+    """最近几轮的文案 / 错误堆栈：选中某一轮才从磁盘读全文"""
+    rounds = [r for r in monitor_log.rounds() if r["details"]]
+    if not rounds:
+        return
+    with st.expander(f"📜 历史记录（最近 {len(rounds)} 轮的文案 / 错误详情）"):
+        labels = {round_line(r): r for r in reversed(rounds)}
+        choice = st.selectbox("选择轮次", list(labels), index=None, placeholder="选中后才读取全文")
+        if choice:
+            for kind, path in labels[choice]["details"].items():
+                text = MonitorLog.load_detail(path)
+                if text is None:
+                    st.caption(f"{path} 已被清理")
+                elif kind == "traceback":
+                    st.code(text, language="python")
+                else:
+                    st.write(text)
+
 
 # --- UI 界面构建 ---
 st.title("🎙️ 加密大漂亮 | 全自动 AI 直播中控台 (Ultimate)")
@@ -118,6 +75,8 @@ with st.sidebar:
     deepseek_key = st.text_input("DeepSeek Key", type="password")
     tavily_key = st.text_input("Tavily Key", type="password")
     yt_key = st.text_input("YouTube 推流码", type="password")
+    extra_outputs = st.text_area("额外推流地址 (每行一个，可选)", "",
+        help="备用 ingest、第二平台 RTMP 或本地录制文件 (如 archive_videos/live.flv)；只编码一次，各路独立重连")
     
     st.header("🌐 信息源控制 (SOP)")
     target_domains = st.text_area("指定新闻来源 (逗号分隔)", 
@@ -126,12 +85,26 @@ with st.sidebar:
     
     st.header("🎛️ 运行模式")
     mode = st.radio("选择模式", ["🛠️ 试听 (生成预览视频)", "📡 直播 (24H无限循环)"])
+    if "试听" in mode:
+        preview_full = st.toggle("试听用原画质渲染", value=False,
+            help="默认 360p / 12fps 快速代理，编出一部分就能先播；调好人设和音色后再用原画质确认")
+        preview_seconds = st.number_input("只渲染开头 N 秒 (0 = 整段)", 0, 1800, 0, step=15)
+        preview_sentences = st.text_input("只渲染第几句 (可选)", "", placeholder="如 3 或 2-5",
+            help="按字幕句末标点数句子，优先于上面的秒数")
+    else:
+        preview_full, preview_seconds, preview_sentences = False, 0, ""
     
     st.header("⚙️ 策略设置")
     topic = st.text_input("监控关键词", "Bitcoin, Ethereum, Solana, AI Agent")
     interval = st.slider("轮播间隔 (秒)", 30, 600, 120, help="播完一条休息多久")
     allow_replay = st.checkbox("允许插播老视频 (防冷场)", value=True)
     old_video_chance = st.slider("老视频插播概率 (%)", 0, 100, 30, help="无新闻时播放历史视频的概率")
+    archive_live = st.checkbox("直播内容自动存档", value=False,
+        help="AI 节目推流时同时录制到 archive_videos/，直接复用直播编码，不额外转码")
+    prerender_backup = st.checkbox("空闲时预渲染备用话题", value=True,
+        help="后台提前把 CMS 话题做成文案 + 语音 + 字幕成品，没有新闻时秒级开播")
+    prerender_video = st.checkbox("预渲染时同时烧录字幕视频", value=False,
+        help="更吃 CPU 和磁盘，只在前台空闲时渲染")
     
     st.header("🎤 语音设置")
     voice_option = st.selectbox(
@@ -155,13 +128,40 @@ with st.sidebar:
 tab1, tab2 = st.tabs(["📡 运行监视器", "📚 备用话题管理 (CMS)"])
 
 # === Tab 2: CMS 后台 ===
-with tab2:
-    st.subheader("当搜不到 24H 新闻时，随机聊以下话题：")
-    curr_topics = load_db()
-    edited = st.data_editor([{"topic": t} for t in curr_topics], num_rows="dynamic", width="stretch")
+@st.fragment
+def topic_manager():
+    """话题库编辑器：打开开关才读库、建表格；在 fragment 里编辑 / 保存只重跑这一块"""
+    if not st.toggle("📂 编辑话题库", key="cms_open", help="打开后才加载话题库，平时刷新页面不读文件、不建表格"):
+        st.caption("当搜不到 24H 新闻时，会随机聊话题库里的话题；打开上方开关进行编辑")
+        return
+    st.subheader("当搜不到 24H 新闻时，按权重轮流聊以下话题（最近聊过的不会马上重复）：")
+    kb = get_knowledge_base(DB_FILE)
+    rows = [{"topic": r["topic"], "tags": r["tags"], "weight": r["weight"], "air_count": r["air_count"],
+             "last_aired": time.strftime("%m-%d %H:%M", time.localtime(r["last_aired"])) if r["last_aired"] else "",
+             "prerendered": bool(r["asset"])} for r in kb.rows()]
+    edited = st.data_editor(rows, num_rows="dynamic", width="stretch", column_config={
+        "topic": st.column_config.TextColumn("话题", required=True),
+        "tags": st.column_config.TextColumn("标签", help="逗号分隔"),
+        "weight": st.column_config.NumberColumn("权重", min_value=0.0, step=0.5, default=1.0,
+                                                help="越大越容易被抽到；0 = 暂停"),
+        "air_count": st.column_config.NumberColumn("已播", disabled=True),
+        "last_aired": st.column_config.TextColumn("上次播出", disabled=True),
+        "prerendered": st.column_config.CheckboxColumn("成品", disabled=True),
+    })
     if st.button("💾 保存话题库"):
-        save_db([r["topic"] for r in edited if r["topic"]])
-        st.success("知识库已更新！")
+        # 只增删改有变化的话题，播出记录和预渲染成品都保留
+        changes = save_db(edited)
+        if "prerender_pool" in st.session_state:
+            # 立即补齐新话题、清理已删除话题的成品
+            st.session_state["prerender_pool"].wake()
+        st.success(f"知识库已更新！新增 {changes['added']} / 删除 {changes['removed']} / 修改 {changes['updated']}")
+    if "prerender_pool" in st.session_state:
+        ready = st.session_state["prerender_pool"].ready_segments()
+        st.caption(f"🧩 已预渲染 {len(ready)} / {len(rows)} 个话题，可直接播出")
+
+
+with tab2:
+    topic_manager()
 
 # === Tab 1: 运行前台 ===
 with tab1:
@@ -171,224 +171,262 @@ with tab1:
     with col2: 
         log_box = st.empty() # 日志区
         status_box = st.empty() # 状态区
+        encoder_box = st.empty() # 编码器实时数据
         start_btn = st.button("🚀 启动系统", type="primary", width="stretch")
 
+    _last_encoder_draw = [0.0]
+
+    # 监视器日志跨页面刷新保留（容量固定），每个浏览器会话一个目录，互不清理
+    if "monitor_log" not in st.session_state:
+        st.session_state["monitor_log"] = MonitorLog(log_dir=os.path.join(MONITOR_DIR, uuid.uuid4().hex[:8]))
+    monitor_log = st.session_state["monitor_log"]
+
+    def render_encoder_stats(snap):
+        """FFmpeg 实时进度回调（节流：最多每 2 秒重绘一次）"""
+        if time.time() - _last_encoder_draw[0] < 2:
+            return
+        _last_encoder_draw[0] = time.time()
+        speed = snap.get("speed_now") or snap.get("speed") or 0
+        with encoder_box.container():
+            c1, c2, c3 = st.columns(3)
+            c1.metric("编码 FPS", f"{snap.get('fps', 0):.1f}")
+            c2.metric("速度", f"{speed:.2f}x")
+            c3.metric("码率", snap.get("bitrate", "N/A"))
+            percent = f" | 进度 {snap['percent']:.0f}%" if "percent" in snap else ""
+            st.caption(f"⚙️ preset={snap['preset']} / {snap['video_bitrate']} | 重启 {snap['restarts']} 次{percent}")
+
+    # 🛰️ 后台守护进程在跑时，这个页面就是它的监控 / 控制台
+    daemon_status = read_status()
+    if daemon_status:
+        with st.expander(f"🛰️ 后台守护进程运行中 (PID {daemon_status['pid']})", expanded=True):
+            d1, d2, d3, d4 = st.columns(4)
+            d1.metric("状态", "⏸️ 已暂停" if daemon_status["paused"] else daemon_status["state"])
+            d2.metric("轮次", daemon_status["round"])
+            d3.metric("成功", daemon_status["success"])
+            d4.metric("错误", daemon_status["error"])
+            if daemon_status.get("encoder"):
+                enc = daemon_status["encoder"]
+                st.caption(f"⚙️ {enc.get('fps', 0):.1f} fps | {enc.get('speed_now') or enc.get('speed') or 0:.2f}x | "
+                           f"{enc.get('bitrate', 'N/A')} | preset={enc.get('preset')}")
+            st.caption(f"最近事件: {daemon_status.get('last_event')}")
+            b1, b2, b3, b4 = st.columns(4)
+            if b1.button("⏸️ 暂停", disabled=daemon_status["paused"]):
+                send_command("pause")
+            if b2.button("▶️ 继续", disabled=not daemon_status["paused"]):
+                send_command("resume")
+            if b3.button("⏭️ 跳过当前"):
+                send_command("skip")
+            if b4.button("⏹️ 停止服务"):
+                send_command("stop")
+            if daemon_status.get("control_url"):
+                # 🔥 热更新：不用停服务重启，下一条开始前换上，推流不断
+                # 令牌可选；只写在守护进程 --config 里的令牌页面读不到，这时让用户手动填
+                control_token = load_config().get("control_token", "")
+                if daemon_status.get("control_auth") and not control_token:
+                    control_token = st.text_input("🔑 控制接口令牌", type="password",
+                                                  help="守护进程设置了 control_token，环境变量里没有 CONTROL_TOKEN")
+                if st.button("⚡ 把侧边栏的关键词 / 信源 / 音色 / 间隔 / 插播设置应用到守护进程"):
+                    changes = {"topic": topic, "target_domains": target_domains, "voice": selected_voice,
+                               "interval": interval, "allow_replay": allow_replay, "old_video_chance": old_video_chance}
+                    if daemon_status.get("control_auth") and not control_token:
+                        st.warning("⚠️ 守护进程的控制接口需要令牌，请先填写")
+                    else:
+                        try:
+                            control_request(daemon_status["control_url"], "/config", changes, token=control_token)
+                            st.success("✅ 已提交，下一条开始前生效")
+                        except RuntimeError as e:
+                            st.error(f"❌ 热更新失败: {e}")
+
+    round_history(monitor_log)
+
     if start_btn:
-        # 1. 基础环境检查
-        if not deepseek_key or not tavily_key:
-            st.error("❌ 错误：请填入 DeepSeek 和 Tavily Key")
+        if daemon_status and daemon_status["mode"] == "live" and "直播" in mode:
+            st.error("❌ 后台守护进程已经在推流，请先停止服务，避免同一推流码重复推流")
             st.stop()
-        
+
         video_path = "assets/background.mp4"
         if bg_file:
-            with open(video_path, "wb") as f: 
-                f.write(bg_file.getbuffer())
-            
-        if not os.path.exists(video_path):
-            st.error("❌ 错误：请上传背景视频")
-            st.stop()
+            # 内容没变就不重写
+            store_upload(bg_file.getbuffer(), video_path)
 
-        # 2. 初始化大脑
-        db_topics = load_db()
-        persona_prompt = """你是"加密大漂亮"，一位专业的加密货币播客主持人。
-你的风格：知性、犀利、专业、带点幽默、拒绝模棱两可。
-你像真人在聊天八卦，严禁"播音腔"或"念通稿"。
-你的任务是将新闻进行深度分析，给出独到见解，而不是简单复述。"""
-        
-        brain = CryptoBrain(deepseek_key, tavily_key, topic, persona_prompt, db_topics, target_domains)
-        
-        is_preview = "试听" in mode
-        is_live = "直播" in mode
-        
-        # 3. 主循环统计
-        round_count = 0
-        success_count = 0
-        error_count = 0
-        
-        # 🔥 核心修复：真正的无限循环
-        while True:
-            round_count += 1
-            
-            try:
-                with log_box.container():
-                    st.info(f"🔄 第 {round_count} 轮 | 正在全网搜寻 24H 内的新闻...")
-                    
-                    # 更新状态
-                    with status_box.container():
-                        st.metric("运行轮次", round_count)
-                        col_a, col_b = st.columns(2)
-                        col_a.metric("成功", success_count)
-                        col_b.metric("错误", error_count)
-                    
-                    # A. 思考与写稿
-                    script, err, is_backup = brain.fetch_news_and_analyze()
-                    
-                    # B. 决策：是否插播老视频
-                    play_old_video = False
-                    final_video_file = None
-                    
-                    if is_backup and allow_replay:
-                        local_videos = [f for f in os.listdir("archive_videos") if f.endswith(".mp4")]
-                        if local_videos and random.random() * 100 < old_video_chance:
-                            play_old_video = True
-                            chosen = random.choice(local_videos)
-                            final_video_file = os.path.join("archive_videos", chosen)
-                            st.warning(f"📼 无热点新闻，随机插播历史视频：{chosen}")
-
-                    # C. 执行播放/生成
-                    if play_old_video:
-                        if is_preview:
-                            monitor.video(final_video_file)
-                            st.success("✅ 预览播放了老视频")
-                            success_count += 1
-                            # 🔥 试听模式：只播一次就退出循环
-                            st.info("试听模式完成，停止运行")
-                            break
-                        else:
-                            # 直播模式：推流老视频
-                            if yt_key:
-                                monitor.image("https://via.placeholder.com/800x450/FF0000/FFFFFF?text=LIVE+ON+AIR", 
-                                            caption="🔴 推流中...", use_column_width=True)
-                                result = start_stream(yt_key, final_video_file, is_direct_file=True)
-                                if result:
-                                    st.success("✅ 历史视频推流完成")
-                                    success_count += 1
-                                else:
-                                    st.error("❌ 推流失败")
-                                    error_count += 1
-                            else:
-                                st.error("❌ 缺少推流码")
-                                error_count += 1
-                    
-                    elif script:
-                        st.success("📝 深度文案已生成 (SOP框架+去废话)")
-                        with st.expander("查看文案详情"): 
-                            st.write(script)
-                        
-                        st.write("🗣️ 合成晓晓语音...")
-                        ts = int(time.time())
-                        audio_path = f"temp/s_{ts}.mp3"
-                        srt_path = f"temp/s_{ts}.srt"
-                        
-                        # 生成语音（使用SSML优化）
-                        asyncio.run(text_to_speech(script, audio_path, use_ssml=True))
-                        
-                        # 🔥 去除音频开头和结尾的静音
-                        st.write("✂️ 优化音频（去除静音）...")
-                        audio_path = trim_audio_silence(audio_path, audio_path.replace('.mp3', '_clean.mp3'))
-                        
-                        # 🔥 获取音频真实时长和静音偏移
-                        result = get_audio_duration(audio_path)
-                        if result and len(result) == 2:
-                            audio_duration, start_silence = result
-                        else:
-                            audio_duration = result if result else len(script) / 3.2
-                            start_silence = 0.0
-                        
-                        if audio_duration:
-                            st.info(f"⏱️ 音频时长: {audio_duration:.2f} 秒 ({int(audio_duration//60)}分{int(audio_duration%60)}秒) | 起始偏移: {start_silence:.2f}s")
-                        else:
-                            st.warning(f"⚠️ 使用估算时长: {audio_duration:.2f}s")
-                        
-                        # 🔥 基于真实时长和偏移生成字幕
-                        st.write("🔥 生成精确同步字幕...")
-                        srt_success = generate_srt(script, audio_duration, srt_path, start_offset=start_silence)
-                        
-                        if not srt_success:
-                            st.error("❌ 字幕生成失败")
-                            error_count += 1
-                            # 继续下一轮，不中断
-                            if is_live:
-                                time.sleep(10)
-                                continue
-                            else:
-                                break
-                        
-                        if is_preview:
-                            # 试听模式：生成预览视频
-                            preview_file = f"temp/p_{ts}.mp4"
-                            st.write("🎬 合成预览视频（带硬字幕）...")
-                            final = create_preview_video(video_path, audio_path, srt_path, preview_file)
-                            if final: 
-                                monitor.video(final)
-                                st.balloons()
-                                st.success("✅ 预览视频生成完成！")
-                                success_count += 1
-                            else:
-                                st.error("❌ 视频合成失败")
-                                error_count += 1
-                            # 🔥 试听模式：播完就退出
-                            st.info("试听模式完成，停止运行")
-                            break
-                        else:
-                            # 直播模式：推流
-                            if yt_key:
-                                st.warning("📡 直播中 (带硬字幕)...")
-                                monitor.image("https://via.placeholder.com/800x450/FF0000/FFFFFF?text=LIVE+ON+AIR", 
-                                            caption="🔴 LIVE 正在推流", use_column_width=True)
-                                result = start_stream(yt_key, video_path, audio_path, srt_path)
-                                if result:
-                                    st.success("✅ 本轮推流完成")
-                                    success_count += 1
-                                else:
-                                    st.error("❌ 推流失败")
-                                    error_count += 1
-                            else:
-                                st.error("❌ 缺少推流码")
-                                error_count += 1
-                    
-                    else:
-                        # 无内容可播
-                        st.error(f"❌ 错误: {err}")
-                        error_count += 1
-                    
-                    # D. 智能休息逻辑 (仅直播模式)
-                    if is_live:
-                        # 如果有音频时长，在结束前30秒开始准备下一条
-                        if 'audio_duration' in locals() and audio_duration:
-                            # 计算实际等待时间：音频时长 - 30秒（提前准备）
-                            wait_time = max(10, audio_duration - 30)
-                            st.info(f"⏳ 当前内容时长 {audio_duration:.0f}秒，将在播放结束前30秒开始准备下一条...")
-                            st.info(f"⏳ 等待 {wait_time:.0f} 秒后开始下一轮...")
-                            time.sleep(wait_time)
-                        else:
-                            st.info(f"⏳ 本条结束，休息 {interval} 秒后继续下一轮...")
-                            time.sleep(interval)
-                        # 🔥 继续循环，不退出
-                        continue
-                    else:
-                        # 试听模式已经在上面 break 了
-                        break
-
-            except KeyboardInterrupt:
-                st.warning("⚠️ 用户手动停止")
-                break
-            
-            except Exception as e:
-                import traceback
-                error_details = traceback.format_exc()
-                st.error(f"💥 发生意外错误: {e}")
-                with st.expander("🔍 查看详细错误信息"):
-                    st.code(error_details, language="python")
-                
-                # 🔥 常见错误提示
-                error_str = str(e)
-                if "'title'" in error_str or "'name'" in error_str:
-                    st.warning("💡 提示：可能是新闻数据格式问题，已自动尝试兼容处理")
-                elif "tavily" in error_str.lower():
-                    st.warning("💡 提示：Tavily API 可能出现问题，请检查网络连接或API密钥")
-                elif "deepseek" in error_str.lower():
-                    st.warning("💡 提示：DeepSeek API 可能出现问题，请检查API密钥或余额")
-                
-                error_count += 1
-                if is_live:
-                    st.warning("🔄 系统将在 10 秒后尝试重启下一轮...")
-                    time.sleep(10)
-                    # 🔥 继续循环，不退出
-                    continue
+        config = {
+            "deepseek_key": deepseek_key,
+            "tavily_key": tavily_key,
+            "yt_key": yt_key,
+            "extra_outputs": extra_outputs,
+            "target_domains": target_domains,
+            "mode": "preview" if "试听" in mode else "live",
+            "preview_quality": "full" if preview_full else "proxy",
+            "preview_seconds": preview_seconds,
+            "preview_sentences": preview_sentences.strip(),
+            "topic": topic,
+            "interval": interval,
+            "allow_replay": allow_replay,
+            "old_video_chance": old_video_chance,
+            "archive_live": archive_live,
+            "prerender_backup": prerender_backup,
+            "prerender_video": prerender_video,
+            "voice": selected_voice,
+            "background": video_path,
+        }
+
+        # 🔥 日志进固定容量的环形缓冲：页面上只画最近几轮的一行摘要 + 当前这一轮的日志，
+        # 元素数量和内存不随运行时长增长；整篇文案 / 错误堆栈写盘，在下方历史记录里按需读取
+        monitor_log.clear()
+        current = {"round": 0}
+        partial = {"shown_at": None, "drawn_at": 0.0}
+
+        def draw_log():
+            widgets = {"info": st.info, "success": st.success, "warning": st.warning, "error": st.error,
+                       "write": st.write, "caption": st.caption}
+            with log_box.container():
+                history = [r for r in monitor_log.rounds() if r["round"] != current["round"]][-HISTORY_ROWS:]
+                if history:
+                    st.caption("  \n".join(round_line(r) for r in history))
+                for item in monitor_log.lines(current["round"]):
+                    widgets[item["level"]](item["text"])
+
+        def log(level, text):
+            monitor_log.line(level, text, round=current["round"])
+            draw_log()
+
+        def render_event(event, level, data):
+            """流水线事件 → 页面"""
+            if event == "round_start":
+                current["round"] = data["round"]
+                monitor_log.start_round(data["round"])
+                log("info", f"🔄 第 {data['round']} 轮 | 正在全网搜寻 24H 内的新闻...")
+                with status_box.container():
+                    st.metric("运行轮次", data["round"])
+                    col_a, col_b = st.columns(2)
+                    col_a.metric("成功", data["success"])
+                    col_b.metric("错误", data["error"])
+                    disk = data["disk"]
+                    st.caption(f"💾 临时产物 {disk['bytes'] / 1024 / 1024:.0f}MB / {disk['max_bytes'] / 1024 / 1024:.0f}MB | "
+                               f"{disk['rounds']} 轮 (播出中 {disk['by_state']['airing']}) | 已淘汰 {disk['evicted']} 轮")
+                    api = data["api"]
+                    calls = {}
+                    for name, count in api["counts"].items():
+                        provider = name.split(":")[0]
+                        calls[provider] = calls.get(provider, 0) + count
+                    st.caption("🔑 今日 API " + " | ".join(
+                        f"{p} {calls.get(p, 0)}" + (f"/{api['daily'][p]}" if api["daily"].get(p) else "")
+                        for p in api["daily"]) + f" | 429 重试 {api['rate_limited']} 次")
+                    for provider, r in data["resilience"].items():
+                        st.caption(f"🛡️ {provider}: {'🟢' if r['state'] == 'closed' else '🔴'} {r['state']} | "
+                                   f"p95 {r['p95'] if r['p95'] is not None else '-'}s | 对冲 {r['hedged']} 次 (胜 {r['hedge_wins']}) | "
+                                   f"失败 {r['failures']} | 熔断拦截 {r['short_circuited']} | 超时放弃 {r['timed_out']}")
+            elif event == "deadline":
+                fallback = {"prerender": "改播预渲染备用话题", "replay": "改播存档老视频", "none": "本轮跳过"}[data["fallback"]]
+                log("warning", f"⏱️ {data['stage']} 超出时间预算 ({data['budget']:.0f}s)，{fallback}")
+            elif event == "replay":
+                log("warning", f"📼 无热点新闻，随机插播历史视频：{os.path.basename(data['file'])}")
+            elif event == "backup_script":
+                log("info", f"📚 备用话题暂无成品，当场写稿：{data['topic']}")
+            elif event == "script":
+                monitor_log.save_detail(current["round"], "script", data["script"])
+                monitor_log.start_round(current["round"], chars=len(data["script"]), backup=data["is_backup"])
+                log("success", f"📝 深度文案已生成 (SOP框架+去废话，{len(data['script'])} 字，全文见历史记录)")
+            elif event == "prerender_hit":
+                log("success", f"⚡ 备用话题预渲染命中，直接播出：{data['topic']}")
+            elif event == "tts":
+                report = data["report"]
+                log("caption", f"🗣️ 分 {data['chunks']} 段并行合成 (缓存命中 {report['cached_chunks']}) | "
+                            f"首段就绪 {report['first_chunk_latency']:.1f}s | 总耗时 {report['elapsed']:.1f}s")
+            elif event == "audio":
+                d = data["duration"]
+                log("info", f"⏱️ 音频时长: {d:.2f} 秒 ({int(d//60)}分{int(d%60)}秒)")
+            elif event == "subtitles":
+                if data["source"] == "boundary":
+                    log("write", f"🔥 字幕按词边界对齐: {data['lines']} 行")
                 else:
-                    # 试听模式出错就停止
-                    break
-        
+                    log("write", "🔥 生成估算同步字幕...")
+            elif event == "subtitle_failed":
+                log("error", "❌ 字幕生成失败")
+            elif event == "state" and data["state"] == "rendering":
+                log("write", "🎬 合成预览视频（带硬字幕）...")
+            elif event == "preview_window":
+                log("caption", f"⚡ 快速试听：从 {data['start']:.0f}s 起渲染 {data['duration']:.0f}s (360p / 12fps)，编出一部分就先播")
+            elif event == "preview_partial":
+                # 分片 MP4 边编边播：只取已写完的完整分片；重绘会从头播，所以限频并接着大概的播放位置
+                now = time.time()
+                if partial["shown_at"] is None or now - partial["drawn_at"] >= PARTIAL_REDRAW_SECONDS:
+                    playable, _ = read_playable_prefix(data["path"])
+                    if playable:
+                        position = 0 if partial["shown_at"] is None else int(now - partial["shown_at"])
+                        monitor.video(playable, format="video/mp4", start_time=max(0, min(position, int(data["seconds"]) - 2)))
+                        partial["shown_at"] = partial["shown_at"] or now
+                        partial["drawn_at"] = now
+            elif event == "preview_ready":
+                position = int(time.time() - partial["shown_at"]) if partial["shown_at"] and not data["replay"] else 0
+                monitor.video(data["path"], start_time=position)
+                partial["shown_at"] = None
+                if not data["replay"]:
+                    st.balloons()
+                log("success", "✅ 预览视频生成完成！" if not data["replay"] else "✅ 预览播放了老视频")
+            elif event == "render_failed":
+                log("error", "❌ 视频合成失败")
+            elif event == "live_start":
+                log("warning", "📡 直播中 (带硬字幕)..." if not data["replay"] else "📡 推流历史视频...")
+                monitor.image("https://via.placeholder.com/800x450/FF0000/FFFFFF?text=LIVE+ON+AIR",
+                              caption="🔴 LIVE 正在推流", use_column_width=True)
+            elif event == "no_outputs":
+                log("error", "❌ 缺少推流码")
+            elif event == "no_content":
+                log("error", f"❌ 错误: {data['message']}")
+            elif event == "round_done":
+                monitor_log.finish_round(current["round"], ok=data["ok"], kind=data["kind"], duration=data["duration"])
+                if data["kind"] != "none" and config["mode"] == "live":
+                    if data["ok"]:
+                        log("success", "✅ 本轮推流完成")
+                    else:
+                        log("error", "❌ 推流失败")
+            elif event == "waiting":
+                if data["duration"]:
+                    log("info", f"⏳ 当前内容时长 {data['duration']:.0f}秒，将在播放结束前30秒开始准备下一条...")
+                log("info", f"⏳ 等待 {data['seconds']:.0f} 秒后开始下一轮...")
+            elif event == "recovered":
+                log("success", f"♻️ 接上次运行（第 {data['round']} 轮）：{data['ready']} 条已就绪待播，{data['scripts']} 条文案待合成")
+            elif event == "resumed":
+                log("success", f"♻️ 播出上次没播完的一条（{data['age']} 秒前准备）" if data["stage"] == "ready"
+                    else f"♻️ 上次的文案已写好（{data['age']} 秒前），直接合成")
+            elif event == "prefetch_hit":
+                log("success", f"⚡ 下一条已提前制作完成（{data['age']} 秒前），直接开播")
+            elif event == "prefetch_stale":
+                log("warning", f"♻️ 提前制作的新闻稿已过时（{data['age']} 秒前），重新搜索")
+            elif event == "prefetch_failed":
+                log("warning", f"⚠️ 提前制作失败，现场重做: {data['message']}")
+            elif event == "round_error":
+                monitor_log.save_detail(current["round"], "traceback", data["traceback"])
+                monitor_log.finish_round(current["round"], ok=False, error=data["message"])
+                log("error", f"💥 发生意外错误: {data['message']}（详细堆栈见历史记录）")
+                if data["hint"]:
+                    log("warning", f"💡 提示：{data['hint']}")
+                if config["mode"] == "live":
+                    log("warning", "🔄 系统将在 10 秒后尝试重启下一轮...")
+            elif event == "interrupted":
+                log("warning", "⚠️ 用户手动停止")
+
+        broadcast = BroadcastPipeline(config, on_event=render_event, on_progress=render_encoder_stats)
+        try:
+            # 🔥 背景只在内容变化时标准化一次，之后每段都直接用缓存
+            with st.spinner("🎞️ 准备背景视频缓存..."):
+                # 备用话题预渲染线程跨页面刷新保留，音色 / 背景变化时重建
+                cfg = broadcast.config
+                brain = get_brain(cfg["deepseek_key"], cfg["tavily_key"], cfg["topic"], cfg["persona"],
+                                  cfg["target_domains"])
+                broadcast.setup(pool=st.session_state.get("prerender_pool"), brain=brain)
+        except (ValueError, FileNotFoundError) as e:
+            st.error(f"❌ 错误：{e}")
+            st.stop()
+        if broadcast.pool:
+            st.session_state["prerender_pool"] = broadcast.pool
+        else:
+            st.session_state.pop("prerender_pool", None)
+
+        # 🔥 核心：真正的无限循环（试听模式跑一条就结束）
+        broadcast.run()
+
         # 循环结束后的总结（只有试听模式会到这里）
-        st.success(f"🏁 运行结束 | 总轮次: {round_count}, 成功: {success_count}, 错误: {error_count}")
+        stats = broadcast.stats
+        st.success(f"🏁 运行结束 | 总轮次: {stats['round']}, 成功: {stats['success']}, 错误: {stats['error']}")
@@ -0,0 +1,251 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# 🔥 临时产物管理
+# 每一轮的语音 / 字幕 / 预览视频都放进自己独立的子目录 temp/rounds/{时间}_{随机}/，
+# 同一秒开两轮也不会互相覆盖。每个目录记录生命周期：
+#   producing（制作中）→ queued（已就绪待播）→ airing（播出中）→ aired（已播完）
+# 目录总大小超过配额时，按最近使用时间淘汰已播完的轮次；制作中 / 待播 / 播出中的永远不动。
+# 每轮记录所属进程的 pid：页面和守护进程共用同一个目录时，不会把对方还在用的轮次当成遗留淘汰掉；
+# 配额是整个目录共用的，每次检查配额前重新扫描别的进程的轮次（新建 / 已播完 / 已被对方淘汰）。
+
+ROUNDS_DIR = "temp/rounds"
+MAX_BYTES = 2 * 1024 * 1024 * 1024   # 2GB
+STALE_HOURS = 6                      # 超过 6 小时还停在 producing 的，视为上次崩溃遗留
+LEGACY_MAX_AGE = 24 * 3600           # 旧版直接写在 temp/ 下的 s_* / p_* 文件，一天后清理
+STATE_FILE = ".state.json"
+
+PRODUCING = "producing"
+QUEUED = "queued"
+AIRING = "airing"
+AIRED = "aired"
+STATES = (PRODUCING, QUEUED, AIRING, AIRED)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+
+def _dir_size(path):
+    total = 0
+    for entry in os.scandir(path):
+        try:
+            total += entry.stat().st_size if entry.is_file() else _dir_size(entry.path)
+        except OSError:
+            continue
+    return total
+
+
+class ArtifactManager:
+    """
+    rid = manager.new_round()            # 新建一轮，状态 producing
+    manager.path(rid, "speech.mp3")      # 本轮目录下的文件路径
+    manager.mark(rid, AIRING)            # 推进状态；变成 aired 时检查配额
+    manager.usage()                      # 磁盘占用指标
+    """
+
+    def __init__(self, root=ROUNDS_DIR, max_bytes=MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._rounds = {}
+        self.evicted = 0
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    # --- 状态持久化（重启后能接着管理上次留下的目录） ---
+
+    def _read(self, name):
+        """从目录里的状态文件读一轮；目录已不存在返回 None"""
+        path = os.path.join(self.root, name)
+        try:
+            with open(os.path.join(path, STATE_FILE), "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            if not os.path.isdir(path):
+                return None
+            info = {"state": AIRED, "created_at": os.path.getmtime(path)}
+        if info.get("state") != AIRED:
+            owner = info.get("pid")
+            if owner and owner != os.getpid() and _pid_alive(owner):
+                # 另一个还活着的进程的轮次：状态原样保留，由它自己推进和淘汰
+                info["foreign"] = True
+            else:
+                # 已退出进程里没播完的轮次先算已播完；播出日志 (journal.py) 接得上的由流水线重新认领
+                info["state"] = AIRED
+        try:
+            info.update({"id": name, "dir": path, "bytes": _dir_size(path)})
+        except OSError:
+            return None
+        info.setdefault("updated_at", info.get("created_at", time.time()))
+        return info
+
+    def _load(self):
+        for name in os.listdir(self.root):
+            if os.path.isdir(os.path.join(self.root, name)):
+                info = self._read(name)
+                if info:
+                    self._rounds[name] = info
+
+    def _rescan_locked(self):
+        """重新读别的进程的轮次：新建的加进来，被淘汰的移除，对方播完的变成可淘汰"""
+        try:
+            names = {n for n in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, n))}
+        except OSError:
+            return
+        for rid in list(self._rounds):
+            if rid not in names:
+                del self._rounds[rid]
+        for name in names:
+            known = self._rounds.get(name)
+            if known and known.get("pid") == os.getpid():
+                continue
+            info = self._read(name)
+            if info is None:
+                self._rounds.pop(name, None)
+                continue
+            if known:
+                # 本进程重播过的旧轮次，最近使用时间以较新的为准
+                info["updated_at"] = max(info["updated_at"], known["updated_at"])
+            self._rounds[name] = info
+
+    def _save(self, info):
+        data = {k: info[k] for k in ("state", "created_at", "updated_at", "label", "pid") if k in info}
+        try:
+            with open(os.path.join(info["dir"], STATE_FILE), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        except OSError:
+            pass
+
+    # --- 轮次 ---
+
+    def new_round(self, label=""):
+        """新建一轮的工作目录，返回轮次 id"""
+        now = time.time()
+        rid = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(now))}_{uuid.uuid4().hex[:6]}"
+        path = os.path.join(self.root, rid)
+        os.makedirs(path)
+        info = {"id": rid, "dir": path, "state": PRODUCING, "label": label,
+                "created_at": now, "updated_at": now, "bytes": 0, "pid": os.getpid()}
+        with self._lock:
+            self._rounds[rid] = info
+        self._save(info)
+        self.enforce_quota()
+        return rid
+
+    def has(self, rid):
+        return rid in self._rounds
+
+    def owned_elsewhere(self, rid):
+        """这一轮属于另一个还在运行的进程（不能认领）"""
+        info = self._rounds.get(rid)
+        return bool(info and info.get("foreign"))
+
+    def path(self, rid, filename):
+        return os.path.join(self._rounds[rid]["dir"], filename)
+
+    def mark(self, rid, state):
+        """推进生命周期；文件大小在这里重新统计"""
+        if state not in STATES:
+            raise ValueError(f"未知状态: {state}")
+        with self._lock:
+            info = self._rounds.get(rid)
+            if not info:
+                return
+            info["state"] = state
+            info["updated_at"] = time.time()
+            info["pid"] = os.getpid()
+            info.pop("foreign", None)
+            try:
+                info["bytes"] = _dir_size(info["dir"])
+            except OSError:
+                info["bytes"] = 0
+        self._save(info)
+        if state == AIRED:
+            self.enforce_quota()
+
+    def touch(self, rid):
+        """再次用到某一轮的文件（例如重播）时刷新最近使用时间"""
+        with self._lock:
+            if rid in self._rounds:
+                self._rounds[rid]["updated_at"] = time.time()
+
+    # --- 配额 ---
+
+    def _evictable(self, info, now):
+        if info.get("foreign"):
+            return False
+        if info["state"] == AIRED:
+            return True
+        return info["state"] == PRODUCING and now - info["updated_at"] > STALE_HOURS * 3600
+
+    def enforce_quota(self):
+        """超出配额时按最近使用时间淘汰已播完的轮次（整个目录共用配额，含别的进程的轮次），返回淘汰数"""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            self._rescan_locked()
+            total = sum(info["bytes"] for info in self._rounds.values())
+            if total <= self.max_bytes:
+                return 0
+            candidates = sorted((i for i in self._rounds.values() if self._evictable(i, now)),
+                                key=lambda i: i["updated_at"])
+            for info in candidates:
+                if total <= self.max_bytes * 0.9:
+                    break
+                shutil.rmtree(info["dir"], ignore_errors=True)
+                total -= info["bytes"]
+                del self._rounds[info["id"]]
+                removed += 1
+            self.evicted += removed
+        if removed:
+            print(f"🧹 临时产物淘汰 {removed} 轮，当前占用 {total / 1024 / 1024:.0f}MB")
+        return removed
+
+    def purge_legacy(self, temp_dir="temp", max_age=LEGACY_MAX_AGE):
+        """清理旧版平铺在 temp/ 下的 s_* / p_* 文件"""
+        now = time.time()
+        removed = 0
+        for name in os.listdir(temp_dir):
+            path = os.path.join(temp_dir, name)
+            if not (name.startswith("s_") or name.startswith("p_")) or not os.path.isfile(path):
+                continue
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            print(f"🧹 清理旧版临时文件 {removed} 个")
+        return removed
+
+    # --- 指标 ---
+
+    def usage(self):
+        """磁盘占用指标：{"rounds", "bytes", "max_bytes", "by_state", "evicted", "disk_free"}"""
+        with self._lock:
+            by_state = {state: 0 for state in STATES}
+            total = 0
+            for info in self._rounds.values():
+                by_state[info["state"]] += 1
+                total += info["bytes"]
+            rounds = len(self._rounds)
+        try:
+            disk_free = shutil.disk_usage(self.root).free
+        except OSError:
+            disk_free = None
+        return {"rounds": rounds, "bytes": total, "max_bytes": self.max_bytes,
+                "by_state": by_state, "evicted": self.evicted, "disk_free": disk_free}
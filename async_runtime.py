@@ -0,0 +1,91 @@
+import asyncio
+import functools
+import threading
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+
+# 🔥 常驻事件循环
+# 原来每轮都 asyncio.run(text_to_speech(...))：新建事件循环 → 合成 → 关闭，
+# 循环里挂着的任务也跟着一起销毁，两轮之间没法有任何重叠。
+# 这里整个进程只起一个事件循环（独立线程里 run_forever），各频道 / 预渲染 / 预取都往里提交：
+#   run_async(coro)        在常驻循环上跑协程，阻塞等结果（给同步代码用）
+#   runtime.submit(coro)   提交协程，立即返回 concurrent.futures.Future
+#   runtime.run_blocking   同步函数（Tavily / LangChain SDK）放到循环自带的线程池里跑
+# 同步 SDK 的调用仍然走 rate_limiter / search_cache 的线程锁，所以放在线程池里而不是改写成协程。
+
+ASYNC_WORKERS = 8
+
+
+class AsyncRuntime:
+    def __init__(self, workers=ASYNC_WORKERS):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="async-io")
+        self.loop.set_default_executor(self.executor)
+        self._thread = threading.Thread(target=self._run, name="async-runtime", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    @property
+    def running(self):
+        return self._thread.is_alive() and not self.loop.is_closed()
+
+    def submit(self, coro):
+        """提交协程到常驻循环，返回 concurrent.futures.Future（可在任意线程 result() / cancel()）"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """在常驻循环上运行协程并等待结果；不能在循环线程里调用（会死锁）。超时抛内置 TimeoutError"""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("不能在事件循环线程内同步等待协程")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            if future.done():
+                # 协程自己抛出的超时（3.11 起两者是同一个类），原样上抛
+                raise
+            # 超时就取消循环里的协程（例如 TTS 各分段的请求），不留在后台继续跑
+            future.cancel()
+            # Python 3.10 及以下 concurrent.futures.TimeoutError 不是内置 TimeoutError，统一成内置的给调用方捕获
+            raise TimeoutError(f"协程运行超过 {timeout}s") from None
+
+    async def _call(self, fn, args, kwargs):
+        return await self.loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+    def run_blocking(self, fn, *args, **kwargs):
+        """同步函数放到循环的线程池里执行，返回 concurrent.futures.Future"""
+        return self.submit(self._call(fn, args, kwargs))
+
+    def call_later(self, delay, fn, *args, **kwargs):
+        """delay 秒后在线程池里执行同步函数；返回的 Future 在真正开始前可以 cancel()"""
+        async def delayed():
+            await asyncio.sleep(delay)
+            return await self._call(fn, args, kwargs)
+        return self.submit(delayed())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+        self.executor.shutdown(wait=False)
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime():
+    """进程内共享的常驻事件循环（第一次用到时启动）"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None or not _runtime.running:
+            _runtime = AsyncRuntime()
+        return _runtime
+
+
+def run_async(coro, timeout=None):
+    """同步代码里运行协程：替代 asyncio.run()，事件循环和其中的连接 / 任务跨轮复用"""
+    return get_runtime().run(coro, timeout)
@@ -0,0 +1,106 @@
+import os
+import subprocess
+import tempfile
+import wave
+
+import numpy as np
+
+# 🔥 一次解码，全部分析
+# TTS 输出只解码一次成 16-bit PCM（长稿用内存映射临时文件），
+# 时长、首尾静音、裁剪点全部在 NumPy 里用向量化 RMS 窗口算出来，
+# 裁剪后的采样直接写成无损 WAV 交给下游，不再经过 ffprobe / silencedetect / silenceremove。
+
+SAMPLE_RATE = 24000              # Edge TTS 原生采样率，解码时不重采样
+MEMMAP_MIN_SECONDS = 15 * 60     # 超过 15 分钟的音频解码到内存映射文件
+WINDOW_MS = 10                   # RMS 窗口
+SILENCE_DB = -40.0               # 与原 silenceremove 阈值一致
+KEEP_SILENCE = 0.1               # 首尾各保留 0.1 秒，避免切掉气口
+BLOCK_WINDOWS = 6000             # 分块计算（每块 60 秒），内存映射时不会一次性读入
+
+
+def decode_pcm(path, sample_rate=SAMPLE_RATE, duration_hint=None):
+    """
+    解码为单声道 int16 PCM
+    duration_hint 超过 MEMMAP_MIN_SECONDS 时写到临时文件再内存映射
+    """
+    command = [
+        'ffmpeg', '-v', 'error', '-i', path,
+        '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(sample_rate),
+    ]
+    if duration_hint and duration_hint > MEMMAP_MIN_SECONDS:
+        fd, raw_path = tempfile.mkstemp(suffix=".pcm", dir="temp")
+        os.close(fd)
+        subprocess.run(command + ['-y', raw_path], check=True, capture_output=True)
+        samples = np.memmap(raw_path, dtype=np.int16, mode="r")
+        try:
+            # 映射建立后即可删除目录项，进程退出时空间自动回收
+            os.remove(raw_path)
+        except OSError:
+            pass
+        return samples
+
+    result = subprocess.run(command + ['pipe:1'], check=True, capture_output=True)
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def rms_db(samples, window):
+    """按固定窗口计算 RMS 电平（dBFS），分块向量化计算"""
+    n_windows = len(samples) // window
+    levels = np.empty(n_windows, dtype=np.float32)
+    for first in range(0, n_windows, BLOCK_WINDOWS):
+        last = min(n_windows, first + BLOCK_WINDOWS)
+        block = np.asarray(samples[first * window:last * window], dtype=np.float32).reshape(-1, window)
+        power = np.mean(np.square(block / 32768.0), axis=1)
+        levels[first:last] = 10 * np.log10(np.maximum(power, 1e-10))
+    return levels
+
+
+def analyze_audio(path, duration_hint=None, threshold_db=SILENCE_DB, keep_silence=KEEP_SILENCE,
+                  sample_rate=SAMPLE_RATE):
+    """
+    返回音频分析结果：
+    {"samples", "sample_rate", "duration", "lead_silence", "trail_silence",
+     "trim_start", "trim_end", "trimmed"}
+    trim_start / trim_end 单位秒；trimmed 是裁剪后的采样（原数组的视图，不复制）
+    """
+    samples = decode_pcm(path, sample_rate, duration_hint)
+    total = len(samples)
+    duration = total / sample_rate
+    window = max(1, sample_rate * WINDOW_MS // 1000)
+
+    voiced = np.flatnonzero(rms_db(samples, window) > threshold_db)
+    if len(voiced) == 0:
+        # 全是静音：不裁剪
+        lead = trail = 0.0
+        start, end = 0, total
+    else:
+        first_voice = voiced[0] * window
+        last_voice = min(total, (voiced[-1] + 1) * window)
+        lead = float(first_voice) / sample_rate
+        trail = float(total - last_voice) / sample_rate
+        keep = int(keep_silence * sample_rate)
+        start = int(max(0, first_voice - keep))
+        end = int(min(total, last_voice + keep))
+
+    return {
+        "samples": samples,
+        "sample_rate": sample_rate,
+        "duration": duration,
+        "lead_silence": lead,
+        "trail_silence": trail,
+        "trim_start": start / sample_rate,
+        "trim_end": end / sample_rate,
+        "trimmed": samples[start:end],
+    }
+
+
+def write_wav(samples, path, sample_rate=SAMPLE_RATE):
+    """把 int16 采样写成无损 WAV（分块写，兼容内存映射）"""
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        step = sample_rate * 60
+        for first in range(0, len(samples), step):
+            wav.writeframes(np.ascontiguousarray(samples[first:first + step], dtype="<i2").tobytes())
+    return path
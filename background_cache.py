@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import subprocess
+
+# 🔥 背景视频预处理缓存
+# 上传的背景只在内容变化时标准化一次：统一分辨率 / 帧率 / GOP，去掉音轨，
+# 时长截到 GOP 的整数倍，保证 -stream_loop 循环点正好落在关键帧上。
+# 之后每一段直播都直接从这个缓存文件起步，省掉原片解码和缩放，起播也不用找关键帧。
+
+CACHE_DIR = "assets/cache"
+META_SUFFIX = ".json"
+
+TARGET_WIDTH = 1280
+TARGET_HEIGHT = 720
+TARGET_FPS = 30
+GOP_SECONDS = 2          # YouTube 建议关键帧间隔 ≤ 4 秒
+KEEP_VERSIONS = 3        # 最多保留几个历史版本的缓存
+
+
+def content_hash(data=None, path=None):
+    """计算上传内容或文件的 SHA-256"""
+    h = hashlib.sha256()
+    if data is not None:
+        h.update(data)
+    else:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def _read_meta(path):
+    try:
+        with open(path + META_SUFFIX, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path, meta):
+    with open(path + META_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def source_hash(path):
+    """读取源文件的哈希（有记录就用记录，避免每次都重新读一遍大文件）"""
+    meta = _read_meta(path)
+    stat = os.stat(path)
+    if meta.get("size") == stat.st_size and meta.get("mtime") == stat.st_mtime and meta.get("sha256"):
+        return meta["sha256"]
+    digest = content_hash(path=path)
+    _write_meta(path, {"sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime})
+    return digest
+
+
+def store_upload(data, path="assets/background.mp4"):
+    """
+    保存上传的背景视频：内容没变就不重写
+    返回 True 表示文件有更新
+    """
+    digest = content_hash(data=data)
+    if os.path.exists(path) and source_hash(path) == digest:
+        return False
+
+    tmp = path + ".part"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    stat = os.stat(path)
+    _write_meta(path, {"sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime})
+    print(f"✅ 背景视频已更新: {path} ({digest[:12]})")
+    return True
+
+
+def _probe_duration(path):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path],
+        capture_output=True, text=True, check=True
+    )
+    return float(json.loads(result.stdout)['format']['duration'])
+
+
+def _cleanup(keep_path):
+    """只保留最近几个版本的缓存"""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    files = [os.path.join(CACHE_DIR, f) for f in os.listdir(CACHE_DIR) if f.startswith("bg_") and f.endswith(".mp4")]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for old in files[KEEP_VERSIONS:]:
+        if old != keep_path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def prepare_background(src_path, width=TARGET_WIDTH, height=TARGET_HEIGHT, fps=TARGET_FPS, gop_seconds=GOP_SECONDS):
+    """
+    返回可直接循环推流的背景缓存路径
+    命中缓存直接返回；标准化失败时退回原文件，保证直播不受影响
+    """
+    gop = int(fps * gop_seconds)
+    digest = source_hash(src_path)
+    cached = os.path.join(CACHE_DIR, f"bg_{digest[:16]}_{width}x{height}_{fps}fps_g{gop}.mp4")
+    if os.path.exists(cached):
+        os.utime(cached)
+        print(f"✅ 命中背景缓存: {cached}")
+        return cached
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        duration = _probe_duration(src_path)
+        # 截到 GOP 整数倍：循环点 = 关键帧，接缝处不卡顿、不花屏
+        frames = max(gop, int(duration * fps) // gop * gop)
+
+        video_filter = (
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+            f"fps={fps},format=yuv420p"
+        )
+        tmp = cached + ".part.mp4"
+        command = [
+            'ffmpeg', '-y',
+            '-i', src_path,
+            '-vf', video_filter,
+            '-an',
+            '-frames:v', str(frames),
+            '-c:v', 'libx264', '-preset', 'medium', '-crf', '18',
+            '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+            '-movflags', '+faststart',   # moov 前置，起播不用先读到文件尾
+            tmp
+        ]
+        print(f"🎞️ 首次标准化背景视频 → {width}x{height}@{fps}fps, GOP={gop}, {frames} 帧...")
+        subprocess.run(command, check=True, capture_output=True)
+        os.replace(tmp, cached)
+        _cleanup(cached)
+        print(f"✅ 背景缓存已生成: {cached}")
+        return cached
+    except Exception as e:
+        if os.path.exists(cached + ".part.mp4"):
+            os.remove(cached + ".part.mp4")
+        print(f"⚠️ 背景预处理失败，使用原始视频: {e}")
+        return src_path
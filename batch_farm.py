@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+加密大漂亮 - 批量内容工厂
+夜里一次性做好一批节目放进存档目录（archive_videos），没有热点时插播老视频就有新货可播。
+每集走 写稿 → 语音 + 字幕 → 渲染 三段流水线，每段有自己的并发上限：
+    script  写稿（DeepSeek / Tavily，经共享调度器限速，不动用每日配额的保留部分）  默认 3 路
+    speech  语音 + 字幕（edge-tts，在共享事件循环上并发合成）                      默认 2 路
+    render  渲染（FFmpeg 子进程，从编码器池领 CPU 配额，nice 让着直播）             默认 可用核数 / 4 路
+第一集写完稿就开始合成、合成完就开始渲染，不用等整批写完；
+每集各段耗时、产物路径和失败原因都记在 temp/farm/{批次}/manifest.json 里（每段结束都会刷新）
+
+用法：
+    python batch_farm.py --topics topics.txt             # 每行一个话题（常青节目），# 开头为注释
+    python batch_farm.py --topic "比特币减半" --topic "以太坊 Gas 机制"
+    python batch_farm.py --discover 12 --days 1          # 搜最近 1 天的新闻，挑 12 条没讲过的
+    python batch_farm.py --discover 6 --topics topics.txt --config config.json --render-workers 2
+Key / 音色 / 人设 / 背景 / archive_dir 同 daemon.py：JSON 配置 > 环境变量 / .env > 默认值
+Ctrl+C / SIGTERM：不再开始新的步骤，正在渲染的中止，已完成的集照常留在存档里
+"""
+
+import argparse
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_runtime import run_async
+from background_cache import prepare_background
+from daemon import load_config, _write_json
+from encoder_pool import PRERENDER, cpu_cores
+from logic_core import CryptoBrain
+from pipeline import DEFAULT_CONFIG
+from rate_limiter import BACKGROUND, get_scheduler, request_priority
+from resilience import get_resilience
+from stream_engine import text_to_speech, prepare_speech_audio, encode_broadcast_audio, create_preview_video
+from subtitle_engine import generate_srt
+
+FARM_DIR = "temp/farm"
+STAGES = ("script", "speech", "render")
+STAGE_NAMES = {"script": "写稿", "speech": "语音", "render": "渲染"}
+DEFAULT_WORKERS = {"script": 3, "speech": 2, "render": max(1, cpu_cores() // 4)}
+RENDER_THREADS = 2            # 每路渲染的 x264 线程数
+MAX_SEARCH_RESULTS = 20       # Tavily 单次搜索最多返回 20 条，--discover 超过这个数也只能挑这么多
+
+
+class BatchFarm:
+    """
+    farm = BatchFarm(brain, background, voice, archive_dir, workers={"script": 3, "speech": 2, "render": 2})
+    jobs = farm.topic_jobs(["比特币减半"]) + farm.discover_jobs(12)
+    manifest = farm.run(jobs)
+    """
+
+    def __init__(self, brain, background, voice, archive_dir, workers=None, threads=RENDER_THREADS,
+                 work_dir=FARM_DIR):
+        self.brain = brain
+        self.background = background
+        self.voice = voice
+        self.archive_dir = archive_dir
+        self.workers = {**DEFAULT_WORKERS, **(workers or {})}
+        self.threads = threads
+        self.batch_id = time.strftime("%Y%m%d_%H%M%S")
+        self.work_dir = os.path.join(work_dir, self.batch_id)
+        self.manifest_path = os.path.join(self.work_dir, "manifest.json")
+        self.episodes = []
+        self.started_at = None
+        self._executors = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._pending = 0
+
+    # --- 任务来源 ---
+
+    @staticmethod
+    def topic_jobs(topics):
+        return [{"source": "topic", "title": t.strip()} for t in topics if t and t.strip()]
+
+    def discover_jobs(self, limit, days=1):
+        """搜最近 days 天的新闻，挑最多 limit 条没讲过的（按爆火潜力排序）"""
+        try:
+            with request_priority(BACKGROUND):
+                selected = self.brain.discover_news(limit=limit, days=days,
+                                                    max_results=min(MAX_SEARCH_RESULTS, max(15, limit)))
+        except Exception as e:
+            print(f"❌ 新闻搜索失败: {e}")
+            return []
+        if len(selected) < limit:
+            print(f"⚠️ 只找到 {len(selected)} 条没讲过的新闻（要求 {limit} 条）")
+        return [{"source": "news", "title": item.get("title") or item.get("name"), "url": item.get("url"),
+                 "news": item, "framework": framework} for item, framework in selected]
+
+    # --- 流水线 ---
+
+    def run(self, jobs):
+        """跑完整批，返回 manifest"""
+        os.makedirs(self.work_dir, exist_ok=True)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self.started_at = time.time()
+        self.episodes = [{"id": f"ep{i:03d}", **job, "status": "queued", "timings": {}, "artifacts": {},
+                          "duration": None, "error": None} for i, job in enumerate(jobs, 1)]
+        self._pending = len(self.episodes)
+        print(f"🏭 批次 {self.batch_id}: {len(self.episodes)} 集 | 并发 " +
+              " / ".join(f"{STAGE_NAMES[s]} {self.workers[s]}" for s in STAGES))
+        if not self.episodes:
+            self._save_manifest()
+            return self.manifest()
+
+        self._executors = {stage: ThreadPoolExecutor(self.workers[stage], thread_name_prefix=f"farm-{stage}")
+                           for stage in STAGES}
+        for episode in self.episodes:
+            self._submit("script", episode)
+        self._done.wait()
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+        self._save_manifest()
+        return self.manifest()
+
+    def stop(self):
+        self._stop.set()
+
+    def _submit(self, stage, episode):
+        self._executors[stage].submit(self._run_stage, stage, episode)
+
+    def _run_stage(self, stage, episode):
+        if self._stop.is_set():
+            self._finish(episode, "cancelled")
+            return
+        episode["status"] = stage
+        started = time.time()
+        try:
+            {"script": self._write, "speech": self._speak, "render": self._render}[stage](episode)
+        except Exception as e:
+            episode["timings"][stage] = round(time.time() - started, 1)
+            episode["error"] = f"{stage}: {e}"
+            print(f"❌ [{episode['id']}] {STAGE_NAMES[stage]}失败 ({episode['title']}): {e}")
+            self._finish(episode, "failed")
+            return
+        episode["timings"][stage] = round(time.time() - started, 1)
+        following = STAGES.index(stage) + 1
+        if following < len(STAGES):
+            self._save_manifest()
+            self._submit(STAGES[following], episode)
+        else:
+            self._finish(episode, "done")
+
+    def _finish(self, episode, status):
+        episode["status"] = status
+        self._save_manifest()
+        with self._lock:
+            self._pending -= 1
+            left = self._pending
+        if status == "done":
+            timings = " | ".join(f"{STAGE_NAMES[s]} {episode['timings'][s]:.0f}s" for s in STAGES)
+            print(f"✅ [{episode['id']}] {episode['title']} ({episode['duration']:.0f}s) | {timings} | 剩余 {left} 集")
+        if left == 0:
+            self._done.set()
+
+    # --- 三段 ---
+
+    def _dir(self, episode):
+        return os.path.join(self.work_dir, episode["id"])
+
+    def _write(self, episode):
+        with request_priority(BACKGROUND):
+            if episode["source"] == "news":
+                script, err, is_backup = self.brain.write_news_script(episode["news"], episode["framework"])
+                if is_backup:
+                    # 写稿中途熔断 / 超时会转成备用话题名，批量生产里当失败处理
+                    script, err = None, "写稿服务不可用"
+            else:
+                script, err = self.brain.write_backup_script(episode["title"]), None
+        if not script:
+            raise RuntimeError(err or "文案生成失败")
+        os.makedirs(self._dir(episode), exist_ok=True)
+        path = os.path.join(self._dir(episode), "script.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(script)
+        episode["chars"] = len(script)
+        episode["artifacts"]["script"] = path
+
+    def _speak(self, episode):
+        work_dir = self._dir(episode)
+        with open(episode["artifacts"]["script"], "r", encoding="utf-8") as f:
+            script = f.read()
+        srt_path = os.path.join(work_dir, "speech.ass")
+        tts_report = run_async(text_to_speech(script, os.path.join(work_dir, "speech.mp3"),
+                                              voice=self.voice, srt_path=srt_path))
+        speech = prepare_speech_audio(tts_report, os.path.join(work_dir, "speech.wav"))
+        audio_path = encode_broadcast_audio(speech["path"], os.path.join(work_dir, "speech.m4a"))
+        if not tts_report["srt_path"]:
+            srt_path = os.path.join(work_dir, "speech.srt")
+            if not generate_srt(script, speech["duration"], srt_path):
+                raise RuntimeError("字幕生成失败")
+        for leftover in ("speech.mp3", "speech.wav"):
+            path = os.path.join(work_dir, leftover)
+            if path != audio_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        episode["duration"] = speech["duration"]
+        episode["artifacts"].update(audio=audio_path, subtitles=srt_path)
+
+    def _render(self, episode):
+        artifacts = episode["artifacts"]
+        video = create_preview_video(self.background, artifacts["audio"], artifacts["subtitles"],
+                                     os.path.join(self._dir(episode), "video.mp4"), duration=episode["duration"],
+                                     should_abort=self._stop.is_set, name=f"farm:{episode['id']}",
+                                     priority=PRERENDER, threads=self.threads)
+        if not video:
+            raise RuntimeError("渲染失败" if not self._stop.is_set() else "已中止")
+        # 渲染完整个文件才放进存档目录，插播时不会挑到半截视频
+        final = os.path.join(self.archive_dir, f"farm_{self.batch_id}_{episode['id']}.mp4")
+        shutil.move(video, final)
+        artifacts["video"] = final
+
+    # --- 清单 ---
+
+    def manifest(self):
+        with self._lock:
+            episodes = [{k: v for k, v in e.items() if k not in ("news", "framework")} for e in self.episodes]
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        counts = {}
+        for e in episodes:
+            counts[e["status"]] = counts.get(e["status"], 0) + 1
+        busy = {s: round(sum(e["timings"].get(s, 0) for e in episodes), 1) for s in STAGES}
+        return {
+            "batch": self.batch_id,
+            "started_at": self.started_at,
+            "elapsed": round(elapsed, 1),
+            "voice": self.voice,
+            "workers": self.workers,
+            "counts": counts,
+            "stage_busy": busy,
+            # 各段累计耗时 / 墙钟时间：串行一集一集做是 1.0，越大说明流水线重叠得越好
+            "overlap": round(sum(busy.values()) / elapsed, 2) if elapsed else None,
+            "episodes": episodes,
+        }
+
+    def _save_manifest(self):
+        manifest = self.manifest()
+        with self._lock:
+            try:
+                _write_json(self.manifest_path, manifest)
+            except OSError as e:
+                print(f"⚠️ manifest 写入失败: {e}")
+
+
+def read_topics(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="加密大漂亮 - 批量内容工厂")
+    parser.add_argument("--config", help="JSON 配置文件（覆盖环境变量）")
+    parser.add_argument("--topics", help="话题清单文件，每行一个")
+    parser.add_argument("--topic", action="append", default=[], help="单个话题，可重复")
+    parser.add_argument("--discover", type=int, default=0, help=f"搜最近的新闻，挑 N 条没讲过的（最多 {MAX_SEARCH_RESULTS}）")
+    parser.add_argument("--days", type=int, default=1, help="新闻搜索窗口（天）")
+    parser.add_argument("--script-workers", type=int, default=DEFAULT_WORKERS["script"], help="写稿并发")
+    parser.add_argument("--tts-workers", type=int, default=DEFAULT_WORKERS["speech"], help="语音合成并发")
+    parser.add_argument("--render-workers", type=int, default=DEFAULT_WORKERS["render"], help="渲染并发")
+    parser.add_argument("--threads", type=int, default=RENDER_THREADS, help="每路渲染的 x264 线程数")
+    parser.add_argument("--channel", default="farm", help="话题历史里的频道名（默认和直播频道分开查重）")
+    args = parser.parse_args(argv)
+
+    try:
+        # 没写的项用直播的默认值（和 BroadcastPipeline 一样），只配了 Key 的环境变量也能直接跑
+        config = {**DEFAULT_CONFIG, **load_config(args.config)}
+        topics = list(args.topic) + (read_topics(args.topics) if args.topics else [])
+    except (OSError, ValueError) as e:
+        print(f"❌ 配置读取失败: {e}")
+        return 2
+    if not topics and not args.discover:
+        parser.error("至少需要 --topics / --topic / --discover 之一")
+    if not config["deepseek_key"] or (args.discover and not config["tavily_key"]):
+        print("❌ 缺少 DeepSeek 或 Tavily Key")
+        return 2
+    if not os.path.exists(config["background"]):
+        print(f"❌ 背景视频不存在: {config['background']}")
+        return 2
+
+    # 🔥 API 每日配额 / 对冲熔断参数，同 pipeline.setup
+    scheduler = get_scheduler()
+    if config["deepseek_daily_quota"]:
+        scheduler.configure("deepseek", daily=config["deepseek_daily_quota"])
+    if config["tavily_daily_quota"]:
+        scheduler.configure("tavily", daily=config["tavily_daily_quota"])
+    resilience = get_resilience()
+    for provider in ("deepseek", "tavily"):
+        options = dict(config["resilience"].get(provider, {}))
+        options.setdefault("hedge", config["hedge_requests"])
+        resilience.configure(provider, **options)
+
+    os.makedirs("temp", exist_ok=True)
+    brain = CryptoBrain(config["deepseek_key"], config["tavily_key"], config["topic"], config["persona"],
+                        [], config["target_domains"], channel=args.channel)
+    workers = {"script": args.script_workers, "speech": args.tts_workers, "render": args.render_workers}
+    farm = BatchFarm(brain, prepare_background(config["background"]), config["voice"], config["archive_dir"],
+                     workers=workers, threads=args.threads)
+
+    def handle_signal(signum, frame):
+        print("⚠️ 收到停止信号：不再开始新的步骤，正在渲染的中止")
+        farm.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    jobs = farm.topic_jobs(topics)
+    if args.discover:
+        jobs += farm.discover_jobs(args.discover, args.days)
+    manifest = farm.run(jobs)
+    counts = manifest["counts"]
+    print(f"🏁 批次完成 | 成功 {counts.get('done', 0)} / {len(manifest['episodes'])} 集 | "
+          f"耗时 {manifest['elapsed']:.0f}s | 流水线重叠 {manifest['overlap'] or 0:.2f}x | 清单: {farm.manifest_path}")
+    return 0 if counts.get("done", 0) == len(manifest["episodes"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+中控台启动 / 重跑耗时
+1. 冷启动导入：新进程里导入页面依赖的模块
+   旧版（顶层导入 langchain_openai / tavily / edge_tts）vs. 现在（第一次用到时才导入）
+2. 页面重跑：用 streamlit.testing 跑 app.py，模拟点控件触发的整页重跑
+   话题库关闭（默认，不读库、不建表格）vs. 打开
+
+用法：python bench_startup.py [重复次数]
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+APP_IMPORTS = "import pipeline, daemon, background_cache, subtitle_engine"
+LEGACY_IMPORTS = "import langchain_openai, tavily, edge_tts; " + APP_IMPORTS
+
+
+def cold_import(statement, repeat):
+    """每次都起新进程，返回导入耗时中位数（秒）"""
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    costs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        costs.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(costs)
+
+
+def app_reruns(repeat, cms_open):
+    """返回 (首次运行耗时, 重跑耗时中位数)（秒）"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file("app.py", default_timeout=60)
+    started = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - started
+    if cms_open:
+        app.toggle(key="cms_open").set_value(True).run()
+    costs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        app.run()
+        costs.append(time.perf_counter() - started)
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return first, statistics.median(costs)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print("=" * 50)
+    print(f"📊 冷启动导入（新进程 × {repeat} 次，取中位数）")
+    print("=" * 50)
+    legacy = cold_import(LEGACY_IMPORTS, repeat)
+    lazy = cold_import(APP_IMPORTS, repeat)
+    print(f"{'旧版（顶层导入 SDK）':24} : {legacy * 1000:8.1f} ms")
+    print(f"{'延迟导入':24} : {lazy * 1000:8.1f} ms")
+    print(f"速度比: {legacy / lazy:.2f}x")
+
+    print("\n" + "=" * 50)
+    print(f"📊 页面重跑（app.py × {repeat} 次，取中位数）")
+    print("=" * 50)
+    for name, cms_open in (("话题库关闭", False), ("话题库打开", True)):
+        first, rerun = app_reruns(repeat, cms_open)
+        print(f"{name:10} : 首次 {first * 1000:8.1f} ms | 重跑 {rerun * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
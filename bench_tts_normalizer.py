@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+TTS 文本规范化性能对比
+旧版 optimize_text_for_tts（每次调用 import re + 7 次 str.replace + 只转 1-2 位数字）
+vs. tts_normalizer（导入时编译的正则分词器 + 缩写前缀树）
+
+用法：python bench_tts_normalizer.py [重复次数]
+"""
+
+import re
+import sys
+import time
+
+from tts_normalizer import normalize_text
+
+
+def legacy_optimize_text_for_tts(text):
+    """原版实现，原样保留作对照"""
+    import re
+
+    def num_to_chinese(num_str):
+        num_map = {"0": "零", "1": "一", "2": "二", "3": "三", "4": "四",
+                   "5": "五", "6": "六", "7": "七", "8": "八", "9": "九"}
+        return ''.join([num_map.get(c, c) for c in num_str])
+
+    text = re.sub(r'\b(\d{1,2})\b', lambda m: num_to_chinese(m.group(1)), text)
+
+    abbreviations = {
+        "BTC": "比特币",
+        "ETH": "以太坊",
+        "AI": "人工智能",
+        "NFT": "恩艾夫提",
+        "DeFi": "去中心化金融",
+        "USD": "美元",
+        "CEO": "首席执行官"
+    }
+    for abbr, full in abbreviations.items():
+        text = text.replace(abbr, full)
+
+    sentences = re.split(r'([。！？])', text)
+    result = []
+    current = ""
+    for s in sentences:
+        current += s
+        if len(current) > 30 and s in ['。', '！', '？']:
+            result.append(current)
+            current = ""
+    if current:
+        result.append(current)
+
+    return ''.join(result)
+
+
+SAMPLE = (
+    "2024年5月1日，BTC 一度跌破$56,000，24小时跌幅3.5%，ETH 同步回撤-7.2%。\n"
+    "SEC 对现货 ETF 的态度仍不明朗，贝莱德 CEO 表示资金净流入达到$1.2B。\n"
+    "链上数据显示，DeFi 锁仓量回落到约 850 亿美元，AI 概念代币逆势上涨 15%！\n"
+    "很多人问我，现在是不是抄底的时机？我的看法是，先看 USDT 溢价和 NFT 成交量。\n"
+)
+
+
+def bench(func, text, repeat):
+    func(text)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    text = SAMPLE * 25   # 约 2000 字，接近一篇完整稿件
+    numbers_left = lambda out: len(re.findall(r"\d+", out))
+
+    print("=" * 50)
+    print(f"📊 TTS 文本规范化对比（{len(text)} 字 × {repeat} 次）")
+    print("=" * 50)
+    results = []
+    for name, func in (("旧版 optimize_text_for_tts", legacy_optimize_text_for_tts), ("tts_normalizer", normalize_text)):
+        cost = bench(func, text, repeat)
+        out = func(text)
+        results.append(cost)
+        print(f"{name:28} : {cost * 1000:7.3f} ms/篇 | 残留阿拉伯数字 {numbers_left(out)} 处")
+
+    print(f"\n速度比: {results[0] / results[1]:.2f}x")
+    print("\n示例:")
+    first_line = SAMPLE.split("\n")[0]
+    print(f"  原文 : {first_line}")
+    print(f"  旧版 : {legacy_optimize_text_for_tts(first_line)}")
+    print(f"  新版 : {normalize_text(first_line)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import hmac
+import json
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pipeline import HOT_KEYS, check_hot_config
+
+# 🔥 本地控制接口
+# 改关键词 / 信源 / 音色 / 间隔 / 插播概率 / 人设原来只能停掉循环再点「启动系统」：
+# 推流断开，背景缓存、预渲染、待播的下一条全部作废。
+# 守护进程 / 编排器带上这个小 HTTP 服务（只监听本机），设置改动排队，在下一条开始前换上，
+# 推流不断、缓存和待播内容都保留；备用话题库改完立即生效。
+#
+#   GET  /status                 各频道状态 + 当前设置 + 排队中的改动
+#   GET  /config                 可热更新的设置
+#   POST /config                 {"topic": "...", "voice": "zh-CN-YunxiNeural", "interval": 90, ...}
+#   GET  /topics                 备用话题库
+#   POST /topics                 {"topics": ["话题", ...]} 或 {"topics": [{"topic", "tags", "weight"}, ...]}
+#   POST /command                {"command": "pause" | "resume" | "skip" | "stop"}
+# 多频道时加 ?channel=名字 只作用于一个频道，不加作用于所有频道；返回值按频道名分组
+
+CONTROL_HOST = "127.0.0.1"
+MAX_BODY = 1024 * 1024
+COMMANDS = {
+    "pause": lambda p: p.pause(),
+    "resume": lambda p: p.resume(),
+    "skip": lambda p: p.skip(),
+    "stop": lambda p: p.stop(),
+}
+
+
+class ControlError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _hot_config(pipeline):
+    return {k: pipeline.config[k] for k in HOT_KEYS}
+
+
+class ControlServer:
+    """
+    server = ControlServer({"cn": pipeline_cn, "sol": pipeline_sol}, port=8765, token="...")
+    server.start()     # 后台线程里跑，不占主循环
+    server.url         # http://127.0.0.1:8765
+    server.stop()
+    """
+
+    def __init__(self, pipelines, port, host=CONTROL_HOST, token=""):
+        self.pipelines = pipelines
+        self.token = token
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="control-api", daemon=True)
+        self._thread.start()
+        print(f"🎛️ 控制接口已启动: {self.url}")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # --- 路由 ---
+
+    def _select(self, query):
+        channel = query.get("channel", [None])[0]
+        if channel is None:
+            return self.pipelines
+        if channel not in self.pipelines:
+            raise ControlError(404, f"没有这个频道: {channel}")
+        return {channel: self.pipelines[channel]}
+
+    def handle(self, method, path, query, body):
+        """返回 (状态码, JSON 对象)"""
+        pipelines = self._select(query)
+        route = (method, path.rstrip("/") or "/")
+        if route == ("GET", "/status"):
+            return 200, {name: dict(p.stats, paused=p.paused, config=_hot_config(p), pending=p.pending_config)
+                         for name, p in pipelines.items()}
+        if route == ("GET", "/config"):
+            return 200, {name: _hot_config(p) for name, p in pipelines.items()}
+        if route == ("POST", "/config"):
+            if not isinstance(body, dict) or not body:
+                raise ControlError(400, "请求体应为非空 JSON 对象")
+            try:
+                # 先校验再排队：不合法时哪个频道都不改
+                changes = check_hot_config(body)
+            except ValueError as e:
+                raise ControlError(400, str(e))
+            return 202, {name: {"pending": p.update_config(changes), "applies": "next_segment"}
+                         for name, p in pipelines.items()}
+        if route == ("GET", "/topics"):
+            return 200, {name: p.knowledge_base.rows() if p.knowledge_base else []
+                         for name, p in pipelines.items()}
+        if route == ("POST", "/topics"):
+            topics = body.get("topics") if isinstance(body, dict) else None
+            if not isinstance(topics, list):
+                raise ControlError(400, '请求体应为 {"topics": [...]}')
+            if any(p.knowledge_base is None for p in pipelines.values()):
+                raise ControlError(409, "频道还没初始化完成")
+            return 200, {name: p.set_backup_topics(topics) for name, p in pipelines.items()}
+        if route == ("POST", "/command"):
+            command = body.get("command") if isinstance(body, dict) else None
+            if command not in COMMANDS:
+                raise ControlError(400, f"未知命令: {command}（可用: {', '.join(COMMANDS)}）")
+            for p in pipelines.values():
+                COMMANDS[command](p)
+            return 200, {name: {"command": command} for name in pipelines}
+        raise ControlError(404, f"没有这个接口: {method} {path}")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, method):
+                try:
+                    if server.token:
+                        supplied = self.headers.get("Authorization", "")
+                        if not hmac.compare_digest(supplied.encode(), f"Bearer {server.token}".encode()):
+                            raise ControlError(401, "令牌错误")
+                    body = None
+                    if method == "POST":
+                        length = int(self.headers.get("Content-Length") or 0)
+                        if length > MAX_BODY:
+                            raise ControlError(413, "请求体过大")
+                        try:
+                            body = json.loads(self.rfile.read(length) or b"null")
+                        except ValueError:
+                            raise ControlError(400, "请求体不是合法 JSON")
+                    url = urllib.parse.urlsplit(self.path)
+                    status, payload = server.handle(method, url.path, urllib.parse.parse_qs(url.query), body)
+                except ControlError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                self._respond(status, payload)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                # 不往 stderr 打访问日志（守护进程的日志是 JSON Lines）
+                pass
+
+        return Handler
+
+
+def control_request(url, path, payload=None, token="", timeout=5):
+    """调用控制接口（Streamlit 页面用）；payload 为 None 时发 GET。失败抛 RuntimeError"""
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(url.rstrip("/") + path, data=data, method="POST" if data else "GET")
+    request.add_header("Content-Type", "application/json")
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error")
+        except ValueError:
+            message = None
+        raise RuntimeError(message or f"HTTP {e.code}")
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"控制接口连接失败: {e}")
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+加密大漂亮 - 后台守护进程
+不依赖浏览器：24H 播出循环作为独立服务运行，Streamlit 页面只做监控和控制
+
+用法：
+    python daemon.py                      # 读取 .env / 环境变量
+    python daemon.py --config config.json # 读取 JSON 配置（键名同 pipeline.DEFAULT_CONFIG）
+
+日志为 JSON Lines（stdout），适合 systemd / docker 直接采集
+SIGTERM / SIGINT：播完当前这条后退出；再发一次立即中断推流退出
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from control_api import ControlServer
+from pipeline import BroadcastPipeline, DEFAULT_CONFIG
+from rate_limiter import get_scheduler
+from resilience import get_resilience
+
+STATUS_FILE = "temp/daemon_status.json"
+CONTROL_FILE = "temp/daemon_control.json"
+HEARTBEAT_SECONDS = 5
+STALE_AFTER = 30              # 状态文件超过 30 秒没更新，视为守护进程已退出
+STOPPED = "stopped"           # 退出时最后一次写入的终态
+COMMANDS = ("pause", "resume", "skip", "stop")
+
+# 环境变量 → 配置键（与 .env.example 对应）
+ENV_MAP = {
+    "DEEPSEEK_API_KEY": "deepseek_key",
+    "TAVILY_API_KEY": "tavily_key",
+    "YOUTUBE_STREAM_KEY": "yt_key",
+    "EXTRA_OUTPUTS": "extra_outputs",
+    "TOPIC_KEYWORDS": "topic",
+    "TARGET_DOMAINS": "target_domains",
+    "INTERVAL": "interval",
+    "OLD_VIDEO_CHANCE": "old_video_chance",
+    "BROADCAST_MODE": "mode",
+    "ALLOW_REPLAY": "allow_replay",
+    "ARCHIVE_LIVE": "archive_live",
+    "PRERENDER_BACKUP": "prerender_backup",
+    "PRERENDER_VIDEO": "prerender_video",
+    "TTS_VOICE": "voice",
+    "BACKGROUND_VIDEO": "background",
+    "ENCODER_THREADS": "encoder_threads",
+    "DEEPSEEK_DAILY_QUOTA": "deepseek_daily_quota",
+    "TAVILY_DAILY_QUOTA": "tavily_daily_quota",
+    "HEDGE_REQUESTS": "hedge_requests",
+    "PREVIEW_QUALITY": "preview_quality",
+    "PREVIEW_SECONDS": "preview_seconds",
+    "PREVIEW_SENTENCES": "preview_sentences",
+    "ROUND_DEADLINE": "round_deadline",
+    "CONTROL_PORT": "control_port",
+    "CONTROL_TOKEN": "control_token",
+}
+
+
+# --- 监控 / 控制（Streamlit 页面也用这几个函数） ---
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def read_status():
+    """读取守护进程状态；没有运行、已正常退出或状态过期返回 None"""
+    try:
+        with open(STATUS_FILE, "r", encoding="utf-8") as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if status.get("state") == STOPPED or time.time() - status.get("heartbeat", 0) > STALE_AFTER:
+        return None
+    return status
+
+
+def send_command(command):
+    """给守护进程发控制命令：pause / resume / skip / stop"""
+    if command not in COMMANDS:
+        raise ValueError(f"未知命令: {command}")
+    os.makedirs(os.path.dirname(CONTROL_FILE), exist_ok=True)
+    _write_json(CONTROL_FILE, {"command": command, "issued_at": time.time()})
+
+
+# --- 配置 ---
+
+def _coerce(key, value):
+    default = DEFAULT_CONFIG.get(key)
+    if isinstance(default, bool):
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(value)
+    if key == "extra_outputs":
+        # .env 里只能写一行，逗号分隔
+        return "\n".join(v.strip() for v in str(value).split(",") if v.strip())
+    return value
+
+
+def load_config(path=None):
+    """优先级：JSON 配置文件 > 环境变量 / .env > 默认值"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    config = {}
+    for env, key in ENV_MAP.items():
+        value = os.environ.get(env)
+        if value not in (None, ""):
+            config[key] = _coerce(key, value)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    return config
+
+
+# --- 结构化日志 ---
+
+class JsonLog:
+    """每行一个 JSON 对象；模块里原有的 print() 也被包装成 {"event": "log"} 行"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._local = threading.local()   # print() 分几次 write，每个线程各攒各的行
+
+    def record(self, event, level="info", **data):
+        line = {"ts": round(time.time(), 3), "level": level, "event": event}
+        line.update(data)
+        with self._lock:
+            self.stream.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+            self.stream.flush()
+
+    # 作为 sys.stdout 使用
+    def write(self, text):
+        buffer = getattr(self._local, "buffer", "") + text
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            if line.strip():
+                # 多频道时 print() 来自各频道线程，带上线程名（channel:xx / prerender:xx）方便区分
+                thread = threading.current_thread().name
+                extra = {"thread": thread} if thread != "MainThread" else {}
+                self.record("log", message=line.rstrip(), **extra)
+        self._local.buffer = buffer
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class Daemon:
+    def __init__(self, config, log):
+        self.log = log
+        self.pipeline = BroadcastPipeline(config, on_event=self._on_event, on_progress=self._on_progress)
+        self.encoder = {}
+        self._last_progress_log = 0.0
+        self._signals = 0
+        self._done = threading.Event()
+        self._status_lock = threading.Lock()
+        self.control = None
+
+    def _on_event(self, event, level, data):
+        # 文案正文太长，日志里只记字数
+        if "script" in data:
+            data = dict(data, script_chars=len(data["script"]))
+            data.pop("script")
+        if event != "state":
+            self.log.record(event, level, **data)
+        self.write_status()
+
+    def _on_progress(self, snap):
+        self.encoder = snap
+        if time.time() - self._last_progress_log >= 30:
+            self._last_progress_log = time.time()
+            self.log.record("encoder", fps=snap.get("fps"), speed=snap.get("speed_now") or snap.get("speed"),
+                            bitrate=snap.get("bitrate"), preset=snap.get("preset"), restarts=snap.get("restarts"))
+
+    def write_status(self, final=False):
+        status = dict(self.pipeline.stats)
+        status.update({
+            "pid": os.getpid(),
+            "heartbeat": time.time(),
+            "mode": self.pipeline.config["mode"],
+            "paused": self.pipeline.paused,
+            "encoder": self.encoder,
+            "disk": self.pipeline.artifacts.usage() if self.pipeline.artifacts else None,
+            "api": get_scheduler().usage(),
+            "resilience": get_resilience().stats(),
+            "control_url": self.control.url if self.control else None,
+            "control_auth": bool(self.control and self.control.token),
+        })
+        if final:
+            status["state"] = STOPPED
+        try:
+            with self._status_lock:
+                _write_json(STATUS_FILE, status)
+        except OSError:
+            pass
+
+    def _handle_signal(self, signum, frame):
+        self._signals += 1
+        abort = self._signals > 1
+        self.log.record("signal", "warning", signal=signal.Signals(signum).name, abort=abort)
+        self.pipeline.stop(abort=abort)
+
+    def _poll_control(self):
+        """心跳 + 读取控制命令（Streamlit 页面写入）"""
+        last_heartbeat = 0.0
+        while not self._done.wait(1):
+            try:
+                with open(CONTROL_FILE, "r", encoding="utf-8") as f:
+                    command = json.load(f).get("command")
+                os.remove(CONTROL_FILE)
+            except (OSError, ValueError):
+                command = None
+            if command:
+                self.log.record("control", command=command)
+                if command == "pause":
+                    self.pipeline.pause()
+                elif command == "resume":
+                    self.pipeline.resume()
+                elif command == "skip":
+                    self.pipeline.skip()
+                elif command == "stop":
+                    self.pipeline.stop()
+                self.write_status()
+            if time.time() - last_heartbeat >= HEARTBEAT_SECONDS:
+                last_heartbeat = time.time()
+                self.write_status()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        os.makedirs("temp", exist_ok=True)
+        try:
+            os.remove(CONTROL_FILE)   # 不执行上次遗留的命令
+        except OSError:
+            pass
+
+        cfg = self.pipeline.config
+        self.log.record("startup", pid=os.getpid(), mode=cfg["mode"], voice=cfg["voice"],
+                        outputs=bool(cfg["yt_key"] or cfg["extra_outputs"]))
+        try:
+            self.pipeline.setup()
+        except Exception as e:
+            self.log.record("startup_failed", "error", message=str(e))
+            return 1
+
+        if cfg["control_port"]:
+            # 🔥 本地控制接口：运行中换关键词 / 音色 / 人设等，下一条生效，不断流
+            try:
+                self.control = ControlServer({self.pipeline.channel or "default": self.pipeline},
+                                             cfg["control_port"], token=cfg["control_token"])
+                self.control.start()
+                self.log.record("control_api", url=self.control.url)
+            except OSError as e:
+                self.log.record("control_api_failed", "warning", message=str(e))
+
+        poller = threading.Thread(target=self._poll_control, name="control", daemon=True)
+        poller.start()
+        try:
+            self.pipeline.run()
+        finally:
+            self._done.set()
+            poller.join(timeout=5)
+            if self.control:
+                self.control.stop()
+            if self.pipeline.pool:
+                self.pipeline.pool.stop()
+            # 最后一次写终态：页面立刻看到已停止，不会在心跳过期前一直显示在运行
+            self.write_status(final=True)
+            self.log.record("shutdown", round=self.pipeline.stats["round"],
+                            success=self.pipeline.stats["success"], error=self.pipeline.stats["error"])
+        return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="加密大漂亮 - 后台守护进程")
+    parser.add_argument("--config", help="JSON 配置文件（覆盖环境变量）")
+    args = parser.parse_args(argv)
+
+    log = JsonLog(sys.stdout)
+    sys.stdout = log
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        log.record("config_error", "error", message=str(e))
+        return 2
+    return Daemon(config, log).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# 🔥 每轮的开播期限
+# 一轮从开始准备算起，必须在 total 秒内准备好能播的东西；每个阶段另有自己的预算：
+#   search（搜新闻）/ evidence（搜证据）/ generation（写稿，含多次重试）/ synthesis（语音合成）/ render（试听渲染）
+# 阶段超预算就放弃这一步（抛 DeadlineExceeded），这一轮降级到现成的内容：
+#   已经写出的最好一版稿子 → 预渲染好的备用话题 → 存档老视频
+# 期限挂在线程上（和 rate_limiter.request_priority 一样），
+# 所有外部调用都经过 resilience.call，在那里按剩余时间等结果，上游再慢也不会卡住直播
+
+# 单位秒，0 = 该阶段不单独限时（仍受 total 约束）
+DEFAULT_BUDGETS = {
+    "total": 600,
+    "search": 60,
+    "evidence": 60,
+    "generation": 300,
+    "synthesis": 240,
+    "render": 0,
+}
+
+_local = threading.local()
+
+
+class DeadlineExceeded(RuntimeError):
+    """某个阶段（或整轮）超出预算"""
+
+    def __init__(self, stage, budget):
+        super().__init__(f"{stage} 超出时间预算 ({budget:.0f}s)")
+        self.stage = stage
+        self.budget = budget
+
+
+class Deadline:
+    """
+    deadline = Deadline({"total": 600, "search": 60, ...})
+    with deadline.activate():
+        with stage("search"):
+            ...               # 阶段内的外部调用最多等 deadline.remaining() 秒
+    """
+
+    def __init__(self, budgets=None):
+        self.budgets = dict(DEFAULT_BUDGETS)
+        self.budgets.update(budgets or {})
+        self.started_at = time.time()
+        self.stage = None
+        self.stage_started_at = self.started_at
+        self.spent = {}          # 各阶段实际耗时
+        self.exceeded = []       # 超预算的阶段
+
+    def _stage_left(self):
+        budget = self.budgets.get(self.stage) or 0
+        if not self.stage or not budget:
+            return None
+        return budget - (time.time() - self.stage_started_at)
+
+    def remaining(self):
+        """当前阶段还剩多少秒（阶段预算和整轮预算取小）；都不限时返回 None"""
+        left = []
+        if self.budgets.get("total"):
+            left.append(self.budgets["total"] - (time.time() - self.started_at))
+        stage_left = self._stage_left()
+        if stage_left is not None:
+            left.append(stage_left)
+        return max(0.0, min(left)) if left else None
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def check(self):
+        """超时就抛 DeadlineExceeded（在阶段之间的检查点调用）"""
+        if self.expired():
+            raise self.exceeded_error()
+
+    def exceeded_error(self):
+        stage_left = self._stage_left()
+        if stage_left is not None and stage_left <= 0:
+            stage, budget = self.stage, self.budgets[self.stage]
+        else:
+            stage, budget = "total", self.budgets["total"]
+        if stage not in self.exceeded:
+            self.exceeded.append(stage)
+        return DeadlineExceeded(stage, budget)
+
+    @contextmanager
+    def enter(self, name):
+        previous, previous_started = self.stage, self.stage_started_at
+        self.stage, self.stage_started_at = name, time.time()
+        try:
+            yield self
+        finally:
+            self.spent[name] = round(self.spent.get(name, 0) + time.time() - self.stage_started_at, 2)
+            self.stage, self.stage_started_at = previous, previous_started
+
+    @contextmanager
+    def activate(self):
+        """把期限挂到当前线程上，块内的 stage() / resilience.call 都按它限时"""
+        previous = getattr(_local, "deadline", None)
+        _local.deadline = self
+        try:
+            yield self
+        finally:
+            _local.deadline = previous
+
+    def report(self):
+        return {"elapsed": round(time.time() - self.started_at, 1), "spent": dict(self.spent),
+                "exceeded": list(self.exceeded)}
+
+
+def current_deadline():
+    return getattr(_local, "deadline", None)
+
+
+@contextmanager
+def stage(name):
+    """with stage("search"): 当前线程没有期限时什么都不做"""
+    deadline = current_deadline()
+    if deadline is None:
+        yield None
+        return
+    deadline.check()
+    with deadline.enter(name):
+        yield deadline
+
+
+def time_left():
+    """当前线程的剩余时间；没有期限返回 None"""
+    deadline = current_deadline()
+    return deadline.remaining() if deadline else None
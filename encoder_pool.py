@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+
+# 🔥 编码器池
+# 一台机器上跑多个频道时，所有 FFmpeg 编码任务都从这里领 CPU 配额，而不是各自盲目抢核：
+#   live（直播推流）  > preview（试听渲染） > prerender（后台预渲染）
+# 直播推流是实时的，永远不排队；其余任务按优先级等空闲核。
+# 每个任务按 -threads 线程数计入占用；没有指定线程数（x264 自动）的按半台机器计。
+# POSIX 下低优先级任务的 FFmpeg 进程还会调高 nice 值，抢 CPU 时让着直播。
+
+LIVE = 0
+PREVIEW = 1
+PRERENDER = 2
+PRIORITY_NAMES = {LIVE: "live", PREVIEW: "preview", PRERENDER: "prerender"}
+NICENESS = {LIVE: 0, PREVIEW: 5, PRERENDER: 10}
+
+
+def cpu_cores():
+    """当前进程可用的核数（容器 / taskset 限制后的值）"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+class EncoderPool:
+    """
+    with pool.slot(PRERENDER, threads=2, name="prerender:cn"):
+        ...运行 FFmpeg...
+    capacity: 总线程配额（默认等于可用核数）
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = max(1, capacity or cpu_cores())
+        self.auto_weight = max(1, self.capacity // 2)
+        self._cond = threading.Condition()
+        self._used = 0
+        self._running = {}
+        self._waiting = {LIVE: 0, PREVIEW: 0, PRERENDER: 0}
+        self._seq = 0
+        self.waited = 0.0
+
+    def _weight(self, threads):
+        return min(self.capacity, threads) if threads and threads > 0 else self.auto_weight
+
+    def _can_run(self, priority, weight):
+        if priority == LIVE:
+            return True
+        # 有更高优先级在排队时不插队
+        if any(self._waiting[p] for p in self._waiting if p < priority):
+            return False
+        # 池子空着时至少放行一个，避免权重大于配额的任务永远等不到
+        return self._used == 0 or self._used + weight <= self.capacity
+
+    def acquire(self, priority=PREVIEW, threads=0, name="encoder", should_abort=None):
+        """领取配额；返回任务 id，等待中 should_abort() 为 True 时返回 None"""
+        weight = self._weight(threads)
+        started = time.time()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while not self._can_run(priority, weight):
+                    if should_abort and should_abort():
+                        return None
+                    self._cond.wait(1)
+            finally:
+                self._waiting[priority] -= 1
+            self._seq += 1
+            job = self._seq
+            self._used += weight
+            self._running[job] = {"name": name, "priority": PRIORITY_NAMES[priority],
+                                  "threads": threads, "weight": weight, "started_at": time.time()}
+        waited = time.time() - started
+        if waited > 1:
+            self.waited += waited
+            print(f"⏳ [{name}] 等待编码配额 {waited:.0f}s")
+        return job
+
+    def release(self, job):
+        with self._cond:
+            info = self._running.pop(job, None)
+            if info:
+                self._used -= info["weight"]
+            self._cond.notify_all()
+
+    def slot(self, priority=PREVIEW, threads=0, name="encoder", should_abort=None):
+        return _Slot(self, priority, threads, name, should_abort)
+
+    def usage(self):
+        """{"capacity", "used", "running": [...], "waiting": {...}, "waited"}"""
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "used": self._used,
+                "running": list(self._running.values()),
+                "waiting": {PRIORITY_NAMES[p]: n for p, n in self._waiting.items()},
+                "waited": round(self.waited, 1),
+            }
+
+
+class _Slot:
+    def __init__(self, pool, priority, threads, name, should_abort):
+        self.pool = pool
+        self.args = (priority, threads, name, should_abort)
+        self.job = None
+
+    def __enter__(self):
+        self.job = self.pool.acquire(*self.args)
+        return self.job
+
+    def __exit__(self, *exc):
+        if self.job is not None:
+            self.pool.release(self.job)
+        return False
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_encoder_pool():
+    """进程内共享的编码器池（所有频道共用一个）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EncoderPool()
+        return _pool
+
+
+def configure_encoder_pool(capacity=None):
+    """多频道编排器启动时按配置重设配额"""
+    global _pool
+    with _pool_lock:
+        _pool = EncoderPool(capacity)
+        return _pool
@@ -0,0 +1,347 @@
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+
+from encoder_pool import NICENESS, get_encoder_pool
+
+# 🔥 FFmpeg 进程守护
+# 用 -progress 把实时进度写到 stderr，边跑边解析 fps / speed / bitrate；
+# 进度停滞或速度持续跟不上实时，就杀掉重启（带退避），
+# 主机扛不住实时编码时自动降一档 x264 preset / 码率。
+
+STATS_FILE = "temp/ffmpeg_stats.json"
+
+# 编码档位：从上到下越来越省 CPU
+ENCODER_LADDER = [
+    {"preset": "veryfast", "video_bitrate": "3000k"},
+    {"preset": "superfast", "video_bitrate": "2500k"},
+    {"preset": "ultrafast", "video_bitrate": "2000k"},
+    {"preset": "ultrafast", "video_bitrate": "1500k"},
+]
+
+PROGRESS_KEYS = {
+    "frame", "fps", "bitrate", "total_size", "out_time_us", "out_time_ms",
+    "out_time", "dup_frames", "drop_frames", "speed", "progress",
+}
+
+STALL_TIMEOUT = 20        # 进度超过 20 秒不前进 → 判定卡死（半死的 RTMP 连接）
+SLOW_SPEED = 0.95         # 实时推流速度低于 0.95x ...
+SLOW_WINDOW = 15          # ... 且持续 15 秒 → 降档
+WARMUP = 10               # 启动后 10 秒内不判断速度
+MAX_RESTARTS = 5
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+RECOVER_AFTER = 3         # 连续 3 段没有降档，尝试升回一档
+
+# 全局实时数据：name -> 最新快照，供 UI 和监控读取
+LIVE_STATS = {}
+_stats_lock = threading.Lock()
+_last_stats_dump = 0.0
+
+# 每个任务名当前所在档位，跨段保留（上一段降过档，下一段直接从低档开始）
+_adaptive_level = {}
+_clean_runs = {}
+
+
+def get_live_stats(name=None):
+    """读取实时编码数据（线程安全的拷贝）"""
+    with _stats_lock:
+        if name:
+            return dict(LIVE_STATS.get(name, {}))
+        return {k: dict(v) for k, v in LIVE_STATS.items()}
+
+
+def _publish(name, snapshot):
+    global _last_stats_dump
+    with _stats_lock:
+        LIVE_STATS[name] = snapshot
+        now = time.time()
+        if now - _last_stats_dump < 5 and snapshot.get("state") == "running":
+            return
+        _last_stats_dump = now
+        data = {k: dict(v) for k, v in LIVE_STATS.items()}
+    # 落盘给外部监控（Prometheus textfile / 自定义脚本）采集
+    try:
+        tmp = STATS_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, STATS_FILE)
+    except OSError:
+        pass
+
+
+def _parse_speed(value):
+    try:
+        return float(value.rstrip("x"))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _parse_block(block):
+    """把一组 key=value 进度行转换成数值快照"""
+    out_us = block.get("out_time_us") or block.get("out_time_ms")
+    try:
+        out_time = int(out_us) / 1_000_000
+    except (TypeError, ValueError):
+        out_time = None
+    try:
+        fps = float(block.get("fps", 0))
+    except ValueError:
+        fps = 0.0
+    try:
+        frame = int(block.get("frame", 0))
+    except ValueError:
+        frame = 0
+    return {
+        "frame": frame,
+        "fps": fps,
+        "speed": _parse_speed(block.get("speed")),
+        "bitrate": block.get("bitrate", "N/A").strip(),
+        "out_time": out_time,
+        "drop_frames": block.get("drop_frames", "0"),
+        "progress": block.get("progress"),
+    }
+
+
+class FFmpegSupervisor:
+    """
+    非阻塞运行一个长时间的 FFmpeg 任务
+    build_command(level, resume_at) -> 命令列表
+        level: ENCODER_LADDER 中的一档
+        resume_at: 重启时从第几秒续播（0 表示从头）
+    realtime: 是否是 -re 实时推流（只有实时任务才做降档判断）
+    stdout_handler: 需要读取 stdout 的场景（多路分发），在独立线程里调用 handler(stream)
+    should_abort: 返回 True 时立即终止且不再重启
+    resumable: 重启时能否从断点续播（写文件的任务只能从头重来）
+    on_progress: 每次收到进度时在调用线程里回调 on_progress(snapshot)
+    priority: 编码器池优先级（encoder_pool.LIVE / PREVIEW / PRERENDER），None 表示不经过编码器池
+    threads: 传给 build_command 的 level["threads"]（0 = x264 自动）
+    """
+
+    def __init__(self, build_command, name="encoder", realtime=True, duration=None,
+                 stdout_handler=None, should_abort=None, on_progress=None,
+                 resumable=True, max_restarts=MAX_RESTARTS, stall_timeout=STALL_TIMEOUT,
+                 priority=None, threads=0):
+        self.build_command = build_command
+        self.name = name
+        self.realtime = realtime
+        self.duration = duration
+        self.stdout_handler = stdout_handler
+        self.should_abort = should_abort
+        self.on_progress = on_progress
+        self.resumable = resumable
+        self.max_restarts = max_restarts
+        self.stall_timeout = stall_timeout
+        self.priority = priority
+        self.threads = threads or 0
+        self.level = _adaptive_level.get(name, 0) if realtime else 0
+        self.restarts = 0
+        self.stderr_tail = deque(maxlen=30)
+        self.last_error = None
+        self._last_progress = None
+
+    def _snapshot(self, state, progress=None, resume_at=0.0):
+        snap = {
+            "state": state,
+            "preset": ENCODER_LADDER[self.level]["preset"],
+            "video_bitrate": ENCODER_LADDER[self.level]["video_bitrate"],
+            "level": self.level,
+            "restarts": self.restarts,
+            "updated_at": time.time(),
+        }
+        progress = progress or self._last_progress
+        if progress:
+            snap.update(progress)
+            if progress.get("out_time") is not None:
+                snap["out_time"] = progress["out_time"] + resume_at
+                if self.duration:
+                    snap["percent"] = min(100.0, snap["out_time"] / self.duration * 100)
+        return snap
+
+    def _read_stderr(self, stream, blocks):
+        block = {}
+        for raw in iter(stream.readline, b""):
+            line = raw.decode("utf-8", errors="replace").strip()
+            key, sep, value = line.partition("=")
+            if sep and key in PROGRESS_KEYS:
+                block[key] = value
+                if key == "progress":
+                    blocks.put(_parse_block(block))
+                    block = {}
+            elif line:
+                self.stderr_tail.append(line)
+        blocks.put(None)
+
+    def _launch(self, resume_at):
+        level = dict(ENCODER_LADDER[self.level], threads=self.threads)
+        command = list(self.build_command(level, resume_at))
+        # 进度写到 stderr，关闭默认的单行统计输出
+        command[1:1] = ['-nostats', '-progress', 'pipe:2']
+        niceness = NICENESS.get(self.priority, 0)
+        proc = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE if self.stdout_handler else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            # 低优先级任务降低调度优先级，抢 CPU 时让着直播
+            preexec_fn=(lambda: os.nice(niceness)) if niceness and os.name == "posix" else None,
+        )
+        blocks = queue.Queue()
+        threading.Thread(target=self._read_stderr, args=(proc.stderr, blocks), daemon=True).start()
+        if self.stdout_handler:
+            threading.Thread(target=self.stdout_handler, args=(proc.stdout,), daemon=True).start()
+        return proc, blocks
+
+    def _watch(self, proc, blocks, resume_at):
+        """监视一次运行，返回 (结束原因, 最后输出位置)"""
+        started = time.time()
+        last_advance = started
+        last_out = 0.0
+        slow_since = None
+        finished = False
+        # ffmpeg 报告的 speed 是累计平均值，反应太慢；用最近几秒的样本算瞬时速度
+        samples = deque(maxlen=10)
+
+        while True:
+            try:
+                progress = blocks.get(timeout=1)
+            except queue.Empty:
+                progress = False
+            now = time.time()
+
+            if progress is None:
+                # stderr 关闭 → 进程即将退出
+                proc.wait()
+                break
+
+            if progress:
+                out_time = progress.get("out_time")
+                if out_time is not None and out_time > last_out:
+                    last_out = out_time
+                    last_advance = now
+                if progress.get("progress") == "end":
+                    finished = True
+
+                speed = None
+                if out_time is not None:
+                    samples.append((now, out_time))
+                    if len(samples) >= 4 and now - samples[0][0] > 0:
+                        speed = (out_time - samples[0][1]) / (now - samples[0][0])
+                        progress["speed_now"] = round(speed, 3)
+                if self.realtime and speed is not None and now - started > WARMUP:
+                    if speed < SLOW_SPEED:
+                        slow_since = slow_since or now
+                    else:
+                        slow_since = None
+
+                self._last_progress = progress
+                snap = self._snapshot("running", progress, resume_at)
+                _publish(self.name, snap)
+                if self.on_progress:
+                    try:
+                        self.on_progress(snap)
+                    except Exception as e:
+                        print(f"⚠️ 进度回调失败: {e}")
+
+            if self.should_abort and self.should_abort():
+                proc.kill()
+                proc.wait()
+                return "abort", last_out
+
+            if proc.poll() is not None and blocks.empty():
+                break
+
+            if now - last_advance > self.stall_timeout:
+                print(f"⚠️ [{self.name}] 进度 {self.stall_timeout}s 无变化，判定卡死")
+                proc.kill()
+                proc.wait()
+                return "stall", last_out
+
+            if slow_since and now - slow_since > SLOW_WINDOW and self.level < len(ENCODER_LADDER) - 1:
+                print(f"⚠️ [{self.name}] 编码速度持续低于 {SLOW_SPEED}x，主机跟不上实时")
+                proc.kill()
+                proc.wait()
+                return "slow", last_out
+
+        if proc.returncode == 0 or finished:
+            return "done", last_out
+        return "error", last_out
+
+    def run(self):
+        """运行直到完成；返回 True 表示成功（经过编码器池时先领配额）"""
+        if self.priority is None:
+            return self._run()
+        pool = get_encoder_pool()
+        _publish(self.name, self._snapshot("queued"))
+        with pool.slot(self.priority, self.threads, self.name, self.should_abort) as job:
+            if job is None:
+                self.last_error = "aborted"
+                _publish(self.name, self._snapshot("aborted"))
+                return False
+            return self._run()
+
+    def _run(self):
+        resume_at = 0.0
+        degraded = False
+
+        while True:
+            _publish(self.name, self._snapshot("starting", resume_at=resume_at))
+            proc, blocks = self._launch(resume_at)
+            reason, out_time = self._watch(proc, blocks, resume_at)
+
+            if reason == "done":
+                _publish(self.name, self._snapshot("done", resume_at=resume_at))
+                self._remember_level(degraded)
+                return True
+
+            if reason == "abort":
+                self.last_error = "aborted"
+                print(f"⏹️ [{self.name}] 任务被终止")
+                _publish(self.name, self._snapshot("aborted", resume_at=resume_at))
+                return False
+
+            if reason == "slow":
+                self.level += 1
+                degraded = True
+                step = ENCODER_LADDER[self.level]
+                print(f"📉 [{self.name}] 自动降档 → preset={step['preset']}, 码率={step['video_bitrate']}")
+            else:
+                self.last_error = "\n".join(self.stderr_tail) or reason
+                print(f"❌ [{self.name}] FFmpeg 异常退出 ({reason}, code={proc.returncode})")
+                if self.stderr_tail:
+                    print("\n".join(list(self.stderr_tail)[-5:]))
+
+            if self.restarts >= self.max_restarts:
+                print(f"❌ [{self.name}] 已重启 {self.max_restarts} 次，放弃")
+                _publish(self.name, self._snapshot("failed", resume_at=resume_at))
+                self._remember_level(degraded)
+                return False
+
+            self.restarts += 1
+            if self.resumable:
+                resume_at += out_time
+            if self.duration and resume_at >= self.duration - 0.5:
+                # 其实已经播完了
+                _publish(self.name, self._snapshot("done", resume_at=resume_at))
+                return True
+            backoff = 0 if reason == "slow" else min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.restarts - 1))
+            print(f"🔄 [{self.name}] {backoff:.0f}s 后从 {resume_at:.1f}s 处续播（第 {self.restarts} 次重启）")
+            _publish(self.name, self._snapshot("restarting", resume_at=resume_at))
+            time.sleep(backoff)
+
+    def _remember_level(self, degraded):
+        if not self.realtime:
+            return
+        if degraded:
+            _clean_runs[self.name] = 0
+        else:
+            _clean_runs[self.name] = _clean_runs.get(self.name, 0) + 1
+            if self.level > 0 and _clean_runs[self.name] >= RECOVER_AFTER:
+                self.level -= 1
+                _clean_runs[self.name] = 0
+                print(f"📈 [{self.name}] 连续 {RECOVER_AFTER} 段稳定，升回 preset={ENCODER_LADDER[self.level]['preset']}")
+        _adaptive_level[self.name] = self.level
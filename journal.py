@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:          # Windows 没有 flock：只支持单个进程写同一份日志
+    fcntl = None
+
+# 🔥 播出日志（崩溃恢复）
+# 进程中途重启（崩溃 / OOM / 部署），正在做的这一轮全丢：轮次计数、选好的新闻、写好的稿子、合成好的语音、
+# 提前做好待播的下一条，重来一遍又是几分钟的 LLM + TTS，直播间一直黑着。
+# 这里每完成一个阶段就往日志里追加一行（写完 fsync 才算数）：
+#   {"op": "stats", ...}                           轮次 / 成功 / 错误计数
+#   {"op": "checkpoint", "rid", "stage", "plan"}   某一轮做到哪一步，产物文件的路径
+#   {"op": "done", "rid"}                          这一轮已开播 / 作废，不用再恢复
+# 启动时从头重放一遍就知道上次停在哪；最后一行写到一半被杀的直接忽略。
+# 日志只增不改，行数多了就压缩成当前快照（临时文件写完再原子替换）。
+# 页面和守护进程可能同时写同一个频道的日志：追加和压缩都持有旁边 .lock 文件的排他锁，
+# 压缩时从磁盘重新读一遍再写快照，不会丢掉另一个进程追加的记录。
+
+JOURNAL_FILE = "temp/journal.jsonl"
+COMPACT_EVERY = 500          # 追加这么多行后压缩一次
+
+# 阶段：文案已写好（重启后从合成接着做）/ 语音字幕都已就绪（重启后直接开播）
+SCRIPT = "script"
+READY = "ready"
+
+
+class RoundJournal:
+    """
+    journal.checkpoint(plan, SCRIPT)   # 每完成一个阶段记一笔（plan 里的产物只记路径）
+    journal.done(rid)                  # 开播 / 作废后移出
+    journal.save_stats(stats)          # 轮次计数
+    journal.pending()                  # 启动时：上次没播出的轮次，按准备时间排序
+    """
+
+    def __init__(self, path=JOURNAL_FILE, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._rounds = {}
+        self._appended = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._compact()
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程排他锁（锁旁边的 .lock 文件：日志本身压缩时会被替换成新文件）"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --- 读 ---
+
+    def _load(self):
+        """从磁盘重放整份日志（含其他进程追加的记录）"""
+        self._stats, self._rounds = {}, {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 写到一半被杀的最后一行
+                continue
+            self._apply(record)
+
+    def _apply(self, record):
+        op = record.get("op")
+        if op == "stats":
+            self._stats = record["stats"]
+        elif op == "checkpoint":
+            self._rounds[record["rid"]] = {"stage": record["stage"], "plan": record["plan"], "ts": record["ts"]}
+        elif op == "done":
+            self._rounds.pop(record["rid"], None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def pending(self):
+        """[{"stage", "plan", "ts"}, ...]，先准备的排前面"""
+        with self._lock:
+            entries = [dict(entry, plan=dict(entry["plan"])) for entry in self._rounds.values()]
+        return sorted(entries, key=lambda e: e["plan"].get("prepared_at", e["ts"]))
+
+    # --- 写 ---
+
+    def _append(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._apply(record)
+            try:
+                with self._file_lock(), open(self.path, "ab+") as f:
+                    size = f.seek(0, os.SEEK_END)
+                    if size:
+                        f.seek(size - 1)
+                        if f.read(1) != b"\n":
+                            # 另一个进程写到一半被杀：先换行，不和残行粘在一起
+                            line = b"\n" + line
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                print(f"⚠️ 播出日志写入失败: {e}")
+                return
+            self._appended += 1
+            if self._appended >= self.compact_every:
+                self._compact_locked()
+
+    def checkpoint(self, plan, stage):
+        plan = {k: v for k, v in plan.items() if k != "events"}
+        self._append({"op": "checkpoint", "rid": plan["rid"], "stage": stage, "plan": plan, "ts": time.time()})
+
+    def done(self, rid):
+        with self._lock:
+            known = rid in self._rounds
+        if rid and known:
+            self._append({"op": "done", "rid": rid})
+
+    def save_stats(self, stats):
+        self._append({"op": "stats", "stats": stats})
+
+    # --- 压缩 ---
+
+    def _compact(self):
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        try:
+            with self._file_lock():
+                # 以磁盘上的完整日志为准重放，再写快照
+                self._load()
+                records = [{"op": "stats", "stats": self._stats}] if self._stats else []
+                records += [{"op": "checkpoint", "rid": rid, **entry} for rid, entry in self._rounds.items()]
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ 播出日志压缩失败: {e}")
+            return
+        self._appended = 0
@@ -0,0 +1,341 @@
+import os
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# 🔥 备用话题知识库
+# 原来 knowledge_db.json 是一个扁平列表：每次保存整个重写，random.choice 还会连着抽到同一个话题。
+# 这里换成 SQLite（每个话题一行：标签 / 权重 / 播出次数 / 上次播出时间 / 预渲染成品目录），
+# CMS 保存只增删改有变化的行；抽题用树状数组（Fenwick）做 O(log n) 加权抽样：
+#   - 权重 = 话题权重 / (1 + 已播次数)，播得少的常青话题更容易被抽到
+#   - 最近抽过的话题权重临时置 0，窗口内不重复（重启后按 last_aired 恢复窗口）
+# 多个进程（页面 / 守护进程）共用同一个库：PRAGMA data_version 变了就重建内存索引
+
+DEFAULT_TOPICS = ["科普：比特币减半效应", "故事：披萨节的历史", "教学：如何保管私钥"]
+RECENT_WINDOW = 20          # 最近 20 次抽过的话题不再抽（话题数不足时自动缩小）
+EDITABLE_FIELDS = ("tags", "weight", "asset")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL UNIQUE,
+    tags TEXT NOT NULL DEFAULT '',
+    weight REAL NOT NULL DEFAULT 1.0,
+    air_count INTEGER NOT NULL DEFAULT 0,
+    last_aired REAL NOT NULL DEFAULT 0,
+    asset TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_topics_last_aired ON topics(last_aired);
+"""
+
+
+class FenwickTree:
+    """权重前缀和：单点修改 / 按前缀和定位都是 O(log n)"""
+
+    def __init__(self, weights=()):
+        self.values = list(weights)
+        self.size = len(self.values)
+        self.tree = [0.0] * (self.size + 1)
+        for i, w in enumerate(self.values, 1):
+            self.tree[i] += w
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def set(self, index, weight):
+        delta = weight - self.values[index]
+        self.values[index] = weight
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        total, i = 0.0, self.size
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, target):
+        """返回前缀和第一次超过 target 的下标"""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        # 浮点误差可能落到权重为 0 的槽位上：往回找最近的有效槽位
+        pos = min(pos, self.size - 1)
+        while pos > 0 and self.values[pos] <= 0:
+            pos -= 1
+        return pos
+
+
+class KnowledgeBase:
+    """
+    kb = get_knowledge_base("knowledge_db.json")   # 实际数据在 knowledge_db.sqlite3
+    kb.pick()                   → 加权抽一个近期没抽过的话题
+    kb.mark_aired(topic)        → 播出后记一次
+    kb.sync(rows)               → CMS 保存：只改有变化的行
+    """
+
+    def __init__(self, path, legacy_json=None, defaults=DEFAULT_TOPICS):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate(legacy_json, defaults)
+        self._load()
+
+    # --- 初始化 ---
+
+    def _migrate(self, legacy_json, defaults):
+        """新库第一次打开：导入旧的 knowledge_db.json，没有就写入默认话题"""
+        if self._conn.execute("PRAGMA user_version").fetchone()[0]:
+            return
+        topics = defaults
+        if legacy_json and os.path.exists(legacy_json):
+            try:
+                with open(legacy_json, "r", encoding="utf-8") as f:
+                    topics = json.load(f)
+                print(f"📚 已从 {legacy_json} 导入 {len(topics)} 个备用话题")
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 旧话题库读取失败，使用默认话题: {e}")
+        with self._conn:
+            now = time.time()
+            self._conn.executemany("INSERT OR IGNORE INTO topics (topic, created_at) VALUES (?, ?)",
+                                   [(t.strip(), now) for t in topics if t and t.strip()])
+            self._conn.execute("PRAGMA user_version = 1")
+
+    def _load(self):
+        """从库里重建内存索引（行缓存 + 树状数组 + 最近抽取窗口）"""
+        rows = [dict(r) for r in self._conn.execute("SELECT * FROM topics ORDER BY id")]
+        self._rows = {r["id"]: r for r in rows}
+        self._by_topic = {r["topic"]: r["id"] for r in rows}
+        self._slots = {r["id"]: i for i, r in enumerate(rows)}
+        self._ids = [r["id"] for r in rows]
+        self._free = []
+        aired = sorted((r for r in rows if r["last_aired"]), key=lambda r: r["last_aired"], reverse=True)
+        self._recent = deque(r["id"] for r in aired[:self._window()])
+        recent = set(self._recent)
+        self._tree = FenwickTree(0.0 if r["id"] in recent else self._weight(r) for r in rows)
+        self._version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _refresh(self):
+        """其他进程改过库就重建索引"""
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._version:
+            self._load()
+
+    # --- 索引维护 ---
+
+    @staticmethod
+    def _weight(row):
+        return max(0.0, float(row["weight"])) / (1 + row["air_count"])
+
+    def _window(self):
+        return min(RECENT_WINDOW, max(0, len(self._by_topic) - 1))
+
+    def _reindex(self, topic_id):
+        """某一行的权重变了：更新树状数组（在最近窗口里的保持 0）"""
+        row = self._rows[topic_id]
+        weight = 0.0 if topic_id in self._recent else self._weight(row)
+        self._tree.set(self._slots[topic_id], weight)
+
+    def _insert_slot(self, row):
+        self._rows[row["id"]] = row
+        self._by_topic[row["topic"]] = row["id"]
+        if not self._free:
+            # 槽位用完：整体扩容重建（摊还 O(1)）
+            grow = max(16, len(self._ids))
+            self._free = list(range(len(self._ids) + grow - 1, len(self._ids) - 1, -1))
+            self._ids.extend([None] * grow)
+            self._tree = FenwickTree(self._tree.values + [0.0] * grow)
+        slot = self._free.pop()
+        self._ids[slot] = row["id"]
+        self._slots[row["id"]] = slot
+        self._reindex(row["id"])
+
+    def _remove_slot(self, topic_id):
+        row = self._rows.pop(topic_id)
+        del self._by_topic[row["topic"]]
+        slot = self._slots.pop(topic_id)
+        self._tree.set(slot, 0.0)
+        self._ids[slot] = None
+        self._free.append(slot)
+        if topic_id in self._recent:
+            self._recent.remove(topic_id)
+
+    def _trim_recent(self):
+        while len(self._recent) > self._window():
+            topic_id = self._recent.popleft()
+            if topic_id in self._rows:
+                self._reindex(topic_id)
+
+    # --- 抽题 / 播出 ---
+
+    def pick(self):
+        """加权抽一个最近没抽过的话题；库为空返回 None"""
+        with self._lock:
+            self._refresh()
+            self._trim_recent()
+            total = self._tree.total()
+            if total <= 0:
+                # 权重全是 0（都设成 0 或都在窗口里）：退回等概率
+                candidates = [t for t, i in self._by_topic.items() if i not in self._recent] or list(self._by_topic)
+                return random.choice(candidates) if candidates else None
+            topic_id = self._ids[self._tree.find(random.random() * total)]
+            self._recent.append(topic_id)
+            self._tree.set(self._slots[topic_id], 0.0)
+            self._trim_recent()
+            return self._rows[topic_id]["topic"]
+
+    def mark_aired(self, topic):
+        with self._lock:
+            self._refresh()
+            topic_id = self._by_topic.get(topic.strip())
+            if topic_id is None:
+                return
+            now = time.time()
+            with self._conn:
+                self._conn.execute("UPDATE topics SET air_count = air_count + 1, last_aired = ? WHERE id = ?",
+                                   (now, topic_id))
+            row = self._rows[topic_id]
+            row["air_count"] += 1
+            row["last_aired"] = now
+            if topic_id not in self._recent:
+                self._recent.append(topic_id)
+                self._trim_recent()
+            self._reindex(topic_id)
+
+    # --- 编辑 ---
+
+    def add(self, topic, tags="", weight=1.0):
+        """新增话题；已存在返回 False"""
+        topic = topic.strip()
+        with self._lock:
+            self._refresh()
+            if not topic or topic in self._by_topic:
+                return False
+            with self._conn:
+                cur = self._conn.execute("INSERT INTO topics (topic, tags, weight, created_at) VALUES (?, ?, ?, ?)",
+                                         (topic, tags, weight, time.time()))
+            self._insert_slot(dict(self._conn.execute("SELECT * FROM topics WHERE id = ?",
+                                                      (cur.lastrowid,)).fetchone()))
+            return True
+
+    def remove(self, topic):
+        with self._lock:
+            self._refresh()
+            topic_id = self._by_topic.get(topic.strip())
+            if topic_id is None:
+                return False
+            with self._conn:
+                self._conn.execute("DELETE FROM topics WHERE id = ?", (topic_id,))
+            self._remove_slot(topic_id)
+            return True
+
+    def update(self, topic, **fields):
+        """修改 tags / weight / asset"""
+        unknown = set(fields) - set(EDITABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"不能修改的字段: {', '.join(sorted(unknown))}")
+        with self._lock:
+            self._refresh()
+            topic_id = self._by_topic.get(topic.strip())
+            if topic_id is None or not fields:
+                return False
+            with self._conn:
+                self._conn.execute(f"UPDATE topics SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                                   (*fields.values(), topic_id))
+            self._rows[topic_id].update(fields)
+            self._reindex(topic_id)
+            return True
+
+    def set_asset(self, topic, asset):
+        """记录 / 清除某个话题的预渲染成品目录"""
+        return self.update(topic, asset=asset)
+
+    def sync(self, rows):
+        """
+        CMS 保存：rows 为话题名列表，或 [{"topic", "tags", "weight"}, ...]
+        只删掉不在列表里的、新增没有的、修改 tags / weight 有变化的；返回 {"added", "removed", "updated"}
+        """
+        wanted = {}
+        for row in rows:
+            row = {"topic": row} if isinstance(row, str) else row
+            topic = (row.get("topic") or "").strip()
+            if topic:
+                wanted[topic] = {k: row[k] for k in ("tags", "weight") if row.get(k) is not None}
+        counts = {"added": 0, "removed": 0, "updated": 0}
+        with self._lock:
+            self._refresh()
+            for topic in [t for t in self._by_topic if t not in wanted]:
+                counts["removed"] += self.remove(topic)
+            for topic, fields in wanted.items():
+                topic_id = self._by_topic.get(topic)
+                if topic_id is None:
+                    counts["added"] += self.add(topic, **fields)
+                    continue
+                current = self._rows[topic_id]
+                changed = {k: v for k, v in fields.items() if current[k] != v}
+                if changed:
+                    counts["updated"] += self.update(topic, **changed)
+        return counts
+
+    # --- 查询 ---
+
+    def topics(self):
+        with self._lock:
+            self._refresh()
+            return [self._rows[i]["topic"] for i in sorted(self._rows)]
+
+    def rows(self):
+        with self._lock:
+            self._refresh()
+            return [dict(self._rows[i]) for i in sorted(self._rows)]
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {"topics": len(self._rows), "recent": len(self._recent),
+                    "with_asset": sum(1 for r in self._rows.values() if r["asset"])}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_bases = {}
+_bases_lock = threading.Lock()
+
+
+def kb_path(db_file):
+    """配置里的 db_file 沿用 knowledge_db.json 的写法，实际数据放在同名的 .sqlite3 里"""
+    root, ext = os.path.splitext(db_file)
+    return root + ".sqlite3" if ext == ".json" else db_file
+
+
+def get_knowledge_base(db_file):
+    """按路径共享的知识库实例（同一进程里各频道 / 预渲染线程 / 页面共用）"""
+    path = os.path.abspath(kb_path(db_file))
+    with _bases_lock:
+        kb = _bases.get(path)
+        if kb is None:
+            legacy = db_file if db_file.endswith(".json") else None
+            kb = _bases[path] = KnowledgeBase(path, legacy_json=legacy)
+        return kb
@@ -3,32 +3,77 @@ import json
 import time
 import re
 import datetime
-from langchain_openai import ChatOpenAI
-from tavily import TavilyClient
+import threading
+from search_cache import CachedSearch
+from rate_limiter import RateLimitedLLM, RateLimitedSearch, QuotaExceeded
+from resilience import ResilientLLM, ResilientSearch, CircuitOpen, get_resilience
+from deadline import DeadlineExceeded, stage
 
-# 历史记录文件
+# 历史记录文件（多频道共用一份，每条记录带频道名，各频道只和自己的记录查重）
 HISTORY_FILE = "topic_history.json"
+_history_lock = threading.Lock()
+
+# 🔥 HTTP 客户端按 Key 复用：每次点开始 / 每个频道都会新建 CryptoBrain，
+# 但底层的 ChatOpenAI（httpx 连接池）和 TavilyClient（requests.Session）共用同一个，
+# keep-alive 连接和 TLS 会话不用每次重新握手
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _shared_client(kind, api_key, factory):
+    with _clients_lock:
+        client = _clients.get((kind, api_key))
+        if client is None:
+            client = _clients[(kind, api_key)] = factory()
+        return client
+
+
+# 🔥 langchain_openai（连带 openai SDK）/ tavily 导入很慢，第一次真正要建客户端时才导入，
+# 只 import logic_core（中控台页面 / 守护进程启动）不付这笔开销
+def _create_llm(deepseek_key):
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model="deepseek-chat", 
+        api_key=deepseek_key,
+        base_url="https://api.deepseek.com",
+        temperature=1.2,  # 提高创造性
+        timeout=120,  # 增加超时时间，支持深度分析
+        max_tokens=4000,  # 🔥 明确设置最大token数，确保长内容生成
+        max_retries=0
+    )
+
+
+def _create_tavily(tavily_key):
+    from tavily import TavilyClient
+    return TavilyClient(api_key=tavily_key)
+
 
 class CryptoBrain:
-    def __init__(self, deepseek_key, tavily_key, topic_scope, persona_prompt, backup_topics, target_domains):
+    def __init__(self, deepseek_key, tavily_key, topic_scope, persona_prompt, backup_topics, target_domains,
+                 channel=None):
         self.backup_topics = backup_topics
+        self.knowledge_base = None            # 设置后备用话题从知识库加权抽取（不连续重复）
         self.target_domains = target_domains  # 用户指定的信源列表
+        self.channel = channel or None        # 多频道编排时的频道名
         
         # 1. 初始化大脑 (DeepSeek)
+        # 🔥 所有调用经过共享调度器：按 Key 限速、429 退避重试、每日配额记账
+        # （SDK 自带的重试关掉，避免两层重试叠加成请求风暴）
+        # 外面再包一层长尾控制：慢请求对冲、连续失败熔断
         if deepseek_key:
-            self.llm = ChatOpenAI(
-                model="deepseek-chat", 
-                api_key=deepseek_key,
-                base_url="https://api.deepseek.com",
-                temperature=1.2,  # 提高创造性
-                timeout=120,  # 增加超时时间，支持深度分析
-                max_tokens=4000  # 🔥 明确设置最大token数，确保长内容生成
-            )
+            llm = _shared_client("deepseek", deepseek_key, lambda: _create_llm(deepseek_key))
+            self.llm = ResilientLLM(RateLimitedLLM(llm, deepseek_key))
         else:
             self.llm = None
             
         # 2. 初始化搜索 (Tavily)
-        self.tavily = TavilyClient(api_key=tavily_key) if tavily_key else None
+        # 🔥 同进程内各频道共享搜索结果缓存，同一查询不重复请求
+        # 缓存在外层：命中缓存不占限速令牌和配额
+        if tavily_key:
+            tavily = _shared_client("tavily", tavily_key, lambda: _create_tavily(tavily_key))
+            self.tavily = CachedSearch(ResilientSearch(RateLimitedSearch(tavily, tavily_key)))
+        else:
+            self.tavily = None
         self.topic = topic_scope
         self.persona = persona_prompt
         
@@ -264,45 +309,58 @@ class CryptoBrain:
             print("⚠️ 标题为空，跳过去重检查")
             return False
         try:
-            if not os.path.exists(HISTORY_FILE):
-                with open(HISTORY_FILE, "w") as f:
-                    json.dump([{"topic": new_topic, "time": time.time()}], f)
-                return False
-            
-            with open(HISTORY_FILE, "r") as f: 
-                history = json.load(f)
-            
-            # 清理超过5小时的旧记录
-            current_time = time.time()
-            valid_history = [h for h in history if current_time - h['time'] < 5 * 3600]
-            
-            # 查重（关键词匹配 + 相似度）
-            is_dup = False
-            for h in valid_history:
-                if h['topic'] in new_topic or new_topic in h['topic']:
-                    is_dup = True
-                    break
-                # 词汇相似度检测
-                old_words = set(re.findall(r'\w+', h['topic'].lower()))
-                new_words = set(re.findall(r'\w+', new_topic.lower()))
-                if len(old_words & new_words) / max(len(new_words), 1) > 0.5:
-                    is_dup = True
-                    break
-            
-            # 如果不重复，更新文件
-            if not is_dup:
-                valid_history.append({"topic": new_topic, "time": current_time})
-                with open(HISTORY_FILE, "w") as f: 
-                    json.dump(valid_history, f, ensure_ascii=False, indent=2)
-                print(f"✅ 新话题已记录: {new_topic[:50]}...")
-            else:
-                print(f"⚠️ 话题重复，跳过: {new_topic[:50]}...")
-            
-            return is_dup
+            # 🔥 多频道同进程运行时，读-改-写整个过程加锁，避免互相覆盖
+            with _history_lock:
+                return self._check_and_record(new_topic)
         except Exception as e:
             print(f"⚠️ 去重检查失败: {e}")
             return False
 
+    def _check_and_record(self, new_topic):
+        current_time = time.time()
+        record = {"topic": new_topic, "time": current_time}
+        if self.channel:
+            record["channel"] = self.channel
+
+        if not os.path.exists(HISTORY_FILE):
+            with open(HISTORY_FILE, "w") as f:
+                json.dump([record], f, ensure_ascii=False)
+            return False
+
+        with open(HISTORY_FILE, "r") as f:
+            history = json.load(f)
+
+        # 清理超过5小时的旧记录
+        valid_history = [h for h in history if current_time - h['time'] < 5 * 3600]
+
+        # 查重（关键词匹配 + 相似度），只和本频道的记录比
+        is_dup = False
+        for h in valid_history:
+            if h.get('channel') != self.channel:
+                continue
+            if h['topic'] in new_topic or new_topic in h['topic']:
+                is_dup = True
+                break
+            # 词汇相似度检测
+            old_words = set(re.findall(r'\w+', h['topic'].lower()))
+            new_words = set(re.findall(r'\w+', new_topic.lower()))
+            if len(old_words & new_words) / max(len(new_words), 1) > 0.5:
+                is_dup = True
+                break
+
+        # 如果不重复，更新文件
+        if not is_dup:
+            valid_history.append(record)
+            tmp = HISTORY_FILE + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(valid_history, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, HISTORY_FILE)
+            print(f"✅ 新话题已记录: {new_topic[:50]}...")
+        else:
+            print(f"⚠️ 话题重复，跳过: {new_topic[:50]}...")
+
+        return is_dup
+
     def _clean_text(self, text):
         """
         🔥 强力去废话正则清洗器（扩展版）
@@ -387,36 +445,35 @@ class CryptoBrain:
             print("✅ 质量审核通过")
             return True, []
 
-    def fetch_news_and_analyze(self):
+    def _pick_backup_topic(self):
+        import random
+        backup = self.knowledge_base.pick() if self.knowledge_base else None
+        if not backup:
+            backup = random.choice(self.backup_topics) if self.backup_topics else "比特币去中心化精神科普"
+        print(f"📚 使用备用话题: {backup}")
+        return backup
+
+    def discover_news(self, limit=1, days=1, max_results=15):
         """
-        🔥 10步专业工作流程（主流程）
+        🔥 Step 1-4: 搜索 → 爆火潜力排序 → 去重 → 匹配框架
+        返回最多 limit 条 [(news_item, framework), ...]，选中的标题记入话题历史
+        搜索出错直接抛出，由调用方决定怎么兜底
         """
-        if not self.tavily: 
-            return None, "缺少 Tavily Key", False
-        
-        print("\n" + "="*50)
-        print("🎙️ 加密大漂亮 - 10步专业内容生产流程")
-        print("="*50)
-        
-        # Step 1-2: 实时热点追踪与筛选
         today_str = datetime.datetime.now().strftime("%Y-%m-%d")
         print(f"\n📡 Step 1-2: 追踪热点并筛选爆火话题 ({today_str})")
         
         domain_list = [d.strip() for d in self.target_domains.split(",") if d.strip()]
         
-        try:
+        with stage("search"):
             response = self.tavily.search(
                 query=f"crypto blockchain {self.topic} breaking news {today_str}",
                 search_depth="advanced",
                 include_domains=domain_list if domain_list else None,
-                max_results=15,  # 增加到15条，方便筛选
-                days=1
+                max_results=max_results,  # 默认15条，方便筛选
+                days=days
             )
-            results = response.get("results", [])
-            print(f"✅ 搜索到 {len(results)} 条候选新闻")
-        except Exception as e:
-            print(f"❌ 搜索失败: {e}")
-            return None, f"搜索失败: {e}", False
+        results = response.get("results", [])
+        print(f"✅ 搜索到 {len(results)} 条候选新闻")
 
         # 计算爆火潜力并排序
         scored_results = []
@@ -428,9 +485,7 @@ class CryptoBrain:
         print(f"📊 爆火潜力排序完成，Top1得分: {scored_results[0][0] if scored_results else 0}")
         
         # 筛选未讲过的新闻
-        selected_news = None
-        selected_framework = None
-        
+        selected = []
         for score, item in scored_results:
             # 🔥 FIX: 兼容不同字段名
             title = item.get('title') or item.get('name') or ''
@@ -439,23 +494,58 @@ class CryptoBrain:
                 continue
                 
             if not self._check_duplication(title):
-                selected_news = item
                 # Step 3-4: 智能框架匹配
-                selected_framework = self._match_framework(item)
+                framework = self._match_framework(item)
                 print(f"✅ 选中头条: {title[:50]}...")
-                print(f"🎯 Step 3-4: 匹配框架 → {selected_framework} ({self.frameworks[selected_framework]['name']})")
-                break
+                print(f"🎯 Step 3-4: 匹配框架 → {framework} ({self.frameworks[framework]['name']})")
+                selected.append((item, framework))
+                if len(selected) >= limit:
+                    break
+        return selected
+
+    def fetch_news_and_analyze(self):
+        """
+        🔥 10步专业工作流程（主流程）
+        """
+        if not self.tavily: 
+            return None, "缺少 Tavily Key", False
+
+        if get_resilience().is_open("deepseek"):
+            # 写稿服务熔断中：搜了也写不出来，直接走备用话题（预渲染成品不需要写稿）
+            print("⚠️ DeepSeek 熔断中，跳过新闻搜索，启用备用话题库...")
+            return self._pick_backup_topic(), None, True
+        
+        print("\n" + "="*50)
+        print("🎙️ 加密大漂亮 - 10步专业内容生产流程")
+        print("="*50)
+        
+        try:
+            selected = self.discover_news()
+        except (QuotaExceeded, CircuitOpen, DeadlineExceeded) as e:
+            # 搜索配额用完 / 熔断中 / 超时：不冷场，直接走备用话题（预渲染成品不耗 API）
+            print(f"⚠️ {e}，改用备用话题")
+            selected = []
+        except Exception as e:
+            print(f"❌ 搜索失败: {e}")
+            return None, f"搜索失败: {e}", False
         
         # 没新闻 → 启用 CMS 备用库
-        if not selected_news:
+        if not selected:
             print("⚠️ 无最新高价值新闻或都已讲过，启用备用话题库...")
-            import random
-            backup = random.choice(self.backup_topics) if self.backup_topics else "比特币去中心化精神科普"
-            print(f"📚 使用备用话题: {backup}")
-            return backup, None, True
+            return self._pick_backup_topic(), None, True
+
+        selected_news, selected_framework = selected[0]
+        return self.write_news_script(selected_news, selected_framework)
 
+    def write_news_script(self, selected_news, selected_framework):
+        """
+        🔥 Step 5-10: 证据收集 → 内容组织 → 按框架写稿 + 质量审核
+        返回 (文案, 错误, 是否转为备用话题)，同 fetch_news_and_analyze
+        """
         # Step 5: 证据收集与筛选
-        evidence = self._collect_evidence(self.topic, selected_news)
+        # （超时在 _collect_evidence 里按失败处理：只用原新闻当证据）
+        with stage("evidence"):
+            evidence = self._collect_evidence(self.topic, selected_news)
         
         # Step 6: 内容组织
         organized_content = self._organize_content(evidence, selected_framework, selected_news)
@@ -553,75 +643,127 @@ class CryptoBrain:
             best_script = None
             best_char_count = 0
             
-            for attempt in range(max_attempts):
-                print(f"🎨 第 {attempt + 1} 次生成..." if attempt > 0 else "🎨 开始生成内容...")
+            # 三次尝试共用一个写稿预算，超时就用已经写出的最好一版
+            with stage("generation"):
+                for attempt in range(max_attempts):
+                    print(f"🎨 第 {attempt + 1} 次生成..." if attempt > 0 else "🎨 开始生成内容...")
                 
-                # 根据尝试次数调整 prompt
-                if attempt == 0:
-                    current_prompt = prompt
-                elif attempt == 1:
-                    # 第二次：强调字数要求
-                    current_prompt = prompt.replace(
-                        "现在开始创作，直接输出文案正文（记住：至少1500字！）：",
-                        "🚨🚨🚨 上一次生成失败：字数严重不足！🚨🚨🚨\n\n" +
-                        "第二次尝试 - 必须满足以下要求：\n" +
-                        "1. 最少1500字，目标2000字以上\n" +
-                        "2. 每个框架环节详细展开，至少5-8句话\n" +
-                        "3. 不要写简短概括，要写深度长文\n" +
-                        "4. 多用具体数据、案例、时间线\n\n" +
-                        "现在开始创作，输出至少1500字的完整分析："
-                    )
-                else:
-                    # 第三次：最严厉警告
-                    current_prompt = prompt.replace(
-                        "现在开始创作，直接输出文案正文（记住：至少1500字！）：",
-                        "🔥🔥🔥 最后机会！前两次都失败了！🔥🔥🔥\n\n" +
-                        "第三次尝试 - 终极要求：\n" +
-                        "📝 必须生成至少1500字的深度分析文章\n" +
-                        "📝 每个论点展开至少300字\n" +
-                        "📝 像写论文一样详细、像报道一样深入\n" +
-                        "📝 不要简略、不要概括、不要省略\n\n" +
-                        "示例长度参考：\n" +
-                        "- 开头引入：200-300字\n" +
-                        "- 每个框架环节：300-400字 × 4-5个环节 = 1200-2000字\n" +
-                        "- 结尾总结：200-300字\n" +
-                        "总计：1500-2500字\n\n" +
-                        "立即开始创作完整的深度分析长文："
-                    )
+                    # 根据尝试次数调整 prompt
+                    if attempt == 0:
+                        current_prompt = prompt
+                    elif attempt == 1:
+                        # 第二次：强调字数要求
+                        current_prompt = prompt.replace(
+                            "现在开始创作，直接输出文案正文（记住：至少1500字！）：",
+                            "🚨🚨🚨 上一次生成失败：字数严重不足！🚨🚨🚨\n\n" +
+                            "第二次尝试 - 必须满足以下要求：\n" +
+                            "1. 最少1500字，目标2000字以上\n" +
+                            "2. 每个框架环节详细展开，至少5-8句话\n" +
+                            "3. 不要写简短概括，要写深度长文\n" +
+                            "4. 多用具体数据、案例、时间线\n\n" +
+                            "现在开始创作，输出至少1500字的完整分析："
+                        )
+                    else:
+                        # 第三次：最严厉警告
+                        current_prompt = prompt.replace(
+                            "现在开始创作，直接输出文案正文（记住：至少1500字！）：",
+                            "🔥🔥🔥 最后机会！前两次都失败了！🔥🔥🔥\n\n" +
+                            "第三次尝试 - 终极要求：\n" +
+                            "📝 必须生成至少1500字的深度分析文章\n" +
+                            "📝 每个论点展开至少300字\n" +
+                            "📝 像写论文一样详细、像报道一样深入\n" +
+                            "📝 不要简略、不要概括、不要省略\n\n" +
+                            "示例长度参考：\n" +
+                            "- 开头引入：200-300字\n" +
+                            "- 每个框架环节：300-400字 × 4-5个环节 = 1200-2000字\n" +
+                            "- 结尾总结：200-300字\n" +
+                            "总计：1500-2500字\n\n" +
+                            "立即开始创作完整的深度分析长文："
+                        )
                 
-                raw_script = self.llm.invoke(current_prompt).content
-                print(f"📝 原始生成字数: {len(raw_script)} 字")
+                    raw_script = self.llm.invoke(current_prompt).content
+                    print(f"📝 原始生成字数: {len(raw_script)} 字")
                 
-                clean_script = self._clean_text(raw_script)
-                print(f"🧹 清洗后字数: {len(clean_script)} 字")
+                    clean_script = self._clean_text(raw_script)
+                    print(f"🧹 清洗后字数: {len(clean_script)} 字")
                 
-                # 🔥 如果清洗后损失超过30%，使用原始版本
-                if len(clean_script) < len(raw_script) * 0.7:
-                    print(f"⚠️ 清洗损失过多（{100 - len(clean_script)/len(raw_script)*100:.1f}%），使用原始文本")
-                    clean_script = raw_script
+                    # 🔥 如果清洗后损失超过30%，使用原始版本
+                    if len(clean_script) < len(raw_script) * 0.7:
+                        print(f"⚠️ 清洗损失过多（{100 - len(clean_script)/len(raw_script)*100:.1f}%），使用原始文本")
+                        clean_script = raw_script
                 
-                # 记录最佳结果
-                if len(clean_script) > best_char_count:
-                    best_script = clean_script
-                    best_char_count = len(clean_script)
+                    # 记录最佳结果
+                    if len(clean_script) > best_char_count:
+                        best_script = clean_script
+                        best_char_count = len(clean_script)
                 
-                # Step 7: 质量审核
-                passed, issues = self._quality_check(clean_script)
+                    # Step 7: 质量审核
+                    passed, issues = self._quality_check(clean_script)
                 
-                if passed:
-                    print(f"✅ 文案生成完成，共 {len(clean_script)} 字")
-                    print("="*50 + "\n")
-                    return clean_script, None, False
-                else:
-                    print(f"❌ 第 {attempt + 1} 次生成未通过审核: {', '.join(issues)}")
-                    if attempt < max_attempts - 1:
-                        print(f"🔄 将进行第 {attempt + 2} 次尝试...")
+                    if passed:
+                        print(f"✅ 文案生成完成，共 {len(clean_script)} 字")
+                        print("="*50 + "\n")
+                        return clean_script, None, False
+                    else:
+                        print(f"❌ 第 {attempt + 1} 次生成未通过审核: {', '.join(issues)}")
+                        if attempt < max_attempts - 1:
+                            print(f"🔄 将进行第 {attempt + 2} 次尝试...")
             
             # 如果所有尝试都失败，返回最佳结果
             print(f"⚠️ {max_attempts} 次尝试后，使用最佳结果（{best_char_count}字）")
             print("="*50 + "\n")
             return best_script if best_script else clean_script, None, False
             
+        except (CircuitOpen, DeadlineExceeded) as e:
+            # 写稿途中熔断 / 超出写稿预算：有能用的稿就播，没有就转备用话题
+            if best_script:
+                print(f"⚠️ {e}，使用已生成的最佳结果（{best_char_count}字）")
+                return best_script, None, False
+            print(f"⚠️ {e}，启用备用话题库...")
+            return self._pick_backup_topic(), None, True
         except Exception as e:
             print(f"❌ 生成失败: {e}")
             return None, f"生成失败: {e}", False
+
+    def write_backup_script(self, topic):
+        """
+        🔥 备用话题写稿（供预渲染池后台调用）
+        常青科普话题不需要搜新闻，直接按人设写一篇可播出的文案
+        """
+        if not self.llm:
+            return None
+
+        prompt = f"""
+{self.persona}
+
+【今日话题】
+{topic}
+
+【创作要求】
+1. 这是没有突发新闻时播出的常青节目，讲清楚来龙去脉、核心原理和对普通投资者的启发
+2. 不要编造具体日期、价格和最新数据，只讲经得起时间检验的内容
+3. 句子要短，像和朋友聊天一样自然，有观点有态度
+4. 字数：1500-2500字（8-15分钟播报时长）
+5. 不要出现(音效)、[动作]等剧本标记，不要用引号、括号，只用逗号、句号、问号、感叹号
+
+现在开始创作，直接输出文案正文：
+"""
+        best_script = None
+        for attempt in range(2):
+            try:
+                raw_script = self.llm.invoke(prompt).content
+            except (CircuitOpen, DeadlineExceeded) as e:
+                print(f"⚠️ 备用话题写稿跳过: {e}")
+                break
+            except Exception as e:
+                print(f"❌ 备用话题写稿失败: {e}")
+                continue
+            clean_script = self._clean_text(raw_script)
+            if len(clean_script) < len(raw_script) * 0.7:
+                clean_script = raw_script
+            if not best_script or len(clean_script) > len(best_script):
+                best_script = clean_script
+            passed, _ = self._quality_check(clean_script)
+            if passed:
+                break
+        return best_script
@@ -0,0 +1,105 @@
+import glob
+import os
+import threading
+import time
+from collections import deque
+
+# 🔥 监视器日志环形缓冲
+# 直播一跑就是 24 小时：每轮往页面里追加 st.info / st.expander、把整篇文案留在会话里，
+# 浏览器和服务端内存都会一直涨，页面越来越卡。
+# 这里只在内存里留最近 N 行日志 + 最近 N 轮摘要（固定容量的 deque），
+# 整篇文案 / 错误堆栈写到磁盘，要看时再按路径读；轮次滚出缓冲区时对应文件一起删掉，磁盘也不涨。
+
+MONITOR_DIR = "temp/monitor"
+MAX_LINES = 200          # 内存里保留的日志行数
+MAX_ROUNDS = 50          # 内存里保留的轮次摘要数（对应的文案 / 堆栈文件也只留这么多轮）
+
+
+class MonitorLog:
+    """
+    log.line("info", "🔄 第 3 轮 ...", round=3)
+    log.save_detail(3, "script", text)   → 文件路径（摘要里记路径，不记正文）
+    log.finish_round(3, ok=True, kind="ai", duration=182.5)
+    """
+
+    def __init__(self, max_lines=MAX_LINES, max_rounds=MAX_ROUNDS, log_dir=MONITOR_DIR):
+        self.log_dir = log_dir
+        self.max_rounds = max_rounds
+        self._lines = deque(maxlen=max_lines)
+        self._rounds = deque()
+        self._index = {}
+        self._lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+
+    # --- 写入 ---
+
+    def line(self, level, text, round=None):
+        with self._lock:
+            self._lines.append({"ts": time.time(), "level": level, "text": text, "round": round})
+
+    def _summary(self, round):
+        """取 / 建某一轮的摘要；超出容量时淘汰最老的一轮和它的文件"""
+        summary = self._index.get(round)
+        if summary is None:
+            summary = self._index[round] = {"round": round, "started_at": time.time(), "details": {}}
+            self._rounds.append(summary)
+            while len(self._rounds) > self.max_rounds:
+                old = self._rounds.popleft()
+                self._index.pop(old["round"], None)
+                for path in old["details"].values():
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        return summary
+
+    def start_round(self, round, **fields):
+        with self._lock:
+            self._summary(round).update(fields)
+
+    def finish_round(self, round, **fields):
+        with self._lock:
+            self._summary(round).update(fields, finished_at=time.time())
+
+    def save_detail(self, round, kind, text):
+        """整段文本写盘，摘要里只记路径"""
+        path = os.path.join(self.log_dir, f"r{round:06d}_{kind}.txt")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        except OSError as e:
+            print(f"⚠️ 监视器日志写盘失败: {e}")
+            return None
+        with self._lock:
+            self._summary(round)["details"][kind] = path
+        return path
+
+    # --- 读取 ---
+
+    def lines(self, round=None):
+        with self._lock:
+            return [l for l in self._lines if round is None or l["round"] == round]
+
+    def rounds(self):
+        with self._lock:
+            return [dict(r, details=dict(r["details"])) for r in self._rounds]
+
+    @staticmethod
+    def load_detail(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def clear(self):
+        """清空缓冲区和磁盘上的文件（新会话开始时调用，不继承上次留下的文件）"""
+        with self._lock:
+            self._lines.clear()
+            self._rounds.clear()
+            self._index.clear()
+        for path in glob.glob(os.path.join(self.log_dir, "r*_*.txt")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+加密大漂亮 - 多频道编排器
+一个进程托管多个频道（不同关键词 / 音色 / 人设 / 推流码），共享：
+    搜索结果缓存（search_cache）、TTS 分段缓存（tts_cache）、话题历史（topic_history.json）
+所有 FFmpeg 编码都从同一个编码器池领 CPU 配额：直播推流 > 试听渲染 > 后台预渲染
+
+用法：
+    python orchestrator.py --channels channels.json
+
+channels.json:
+    {
+      "encoder_capacity": 8,                  # 可选，编码线程总配额，默认等于可用核数
+      "defaults": {"deepseek_key": "...", "tavily_key": "..."},
+      "channels": [
+        {"channel": "cn", "yt_key": "...", "voice": "zh-CN-XiaoyiNeural", "topic": "Bitcoin, Ethereum"},
+        {"channel": "sol", "yt_key": "...", "voice": "zh-CN-YunxiNeural", "topic": "Solana, AI Agent",
+         "db_file": "channels/sol/knowledge_db.json", "encoder_threads": 2}
+      ]
+    }
+键名同 pipeline.DEFAULT_CONFIG；优先级：频道配置 > defaults > 环境变量 / .env
+没写 encoder_threads 的频道按 总配额 / 频道数 分线程
+
+日志为 JSON Lines（每行带 channel 字段）；SIGTERM 第一次：各频道播完当前这条后退出，第二次：立即中断
+"""
+
+import argparse
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+
+from control_api import ControlServer
+from daemon import JsonLog, STOPPED, load_config, _write_json
+from encoder_pool import configure_encoder_pool
+from pipeline import BroadcastPipeline
+from rate_limiter import get_scheduler
+from resilience import get_resilience
+from search_cache import get_search_cache
+from tts_cache import get_tts_cache
+
+STATUS_FILE = "temp/orchestrator_status.json"
+HEARTBEAT_SECONDS = 5
+_CHANNEL_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def load_channels(path):
+    """读取频道清单，返回 (编码配额, 每个频道的完整配置列表)"""
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    channels = spec.get("channels") or []
+    if not channels:
+        raise ValueError("频道清单为空")
+
+    base = load_config()
+    base.update(spec.get("defaults") or {})
+    configs = []
+    seen = set()
+    for channel in channels:
+        config = {**base, **channel}
+        name = str(config.get("channel") or "")
+        if not _CHANNEL_NAME.match(name):
+            raise ValueError(f"频道名只能包含字母、数字、下划线和横线: {name!r}")
+        if name in seen:
+            raise ValueError(f"频道名重复: {name}")
+        seen.add(name)
+        configs.append(config)
+    return spec.get("encoder_capacity"), configs
+
+
+class Orchestrator:
+    def __init__(self, configs, log, encoder_capacity=None):
+        self.log = log
+        self.encoder_pool = configure_encoder_pool(encoder_capacity)
+        default_threads = max(1, self.encoder_pool.capacity // len(configs))
+        self.pipelines = {}
+        self.encoders = {}
+        self._threads = {}
+        self._signals = 0
+        self._status_lock = threading.Lock()
+        self.control = None
+        for config in configs:
+            name = config["channel"]
+            config.setdefault("encoder_threads", default_threads)
+            self.pipelines[name] = BroadcastPipeline(
+                config,
+                on_event=lambda event, level, data, name=name: self._on_event(name, event, level, data),
+                on_progress=lambda snap, name=name: self.encoders.__setitem__(name, snap),
+            )
+
+    def _on_event(self, channel, event, level, data):
+        if "script" in data:
+            data = dict(data, script_chars=len(data["script"]))
+            data.pop("script")
+        if event != "state":
+            self.log.record(event, level, channel=channel, **data)
+
+    def write_status(self, final=False):
+        channels = {}
+        for name, pipeline in self.pipelines.items():
+            status = dict(pipeline.stats)
+            status.update({
+                "mode": pipeline.config["mode"],
+                "paused": pipeline.paused,
+                "running": name in self._threads and self._threads[name].is_alive(),
+                "encoder": self.encoders.get(name, {}),
+                "disk": pipeline.artifacts.usage() if pipeline.artifacts else None,
+            })
+            channels[name] = status
+        status = {
+            "state": STOPPED if final else "running",
+            "pid": os.getpid(),
+            "heartbeat": time.time(),
+            "channels": channels,
+            "encoder_pool": self.encoder_pool.usage(),
+            "search_cache": get_search_cache().stats(),
+            "tts_cache": get_tts_cache().stats(),
+            "api": get_scheduler().usage(),
+            "resilience": get_resilience().stats(),
+            "control_url": self.control.url if self.control else None,
+            "control_auth": bool(self.control and self.control.token),
+        }
+        try:
+            with self._status_lock:
+                _write_json(STATUS_FILE, status)
+        except OSError:
+            pass
+
+    def _handle_signal(self, signum, frame):
+        self._signals += 1
+        abort = self._signals > 1
+        self.log.record("signal", "warning", signal=signal.Signals(signum).name, abort=abort)
+        for pipeline in self.pipelines.values():
+            pipeline.stop(abort=abort)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        os.makedirs("temp", exist_ok=True)
+        self.log.record("startup", pid=os.getpid(), channels=list(self.pipelines),
+                        encoder_capacity=self.encoder_pool.capacity)
+
+        # 按顺序初始化（背景缓存等共享资源不并发准备），失败的频道跳过，不影响其他频道
+        for name, pipeline in self.pipelines.items():
+            try:
+                pipeline.setup()
+            except Exception as e:
+                self.log.record("startup_failed", "error", channel=name, message=str(e))
+                continue
+            thread = threading.Thread(target=pipeline.run, name=f"channel:{name}", daemon=True)
+            self._threads[name] = thread
+            thread.start()
+        if not self._threads:
+            return 1
+
+        # 🔥 本地控制接口：?channel=名字 改单个频道，不带改全部；端口 / 令牌取第一个频道的配置（一般写在 defaults 里）
+        first = next(iter(self.pipelines.values())).config
+        if first["control_port"]:
+            try:
+                self.control = ControlServer(self.pipelines, first["control_port"], token=first["control_token"])
+                self.control.start()
+                self.log.record("control_api", url=self.control.url)
+            except OSError as e:
+                self.log.record("control_api_failed", "warning", message=str(e))
+
+        try:
+            while any(t.is_alive() for t in self._threads.values()):
+                self.write_status()
+                for thread in self._threads.values():
+                    thread.join(HEARTBEAT_SECONDS / len(self._threads))
+        finally:
+            if self.control:
+                self.control.stop()
+            for pipeline in self.pipelines.values():
+                if pipeline.pool:
+                    pipeline.pool.stop()
+            self.write_status(final=True)
+            self.log.record("shutdown", channels={name: p.stats["round"] for name, p in self.pipelines.items()},
+                            search_cache=get_search_cache().stats())
+        return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="加密大漂亮 - 多频道编排器")
+    parser.add_argument("--channels", required=True, help="频道清单 JSON")
+    args = parser.parse_args(argv)
+
+    log = JsonLog(sys.stdout)
+    sys.stdout = log
+    try:
+        capacity, configs = load_channels(args.channels)
+    except (OSError, ValueError) as e:
+        log.record("config_error", "error", message=str(e))
+        return 2
+    return Orchestrator(configs, log, capacity).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
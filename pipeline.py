@@ -0,0 +1,806 @@
+import os
+import random
+import threading
+import time
+import traceback
+
+from logic_core import CryptoBrain
+from background_cache import prepare_background
+from prerender import PrerenderPool, POOL_DIR
+from knowledge_base import get_knowledge_base
+from artifact_manager import ArtifactManager, ROUNDS_DIR, PRODUCING, QUEUED, AIRING, AIRED
+from journal import RoundJournal, JOURNAL_FILE, SCRIPT, READY
+from rate_limiter import PREFETCH, get_scheduler, request_priority
+from resilience import get_resilience
+from async_runtime import get_runtime, run_async
+from deadline import Deadline, DeadlineExceeded, stage, time_left
+from subtitle_engine import generate_srt
+from stream_engine import (text_to_speech, prepare_speech_audio, encode_broadcast_audio, start_stream,
+                           create_preview_video, create_proxy_preview, preview_window)
+
+# 🔥 播出流水线
+# 一轮完整流程（搜新闻 → 写稿 → 合成 → 字幕 → 预览 / 推流）从 Streamlit 脚本里拆出来，
+# 不依赖任何界面组件：Streamlit 页面和后台守护进程 (daemon.py) 跑的是同一套代码，
+# 界面 / 日志通过 on_event 回调拿到每一步的结构化事件。
+
+DB_FILE = "knowledge_db.json"     # 旧版 JSON 话题库；实际数据在同名 .sqlite3 里（第一次打开时自动导入）
+ARCHIVE_DIR = "archive_videos"
+CHANNELS_DIR = "channels"     # 多频道时每个频道的私有目录（预渲染池 / 临时产物）
+ERROR_RETRY_SECONDS = 10
+PREPARE_AHEAD = 30            # 在当前内容结束前 30 秒开始准备下一条
+PREFETCH_LEAD = 120           # 下一条提前 2 分钟开始制作（搜索 + 写稿 + 合成），和本轮播出 / 等待重叠
+PREFETCH_MAX_AGE = 900        # 预取的新闻稿超过 15 分钟没播出就作废（暂停过久等情况）
+PARTIAL_PREVIEW_EVERY = 20    # 快速试听每多编出 20 秒通知一次页面，可以先播已经编好的部分
+
+PERSONA_PROMPT = """你是"加密大漂亮"，一位专业的加密货币播客主持人。
+你的风格：知性、犀利、专业、带点幽默、拒绝模棱两可。
+你像真人在聊天八卦，严禁"播音腔"或"念通稿"。
+你的任务是将新闻进行深度分析，给出独到见解，而不是简单复述。"""
+
+DEFAULT_CONFIG = {
+    "deepseek_key": "",
+    "tavily_key": "",
+    "yt_key": "",
+    "extra_outputs": "",
+    "target_domains": "coindesk.com, theblock.co, cointelegraph.com, decrypt.co",
+    "mode": "live",                    # live: 24H 循环推流；preview: 生成一条预览视频后结束
+    "topic": "Bitcoin, Ethereum, Solana, AI Agent",
+    "interval": 120,
+    "allow_replay": True,
+    "old_video_chance": 30,
+    "archive_live": False,
+    "prerender_backup": True,
+    "prerender_video": False,
+    "voice": "zh-CN-XiaoyiNeural",
+    "background": "assets/background.mp4",
+    "persona": PERSONA_PROMPT,
+    "channel": "",                     # 频道名；多频道编排时区分目录、编码任务和查重记录
+    "db_file": DB_FILE,                # 备用话题库，不同频道可以各用一份
+    "archive_dir": ARCHIVE_DIR,        # 历史视频库（插播 / 存档），不同人设的频道应各用一份
+    "encoder_threads": 0,              # x264 线程数，0 = 自动
+    "deepseek_daily_quota": 0,         # 每日 API 调用上限，0 = 不限（多频道共用同一个 Key 时合计）
+    "tavily_daily_quota": 0,
+    "hedge_requests": True,            # 慢请求超过 p95 时发对冲请求
+    "resilience": {},                  # 按服务细调对冲 / 熔断参数，如 {"deepseek": {"hedge_min": 30, "failure_threshold": 5}}
+    "preview_quality": "proxy",        # 试听渲染：proxy = 360p/12fps 快速代理（边编码边可播）；full = 原画质
+    "preview_seconds": 0,              # 试听只渲染开头 N 秒，0 = 整段
+    "preview_sentences": "",           # 试听只渲染第几句，如 "3" / "2-5"（优先于 preview_seconds）
+    "round_deadline": 600,             # 每轮从开始准备到能开播的总预算（秒），0 = 不限；超时降级到现成内容
+    "stage_budgets": {},               # 分阶段预算，覆盖 deadline.DEFAULT_BUDGETS，如 {"generation": 240, "render": 120}
+    "control_port": 0,                 # 守护进程 / 编排器的本地控制接口端口（control_api.py），0 = 不开
+    "control_token": "",               # 控制接口的访问令牌（Authorization: Bearer ...），留空不校验
+}
+
+# 运行中可以热更新的设置（control_api.py）：下一条开始前生效，推流不断、缓存和待播内容都保留
+HOT_KEYS = ("topic", "target_domains", "persona", "voice", "interval", "old_video_chance", "allow_replay")
+
+
+# --- 数据库操作 (CMS) ---
+def load_db(path=DB_FILE):
+    return get_knowledge_base(path).topics()
+
+
+def save_db(topics, path=DB_FILE):
+    """增量保存：topics 为话题名列表或 [{"topic", "tags", "weight"}, ...]"""
+    return get_knowledge_base(path).sync(topics)
+
+
+def check_hot_config(changes):
+    """校验一组热更新改动，返回规整后的字典；不合法抛 ValueError"""
+    unknown = [k for k in changes if k not in HOT_KEYS]
+    if unknown:
+        raise ValueError(f"不支持热更新: {', '.join(unknown)}（可改: {', '.join(HOT_KEYS)}）")
+    clean = {}
+    for key, value in changes.items():
+        expected = type(DEFAULT_CONFIG[key])
+        if expected is int and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, expected):
+            raise ValueError(f"{key} 应为 {expected.__name__}")
+        if expected is str and key != "target_domains" and not value.strip():
+            raise ValueError(f"{key} 不能为空")
+        if key == "interval" and value < 10:
+            raise ValueError("interval 不能小于 10 秒")
+        if key == "old_video_chance" and not 0 <= value <= 100:
+            raise ValueError("old_video_chance 应在 0-100 之间")
+        clean[key] = value
+    return clean
+
+
+def channel_path(channel, path):
+    """单频道沿用原来的目录；多频道时放到 channels/{频道}/ 下，互不清理对方的文件"""
+    return os.path.join(CHANNELS_DIR, channel, path) if channel else path
+
+
+def error_hint(message):
+    """🔥 常见错误提示"""
+    if "'title'" in message or "'name'" in message:
+        return "可能是新闻数据格式问题，已自动尝试兼容处理"
+    if "tavily" in message.lower():
+        return "Tavily API 可能出现问题，请检查网络连接或API密钥"
+    if "deepseek" in message.lower():
+        return "DeepSeek API 可能出现问题，请检查API密钥或余额"
+    return None
+
+
+class BroadcastPipeline:
+    """
+    on_event(event, level, data): 每一步的结构化事件（level: info / success / warning / error）
+    on_progress(snapshot): FFmpeg 实时编码数据
+    stop(): 播完当前这条再停；stop(abort=True) / skip(): 立即中断正在推的流
+    """
+
+    def __init__(self, config, on_event=None, on_progress=None):
+        self.config = {**DEFAULT_CONFIG, **config}
+        self.on_event = on_event
+        self.on_progress = on_progress
+        self.brain = None
+        self.knowledge_base = None
+        self.pool = None
+        self.artifacts = None
+        self.journal = None
+        self.video_path = None
+        self.current_round = None
+        self.stats = {
+            "state": "idle",
+            "round": 0,
+            "success": 0,
+            "error": 0,
+            "started_at": None,
+            "last_event": None,
+            "last_event_at": None,
+        }
+        self._stop = threading.Event()
+        self._abort = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._prefetch = None
+        self._prefetch_started = threading.Event()
+        self._local = threading.local()
+        self._recovered = []
+        self._config_lock = threading.Lock()
+        self._pending_config = {}
+
+    @property
+    def channel(self):
+        return self.config["channel"]
+
+    def _encoder_name(self, kind):
+        return f"{kind}:{self.channel}" if self.channel else kind
+
+    @property
+    def is_live(self):
+        return self.config["mode"] == "live"
+
+    # --- 事件 ---
+
+    def emit(self, event, level="info", **data):
+        buffer = getattr(self._local, "events", None)
+        if buffer is not None:
+            # 预取线程里的事件先攒着，真正播出这一条时再在主循环线程里补发（界面回调不跨线程）
+            buffer.append((event, level, data))
+            return
+        self.stats["last_event"] = event
+        self.stats["last_event_at"] = time.time()
+        if self.on_event:
+            try:
+                self.on_event(event, level, data)
+            except Exception as e:
+                print(f"⚠️ 事件回调失败 ({event}): {e}")
+
+    def _set_state(self, state):
+        self.stats["state"] = state
+        self.emit("state", state=state)
+
+    # --- 控制 ---
+
+    def stop(self, abort=False):
+        self._stop.set()
+        self._resume.set()
+        if abort:
+            self._abort.set()
+
+    def skip(self):
+        """中断当前这一条，直接进入下一轮"""
+        self._abort.set()
+
+    def pause(self):
+        self._resume.clear()
+        self._set_state("paused")
+
+    def resume(self):
+        self._resume.set()
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    @property
+    def stopping(self):
+        return self._stop.is_set()
+
+    def _should_abort(self):
+        return self._abort.is_set()
+
+    def _sleep(self, seconds):
+        """可被 stop() 打断的等待；返回 False 表示已收到停止信号"""
+        return not self._stop.wait(seconds)
+
+    # --- 初始化 ---
+
+    def setup(self, pool=None, brain=None):
+        """检查配置、准备背景缓存、初始化大脑和预渲染池；pool / brain 可传入已有实例复用"""
+        cfg = self.config
+        if not cfg["deepseek_key"] or not cfg["tavily_key"]:
+            raise ValueError("缺少 DeepSeek 或 Tavily Key")
+        if not os.path.exists(cfg["background"]):
+            raise FileNotFoundError(f"背景视频不存在: {cfg['background']}")
+
+        os.makedirs("temp", exist_ok=True)
+        os.makedirs(cfg["archive_dir"], exist_ok=True)
+
+        # 🔥 背景只在内容变化时标准化一次，之后每段都直接用缓存
+        self.emit("background", path=cfg["background"])
+        self.video_path = prepare_background(cfg["background"])
+
+        db_file = cfg["db_file"]
+        # 🔥 API 每日配额（调度器进程内共享，多个频道配置不同时取最后一个）
+        scheduler = get_scheduler()
+        if cfg["deepseek_daily_quota"]:
+            scheduler.configure("deepseek", daily=cfg["deepseek_daily_quota"])
+        if cfg["tavily_daily_quota"]:
+            scheduler.configure("tavily", daily=cfg["tavily_daily_quota"])
+
+        # 🔥 对冲 / 熔断参数（同样进程内共享）
+        resilience = get_resilience()
+        for provider in ("deepseek", "tavily"):
+            options = dict(cfg["resilience"].get(provider, {}))
+            options.setdefault("hedge", cfg["hedge_requests"])
+            resilience.configure(provider, **options)
+
+        if brain is None:
+            brain = CryptoBrain(cfg["deepseek_key"], cfg["tavily_key"], cfg["topic"], cfg["persona"],
+                                [], cfg["target_domains"], channel=self.channel)
+        # 备用话题从知识库加权抽取（复用的大脑也换成当前频道的库）
+        self.knowledge_base = brain.knowledge_base = get_knowledge_base(db_file)
+        self.brain = brain
+        self._setup_pool(pool)
+
+        # 🔥 每轮产物放进独立目录，播完按配额淘汰，24 小时跑下来磁盘不会被撑满
+        self.artifacts = ArtifactManager(channel_path(self.channel, ROUNDS_DIR))
+        self.artifacts.purge_legacy()
+        self.stats["started_at"] = time.time()
+        self._recover()
+
+    def _setup_pool(self, pool):
+        """🔥 备用话题预渲染：音色 / 背景 / 渲染选项变化时重建"""
+        cfg = self.config
+        pool_dir = channel_path(self.channel, POOL_DIR)
+        if pool and (pool.voice != cfg["voice"] or pool.background != self.video_path
+                     or pool.render_video != cfg["prerender_video"] or pool.pool_dir != pool_dir
+                     or not cfg["prerender_backup"]):
+            pool.stop()
+            pool = None
+        if cfg["prerender_backup"]:
+            if pool is None:
+                pool = PrerenderPool(self.brain, cfg["voice"], self.knowledge_base.topics, background=self.video_path,
+                                     render_video=cfg["prerender_video"], pool_dir=pool_dir,
+                                     threads=cfg["encoder_threads"], name=self._encoder_name("prerender"))
+            pool.brain = self.brain
+            pool.knowledge_base = self.knowledge_base
+            pool.load_topics = self.knowledge_base.topics
+            pool.start()
+        self.pool = pool
+
+    # --- 热更新 ---
+
+    def update_config(self, changes):
+        """
+        排队一组设置改动（键见 HOT_KEYS），下一条开始前生效；返回目前排队中的全部改动
+        键不支持热更新 / 值不合法时抛 ValueError，整组都不生效
+        """
+        clean = check_hot_config(changes)
+        with self._config_lock:
+            self._pending_config.update(clean)
+            pending = dict(self._pending_config)
+        self.emit("config_pending", keys=sorted(clean))
+        return pending
+
+    @property
+    def pending_config(self):
+        with self._config_lock:
+            return dict(self._pending_config)
+
+    def _apply_pending_config(self):
+        """在两条之间换设置：推流 / 搜索和 TTS 缓存 / 已排队的下一条都不动，新设置从下一次写稿起生效"""
+        with self._config_lock:
+            changes, self._pending_config = self._pending_config, {}
+        changes = {k: v for k, v in changes.items() if self.config[k] != v}
+        if not changes:
+            return
+        self.config.update(changes)
+        cfg = self.config
+        if self.brain:
+            self.brain.topic = cfg["topic"]
+            self.brain.target_domains = cfg["target_domains"]
+            self.brain.persona = cfg["persona"]
+        if "voice" in changes and self.pool:
+            # 预渲染成品按音色区分，换音色重建预渲染池（背景缓存、TTS 分段缓存不受影响）
+            self._setup_pool(self.pool)
+        self.emit("config_applied", "success", keys=sorted(changes))
+
+    def set_backup_topics(self, topics):
+        """替换备用话题库（话题名列表或 [{"topic", "tags", "weight"}, ...]），立即生效；返回增删改计数"""
+        changes = self.knowledge_base.sync(topics)
+        if self.pool:
+            # 立即补齐新话题、清理已删除话题的成品
+            self.pool.wake()
+        self.emit("topics_updated", **changes)
+        return changes
+
+    # --- 崩溃恢复 ---
+
+    def _recover(self):
+        """接上次进程没播出的轮次：语音字幕已就绪的直接排队待播，只写好文案的从合成接着做"""
+        self.journal = RoundJournal(channel_path(self.channel, JOURNAL_FILE))
+        self.stats.update(self.journal.stats())
+        self._recovered = []
+        now = time.time()
+        for entry in self.journal.pending():
+            plan, stage_done = entry["plan"], entry["stage"]
+            if self.artifacts.owned_elsewhere(plan["rid"]):
+                # 同一目录下另一个进程（页面 / 守护进程）正在用这一轮，不抢
+                continue
+            files = [plan[k] for k in ("audio_path", "srt_path", "rendered") if plan.get(k)] if stage_done == READY else []
+            fresh = plan["is_backup"] or now - plan["prepared_at"] <= PREFETCH_MAX_AGE
+            if not (self.artifacts.has(plan["rid"]) and fresh and all(os.path.exists(f) for f in files)):
+                # 产物已被淘汰 / 新闻已过时
+                self.journal.done(plan["rid"])
+                continue
+            self.artifacts.mark(plan["rid"], QUEUED if stage_done == READY else PRODUCING)
+            self._recovered.append(dict(plan, stage=stage_done))
+        if self._recovered:
+            self.emit("recovered", "success", round=self.stats["round"],
+                      ready=sum(p["stage"] == READY for p in self._recovered),
+                      scripts=sum(p["stage"] == SCRIPT for p in self._recovered))
+
+    def _take_recovered(self):
+        """上次没播出的轮次先播；只做到文案的接着合成"""
+        if not self._recovered:
+            return None
+        plan = self._recovered.pop(0)
+        stage_done = plan.pop("stage")
+        self.emit("resumed", "success", stage=stage_done, age=round(time.time() - plan["prepared_at"]))
+        self.emit("script", "success", script=plan["script"], is_backup=plan["is_backup"])
+        return plan if stage_done == READY else self._prepare(resume=plan)
+
+    def _save_stats(self):
+        if self.journal:
+            self.journal.save_stats({k: self.stats[k] for k in ("round", "success", "error")})
+
+    # --- 一轮 ---
+
+    def _pick_replay(self, is_backup, force=False):
+        """force: 超时降级时不看插播概率，有存档就播"""
+        cfg = self.config
+        if not ((is_backup or force) and cfg["allow_replay"]):
+            return None
+        archive_dir = cfg["archive_dir"]
+        local_videos = [f for f in os.listdir(archive_dir) if f.endswith(".mp4")]
+        if local_videos and (force or random.random() * 100 < cfg["old_video_chance"]):
+            return os.path.join(archive_dir, random.choice(local_videos))
+        return None
+
+    def _has_outputs(self):
+        return bool(self.config["yt_key"] or self.config["extra_outputs"].strip())
+
+    def run_round(self):
+        """
+        跑一轮；返回 {"ok", "kind", "duration"}
+        kind: replay（插播老视频）/ ai（AI 节目）/ none（无内容可播）
+        """
+        self._abort.clear()
+        self._apply_pending_config()
+        self.stats["round"] += 1
+        self._save_stats()
+        if self.current_round:
+            # 上一轮无论成功失败都已结束，文件可以参与淘汰了
+            self.artifacts.mark(self.current_round, AIRED)
+            self.current_round = None
+        self.emit("round_start", round=self.stats["round"], disk=self.artifacts.usage(), api=get_scheduler().usage(),
+                  resilience=get_resilience().stats(), **self._counts())
+        self._set_state("producing")
+
+        if self.pool:
+            self.pool.foreground_busy.set()
+        try:
+            plan = self._take_recovered() or self._take_prefetched() or self._prepare()
+            if plan["kind"] == "replay":
+                return self._air_replay(plan["file"])
+            if plan["kind"] == "none":
+                return self._finish(False, "none")
+            return self._air_program(plan)
+        finally:
+            if self.pool:
+                # 前台空闲，预渲染线程可以开始吃 CPU 了
+                self.pool.foreground_busy.clear()
+
+    def _budgets(self):
+        cfg = self.config
+        return {"total": cfg["round_deadline"], **cfg["stage_budgets"]}
+
+    def _prepare(self, resume=None):
+        """
+        A-C. 准备一条节目但不播出：写稿 → 决策 → 合成语音 + 字幕
+        返回 plan：{"kind": "replay", "file"} / {"kind": "none"} /
+                  {"kind": "ai", "rid", "script", "is_backup", "segment", "audio_path", "srt_path", "duration", "rendered"}
+        整个准备过程受开播期限约束，超时降级到现成内容
+        resume: 播出日志里恢复的、只写好文案的 plan，从合成接着做
+        """
+        prepared_at = resume["prepared_at"] if resume else time.time()
+        deadline = Deadline(self._budgets())
+        with deadline.activate():
+            try:
+                plan = self._synthesize(resume) if resume else self._prepare_plan(prepared_at)
+            except DeadlineExceeded as e:
+                plan = self._degrade(e, prepared_at)
+        plan["deadline"] = deadline.report()
+        if deadline.exceeded:
+            print(f"⏱️ 本轮超出时间预算的阶段: {', '.join(deadline.exceeded)} | 各阶段耗时 {deadline.spent}")
+        return plan
+
+    def _degrade(self, error, prepared_at):
+        """超出开播期限：不再等上游，改播现成的内容（预渲染备用话题 > 存档老视频）"""
+        segment = self.pool.take() if self.pool else None
+        replay_file = None if segment else self._pick_replay(True, force=True)
+        fallback = "prerender" if segment else "replay" if replay_file else "none"
+        self.emit("deadline", "warning", stage=error.stage, budget=error.budget, fallback=fallback)
+        if replay_file:
+            self.emit("replay", "warning", file=replay_file)
+            return {"kind": "replay", "file": replay_file, "prepared_at": prepared_at}
+        if not segment:
+            self.emit("no_content", "error", message=str(error))
+            return {"kind": "none", "prepared_at": prepared_at}
+        self.emit("script", "success", script=segment["script"], is_backup=True)
+        rid = self.artifacts.new_round("live" if self.is_live else "preview")
+        self.artifacts.mark(rid, QUEUED)
+        return {"kind": "ai", "rid": rid, "script": segment["script"], "is_backup": True, "segment": segment,
+                "topic": segment["topic"], "audio_path": segment["audio_path"], "srt_path": segment["srt_path"],
+                "duration": segment["duration"], "rendered": segment["video_path"], "prepared_at": prepared_at}
+
+    def _prepare_plan(self, prepared_at):
+        # A. 思考与写稿
+        script, err, is_backup = self.brain.fetch_news_and_analyze()
+
+        # B. 决策：是否插播老视频
+        replay_file = self._pick_replay(is_backup)
+        if replay_file:
+            self.emit("replay", "warning", file=replay_file)
+            return {"kind": "replay", "file": replay_file, "prepared_at": prepared_at}
+
+        if not script:
+            # 无内容可播
+            self.emit("no_content", "error", message=err)
+            return {"kind": "none", "prepared_at": prepared_at}
+
+        # 备用话题：优先取预渲染成品，没有现成的再当场写稿
+        ready_segment = None
+        topic = script if is_backup else None
+        if is_backup:
+            ready_segment = self.pool.take(script) if self.pool else None
+            if ready_segment:
+                # 这个话题没有现成的时 take() 会换成别的话题的成品：播出记录要记在实际播的话题上
+                topic = ready_segment.get("topic", topic)
+                script = ready_segment["script"]
+            else:
+                self.emit("backup_script", topic=script)
+                with stage("generation"):
+                    script = self.brain.write_backup_script(script) or script
+
+        self.emit("script", "success", script=script, is_backup=is_backup)
+
+        # C. 合成
+        rid = self.artifacts.new_round("live" if self.is_live else "preview")
+        plan = {"kind": "ai", "rid": rid, "script": script, "is_backup": is_backup, "segment": ready_segment,
+                "topic": topic, "prepared_at": prepared_at}
+        # 文案写好就记一笔：进程重启后不用再搜新闻 / 写稿
+        self.journal.checkpoint(plan, SCRIPT)
+        return self._synthesize(plan)
+
+    def _synthesize(self, plan):
+        rid, segment = plan["rid"], plan["segment"]
+        try:
+            if segment:
+                plan.update(audio_path=segment["audio_path"], srt_path=segment["srt_path"],
+                            duration=segment["duration"], rendered=segment["video_path"])
+            else:
+                audio_path, srt_path, audio_duration = self._produce_speech(plan["script"], rid)
+                plan.update(audio_path=audio_path, srt_path=srt_path, duration=audio_duration, rendered=None)
+        except Exception:
+            self.artifacts.mark(rid, AIRED)
+            self.journal.done(rid)
+            raise
+        self.artifacts.mark(rid, QUEUED)
+        # 语音字幕就绪：重启后直接开播
+        self.journal.checkpoint(plan, READY)
+        return plan
+
+    # --- 预取：下一条的制作和本轮播出 / 等待重叠 ---
+
+    def _prefetch_worker(self):
+        self._prefetch_started.set()
+        events = self._local.events = []
+        try:
+            with request_priority(PREFETCH):
+                plan = self._prepare()
+        finally:
+            self._local.events = None
+        if self.stopping and plan.get("rid"):
+            # 做完时已经收到停止信号，这一条本次不会播了（播出日志里还留着，下次启动直接接着播）
+            self.artifacts.mark(plan["rid"], AIRED)
+        plan["events"] = events
+        return plan
+
+    def _schedule_prefetch(self, duration):
+        """直播开始时排好下一条的制作：在预计开播前 PREFETCH_LEAD 秒动手"""
+        if not self.is_live or self.stopping or self._prefetch or self._recovered:
+            return
+        delay = max(0.0, (duration or 0) + self._wait_seconds(duration) - PREFETCH_LEAD)
+        self._prefetch_started.clear()
+        self._prefetch = get_runtime().call_later(delay, self._prefetch_worker)
+
+    def _take_prefetched(self):
+        future, self._prefetch = self._prefetch, None
+        if future is None:
+            return None
+        if not self._prefetch_started.is_set():
+            # 跳过 / 推流提前结束：预取还没开始，直接现做
+            future.cancel()
+            return None
+        try:
+            plan = future.result()
+        except Exception as e:
+            self.emit("prefetch_failed", "warning", message=str(e))
+            return None
+        for event, level, data in plan.pop("events"):
+            self.emit(event, level, prefetched=True, **data)
+
+        age = time.time() - plan["prepared_at"]
+        if plan["kind"] == "none" or (plan["kind"] == "ai" and not plan["is_backup"] and age > PREFETCH_MAX_AGE):
+            # 没内容或新闻已过时：重新搜一次
+            if plan.get("rid"):
+                self.artifacts.mark(plan["rid"], AIRED)
+                self.journal.done(plan["rid"])
+            self.emit("prefetch_stale", "warning", age=round(age))
+            return None
+        self.emit("prefetch_hit", "success", kind=plan["kind"], age=round(age))
+        return plan
+
+    def _discard_prefetch(self, forget=False):
+        """
+        作废排好的预取；forget=True 时同时移出播出日志（暂停：恢复后内容已过时，重启也不再接着播）
+        停止时不移出，下次启动直接接着播
+        """
+        future, self._prefetch = self._prefetch, None
+        if future is None:
+            return
+
+        def release(done):
+            # 没播出的预取产物交给配额淘汰
+            if not done.cancelled() and done.exception() is None and done.result().get("rid"):
+                self.artifacts.mark(done.result()["rid"], AIRED)
+                if forget:
+                    self.journal.done(done.result()["rid"])
+
+        future.cancel()
+        future.add_done_callback(release)
+
+    def _counts(self):
+        return {"success": self.stats["success"], "error": self.stats["error"]}
+
+    def _finish(self, ok, kind, duration=None):
+        self.stats["success" if ok else "error"] += 1
+        self._save_stats()
+        self.emit("round_done", "success" if ok else "error", ok=ok, kind=kind, duration=duration, **self._counts())
+        return {"ok": ok, "kind": kind, "duration": duration}
+
+    def _air_replay(self, replay_file):
+        if not self.is_live:
+            self.emit("preview_ready", "success", path=replay_file, replay=True)
+            return self._finish(True, "replay")
+        if not self._has_outputs():
+            self.emit("no_outputs", "error")
+            return self._finish(False, "replay")
+        self._set_state("airing")
+        self.emit("live_start", replay=True, file=replay_file)
+        self._schedule_prefetch(None)
+        ok = start_stream(self.config["yt_key"], replay_file, is_direct_file=True, outputs=self.config["extra_outputs"],
+                          on_progress=self.on_progress, should_abort=self._should_abort,
+                          name=self._encoder_name("live"), threads=self.config["encoder_threads"])
+        return self._finish(ok, "replay")
+
+    def _produce_speech(self, script, rid):
+        """合成语音 + 字幕；返回 (广播音轨, 字幕, 时长)"""
+        cfg = self.config
+        audio_path = self.artifacts.path(rid, "speech.mp3")
+        srt_path = self.artifacts.path(rid, "speech.ass")   # ASS 自带抖音样式，烧录时不用再 force_style
+
+        # 🔥 生成语音，同步收集逐词时间戳，直接写出精确字幕（超出合成预算就取消，整轮降级）
+        with stage("synthesis") as deadline:
+            try:
+                tts_report = run_async(text_to_speech(script, audio_path, use_ssml=True,
+                                                      voice=cfg["voice"], srt_path=srt_path), timeout=time_left())
+            except TimeoutError:
+                # run_async 超时统一抛内置 TimeoutError；TTS 自己的网络超时（期限没到）照常上抛
+                if deadline is None or not deadline.expired():
+                    raise
+                raise deadline.exceeded_error()
+        self.emit("tts", report={k: v for k, v in tts_report.items() if k not in ("cues", "chunks")},
+                  chunks=len(tts_report["chunks"]))
+
+        # 🔥 一次解码：算时长、去首尾静音、输出无损 WAV，字幕同步平移
+        speech = prepare_speech_audio(tts_report, self.artifacts.path(rid, "speech_clean.wav"))
+        audio_duration = speech["duration"]
+        # 🔥 整条链路唯一一次有损编码：预览 / 推流 / 存档都直接复用这条 AAC
+        audio_path = encode_broadcast_audio(speech["path"], self.artifacts.path(rid, "speech.m4a"))
+        self.emit("audio", duration=audio_duration)
+
+        if tts_report["srt_path"]:
+            self.emit("subtitles", source="boundary", lines=len(tts_report["cues"]))
+            return audio_path, srt_path, audio_duration
+        # 兜底：没有词边界事件时按时长估算
+        self.emit("subtitles", source="estimate")
+        if not generate_srt(script, audio_duration, srt_path):
+            return audio_path, None, audio_duration
+        return audio_path, srt_path, audio_duration
+
+    def _render_proxy(self, rid, audio_path, srt_path, audio_duration, should_abort):
+        """快速试听：代理画质、可只渲染一段；编出一部分就发 preview_partial，页面先播起来"""
+        cfg = self.config
+        start, length = preview_window(srt_path, audio_duration, cfg["preview_seconds"], cfg["preview_sentences"])
+        path = self.artifacts.path(rid, "preview_proxy.mp4")
+        notified = [0.0]
+
+        def progress(snap):
+            if self.on_progress:
+                self.on_progress(snap)
+            rendered = snap.get("out_time") or 0
+            if rendered - notified[0] >= PARTIAL_PREVIEW_EVERY:
+                notified[0] = rendered
+                self.emit("preview_partial", path=path, seconds=rendered, total=length)
+
+        self.emit("preview_window", start=start, duration=length)
+        return create_proxy_preview(self.video_path, audio_path, srt_path, path, start=start, duration=length,
+                                    on_progress=progress, should_abort=should_abort,
+                                    name=self._encoder_name("preview"), threads=cfg["encoder_threads"])
+
+    def _air_program(self, plan):
+        cfg = self.config
+        ts = int(time.time())
+        rid = self.current_round = plan["rid"]
+        # 开播就移出播出日志：推到一半崩溃不会重播同一条
+        self.journal.done(rid)
+        audio_path = plan["audio_path"]
+        srt_path = plan["srt_path"]
+        audio_duration = plan["duration"]
+        rendered = plan["rendered"]
+
+        if plan["segment"]:
+            # ⚡ 预渲染成品：跳过写稿 / 合成 / 字幕，直接播出
+            self.emit("prerender_hit", "success", topic=plan["segment"]["topic"])
+        elif not srt_path:
+            self.emit("subtitle_failed", "error")
+            return self._finish(False, "ai", audio_duration)
+        if plan["topic"] and self.knowledge_base:
+            self.knowledge_base.mark_aired(plan["topic"])
+
+        if not self.is_live:
+            # 试听模式：生成预览视频
+            self._set_state("rendering")
+            self.artifacts.mark(rid, AIRING)
+            # 渲染预算（stage_budgets["render"]，默认不限）：超时就中止 ffmpeg
+            deadline = Deadline({"total": 0, "render": self._budgets().get("render", 0)})
+
+            def should_abort():
+                return self._should_abort() or deadline.expired()
+
+            with deadline.enter("render"):
+                if rendered:
+                    final = rendered
+                elif cfg["preview_quality"] == "full":
+                    final = create_preview_video(self.video_path, audio_path, srt_path,
+                                                 self.artifacts.path(rid, "preview.mp4"),
+                                                 duration=audio_duration, on_progress=self.on_progress,
+                                                 should_abort=should_abort, name=self._encoder_name("preview"),
+                                                 threads=cfg["encoder_threads"])
+                else:
+                    final = self._render_proxy(rid, audio_path, srt_path, audio_duration, should_abort)
+                expired = not final and deadline.expired()
+            if final:
+                self.emit("preview_ready", "success", path=final, replay=False)
+            elif expired:
+                self.emit("deadline", "warning", stage="render", budget=deadline.budgets["render"], fallback="none")
+            else:
+                self.emit("render_failed", "error")
+            return self._finish(bool(final), "ai", audio_duration)
+
+        # 直播模式：推流
+        if not self._has_outputs():
+            self.emit("no_outputs", "error")
+            return self._finish(False, "ai", audio_duration)
+        outputs = cfg["extra_outputs"]
+        if cfg["archive_live"]:
+            prefix = f"ep_{self.channel}_" if self.channel else "ep_"
+            outputs += f"\n{cfg['archive_dir']}/{prefix}{ts}.mp4"
+        self._set_state("airing")
+        self.artifacts.mark(rid, AIRING)
+        self.emit("live_start", replay=False, duration=audio_duration)
+        self._schedule_prefetch(audio_duration)
+        encoder = {"name": self._encoder_name("live"), "threads": cfg["encoder_threads"]}
+        if rendered:
+            # 字幕已烧录好，按历史视频方式直接推
+            ok = start_stream(cfg["yt_key"], rendered, is_direct_file=True, outputs=outputs, duration=audio_duration,
+                              on_progress=self.on_progress, should_abort=self._should_abort, **encoder)
+        else:
+            ok = start_stream(cfg["yt_key"], self.video_path, audio_path, srt_path, outputs=outputs,
+                              duration=audio_duration, on_progress=self.on_progress, should_abort=self._should_abort,
+                              **encoder)
+        return self._finish(ok, "ai", audio_duration)
+
+    # --- 主循环 ---
+
+    def _wait_seconds(self, duration):
+        if duration:
+            # 如果有音频时长，在结束前30秒开始准备下一条
+            return max(10, duration - PREPARE_AHEAD)
+        return self.config["interval"]
+
+    def wait_next(self, result):
+        """D. 智能休息逻辑 (仅直播模式)；返回 False 表示收到停止信号"""
+        self._set_state("waiting")
+        duration = result.get("duration") if result else None
+        wait_time = self._wait_seconds(duration)
+        self.emit("waiting", seconds=wait_time, duration=duration)
+        return self._sleep(wait_time)
+
+    def run(self):
+        """🔥 核心：真正的无限循环（试听模式跑一条就结束）"""
+        while not self.stopping:
+            if not self._resume.is_set():
+                # 暂停前排好的下一条（包括不看时效的备用话题）恢复后不再播，恢复时重新准备
+                self._discard_prefetch(forget=True)
+                self.emit("paused")
+                self._resume.wait()
+                if self.stopping:
+                    break
+                self._set_state("resumed")
+            try:
+                result = self.run_round()
+            except KeyboardInterrupt:
+                self.emit("interrupted", "warning")
+                break
+            except Exception as e:
+                self.stats["error"] += 1
+                self._save_stats()
+                message = str(e)
+                self.emit("round_error", "error", message=message, hint=error_hint(message),
+                          traceback=traceback.format_exc(), **self._counts())
+                if not self.is_live:
+                    # 试听模式出错就停止
+                    break
+                self._set_state("retrying")
+                # 限流 / 配额错误带了建议等待时间，按它来，而不是固定 10 秒后再撞一次
+                delay = max(ERROR_RETRY_SECONDS, min(getattr(e, "retry_after", None) or 0, 3600))
+                if not self._sleep(delay):
+                    break
+                continue
+
+            if not self.is_live or not self.wait_next(result):
+                break
+
+        self._discard_prefetch()
+        if self.current_round:
+            self.artifacts.mark(self.current_round, AIRED)
+            self.current_round = None
+        self._set_state("stopped")
+        self.emit("finished", round=self.stats["round"], **self._counts())
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import threading
+import time
+
+from stream_engine import text_to_speech, prepare_speech_audio, encode_broadcast_audio, create_preview_video
+from encoder_pool import PRERENDER
+from rate_limiter import BACKGROUND, request_priority
+from async_runtime import run_async
+
+# 🔥 备用话题预渲染池
+# 没有新热点时，fetch_news_and_analyze 只返回一个 CMS 话题名，现场再写稿 + 合成要好几分钟。
+# 这里用一个后台线程，趁主循环空闲时把 CMS 里的每个话题提前做成可直接播出的成品：
+# 文案 + 广播音频 + 词级字幕（可选：烧好字幕的视频）。
+# 需要兜底时直接取现成的一段，秒级开播；CMS 话题增删改后自动补齐 / 清理。
+
+POOL_DIR = "assets/prerender"
+MAX_AGE_HOURS = 72           # 成品超过 3 天重新写稿，避免常青话题一直播同一版
+POLL_SECONDS = 30            # 话题库检查间隔
+RETRY_AFTER = 600            # 某个话题制作失败后，10 分钟内不再重试
+
+
+def topic_key(topic, voice):
+    """话题 + 音色 → 目录名（换音色后旧成品自动失效）"""
+    return hashlib.sha256(f"{voice}|{topic.strip()}".encode("utf-8")).hexdigest()[:16]
+
+
+class PrerenderPool:
+    """
+    每个成品一个目录：assets/prerender/{key}/
+        script.txt / speech.m4a / speech.ass / meta.json（/ video.mp4）
+    meta.json 写完才算成品，制作中途被杀不会留下半成品
+    """
+
+    def __init__(self, brain, voice, load_topics, background=None, render_video=False, pool_dir=POOL_DIR,
+                 threads=0, name="prerender"):
+        self.brain = brain
+        self.voice = voice
+        self.load_topics = load_topics
+        self.background = background
+        self.render_video = render_video
+        self.pool_dir = pool_dir
+        self.threads = threads          # 渲染时的 x264 线程数（编码器池按这个计配额）
+        self.name = name
+        self.knowledge_base = None      # 设置后把成品目录记到知识库对应话题上
+        self.foreground_busy = threading.Event()   # 前台在合成 / 编码时，不启动吃 CPU 的渲染
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._failed = {}
+        self._thread = None
+        os.makedirs(pool_dir, exist_ok=True)
+
+    # --- 成品读写 ---
+
+    def _dir(self, key):
+        return os.path.join(self.pool_dir, key)
+
+    def _read_meta(self, key):
+        try:
+            with open(os.path.join(self._dir(key), "meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        path = os.path.join(self._dir(key), "meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def _is_fresh(self, meta):
+        return meta and time.time() - meta.get("created_at", 0) < MAX_AGE_HOURS * 3600
+
+    def ready_segments(self):
+        """当前话题库里所有可直接播出的成品"""
+        segments = []
+        for topic in self.load_topics():
+            meta = self._read_meta(topic_key(topic, self.voice))
+            if self._is_fresh(meta):
+                segments.append(meta)
+        return segments
+
+    def take(self, topic=None):
+        """
+        取一段成品播出：优先取指定话题，否则取最久没播过的那段
+        返回 meta 字典（script / audio_path / srt_path / duration / video_path），没有成品返回 None
+        """
+        with self._lock:
+            chosen = None
+            if topic:
+                # 指定话题直接读它的成品，不用把整个话题库的成品扫一遍
+                meta = self._read_meta(topic_key(topic, self.voice))
+                chosen = meta if self._is_fresh(meta) else None
+            if chosen is None:
+                segments = self.ready_segments()
+                if not segments:
+                    return None
+                oldest = min(s.get("last_aired", 0) for s in segments)
+                chosen = random.choice([s for s in segments if s.get("last_aired", 0) == oldest])
+            chosen["last_aired"] = time.time()
+            chosen["aired_count"] = chosen.get("aired_count", 0) + 1
+            self._write_meta(chosen["key"], chosen)
+            return chosen
+
+    # --- 制作 ---
+
+    def produce(self, topic, allow_render=True):
+        """制作一个话题的完整成品；成功返回 meta，失败返回 None"""
+        topic = topic.strip()
+        key = topic_key(topic, self.voice)
+        seg_dir = self._dir(key)
+        work_dir = seg_dir + ".work"
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir, exist_ok=True)
+        started = time.time()
+        print(f"🧩 预渲染备用话题: {topic}")
+
+        try:
+            # API 调用排在直播写稿后面，且不动用每日配额的保留部分
+            with request_priority(BACKGROUND):
+                script = self.brain.write_backup_script(topic)
+            if not script:
+                raise RuntimeError("文案生成失败")
+            with open(os.path.join(work_dir, "script.txt"), "w", encoding="utf-8") as f:
+                f.write(script)
+
+            srt_path = os.path.join(work_dir, "speech.ass")
+            tts_report = run_async(text_to_speech(script, os.path.join(work_dir, "speech.mp3"),
+                                                  voice=self.voice, srt_path=srt_path))
+            if not tts_report["srt_path"]:
+                raise RuntimeError("没有词边界，无法生成字幕")
+            speech = prepare_speech_audio(tts_report, os.path.join(work_dir, "speech.wav"))
+            # 编码失败时返回的是原音频（WAV / MP3），那就留着它当成品音轨
+            audio_name = os.path.basename(encode_broadcast_audio(speech["path"], os.path.join(work_dir, "speech.m4a")))
+            for leftover in ("speech.mp3", "speech.wav"):
+                if leftover == audio_name:
+                    continue
+                try:
+                    os.remove(os.path.join(work_dir, leftover))
+                except OSError:
+                    pass
+
+            has_video = False
+            if self.render_video and allow_render and self.background:
+                # 渲染是整段最吃 CPU 的一步：等前台空下来再做
+                while self.foreground_busy.is_set() and not self._stop.is_set():
+                    time.sleep(5)
+                video = create_preview_video(self.background, os.path.join(work_dir, audio_name), srt_path,
+                                             os.path.join(work_dir, "video.mp4"), duration=speech["duration"],
+                                             should_abort=self._stop.is_set, name=self.name,
+                                             priority=PRERENDER, threads=self.threads)
+                has_video = bool(video)
+        except Exception as e:
+            print(f"⚠️ 预渲染失败 ({topic}): {e}")
+            shutil.rmtree(work_dir, ignore_errors=True)
+            self._failed[key] = time.time()
+            return None
+
+        # 整个目录一次性换上去，take() 永远看不到半成品
+        with self._lock:
+            shutil.rmtree(seg_dir, ignore_errors=True)
+            os.replace(work_dir, seg_dir)
+            meta = {
+                "key": key,
+                "topic": topic,
+                "voice": self.voice,
+                "script": script,
+                "audio_path": os.path.join(seg_dir, audio_name),
+                "srt_path": os.path.join(seg_dir, "speech.ass"),
+                "video_path": os.path.join(seg_dir, "video.mp4") if has_video else None,
+                "duration": speech["duration"],
+                "created_at": time.time(),
+                "last_aired": 0,
+                "aired_count": 0,
+            }
+            self._write_meta(key, meta)
+        if self.knowledge_base:
+            self.knowledge_base.set_asset(topic, seg_dir)
+        print(f"✅ 备用话题成品就绪: {topic} ({meta['duration']:.0f}s, 耗时 {time.time() - started:.0f}s)")
+        return meta
+
+    def sync(self):
+        """对照话题库：返回待制作的话题，顺便清理已删除话题的成品"""
+        topics = [t.strip() for t in self.load_topics() if t and t.strip()]
+        wanted = {topic_key(t, self.voice): t for t in topics}
+        with self._lock:
+            for name in os.listdir(self.pool_dir):
+                path = os.path.join(self.pool_dir, name)
+                if os.path.isdir(path) and name not in wanted and not name.endswith(".work"):
+                    shutil.rmtree(path, ignore_errors=True)
+                    print(f"🗑️ 话题已从 CMS 删除，清理预渲染: {name}")
+
+        pending = []
+        for key, topic in wanted.items():
+            if self._is_fresh(self._read_meta(key)):
+                continue
+            if time.time() - self._failed.get(key, 0) < RETRY_AFTER:
+                continue
+            pending.append(topic)
+        return pending
+
+    # --- 后台线程 ---
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                pending = self.sync()
+                for topic in pending:
+                    if self._stop.is_set():
+                        break
+                    self.produce(topic)
+            except Exception as e:
+                print(f"⚠️ 预渲染线程异常: {e}")
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+        print(f"🧩 备用话题预渲染已启动 ({self.pool_dir})")
+
+    def wake(self):
+        """话题库有变化时立即检查，不用等下一个轮询周期"""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# 🔥 API 调用调度器
+# DeepSeek / Tavily 的每次调用都先从令牌桶里拿令牌（按 服务商 + Key 分桶，多频道共用同一个 Key 时共用一个桶）：
+#   - 优先级：直播要用的写稿 / 搜索 > 预取 > 后台预渲染，排队时高优先级先拿
+#   - 429：读 Retry-After（没有就指数退避 + 随机抖动），整个桶一起冷却，不会所有线程同时重试
+#   - 每日配额：按本地日期计数，写盘保存，重启不清零；最后 20% 只留给直播用
+
+CRITICAL = 0       # 直播马上要播的内容
+PREFETCH = 1       # 提前准备下一条
+BACKGROUND = 2     # 后台预渲染
+PRIORITY_NAMES = {CRITICAL: "critical", PREFETCH: "prefetch", BACKGROUND: "background"}
+
+# rate: 每秒补充的令牌数；burst: 桶容量；daily: 每日调用上限（0 = 不限）
+PROVIDER_LIMITS = {
+    "deepseek": {"rate": 1.0, "burst": 3, "daily": 0},
+    "tavily": {"rate": 0.5, "burst": 5, "daily": 0},
+}
+MAX_RETRIES = 4
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+RESERVE_RATIO = 0.2          # 每日配额最后 20% 只给 CRITICAL
+QUOTA_FILE = "temp/api_quota.json"
+
+_local = threading.local()
+
+
+class QuotaExceeded(RuntimeError):
+    """今日配额已用完；retry_after: 距离配额重置的秒数"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def request_priority(priority):
+    """with request_priority(BACKGROUND): 块内本线程发出的 API 调用都按这个优先级排队"""
+    previous = getattr(_local, "priority", CRITICAL)
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority():
+    return getattr(_local, "priority", CRITICAL)
+
+
+def _seconds_to_midnight():
+    now = time.localtime()
+    return 86400 - (now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec)
+
+
+def _status_code(error):
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+def is_rate_limited(error):
+    return _status_code(error) == 429 or type(error).__name__ in ("RateLimitError", "UsageLimitExceededError")
+
+
+def is_transient(error):
+    """超时 / 连接失败 / 5xx：值得退避后重试"""
+    code = _status_code(error)
+    if isinstance(code, int) and code >= 500:
+        return True
+    return type(error).__name__ in ("APITimeoutError", "APIConnectionError", "TimeoutError",
+                                    "ConnectionError", "ReadTimeout", "ConnectTimeout")
+
+
+def retry_after(error):
+    """从响应头读取 Retry-After（秒）；没有返回 None"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def backoff_delay(attempt):
+    """指数退避 + 全抖动：0 ~ min(上限, 基数 * 2^attempt)"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.cooldown_until = 0.0
+        self._cond = threading.Condition()
+        self._waiting = {CRITICAL: 0, PREFETCH: 0, BACKGROUND: 0}
+        self.waited = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority=CRITICAL):
+        """拿一个令牌，拿不到就排队；返回排队秒数"""
+        started = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    ahead = any(self._waiting[p] for p in self._waiting if p < priority)
+                    if now >= self.cooldown_until and self.tokens >= 1 and not ahead:
+                        self.tokens -= 1
+                        break
+                    wait = max(self.cooldown_until - now, (1 - self.tokens) / self.rate, 0.05)
+                    self._cond.wait(min(wait, 1.0))
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+        waited = time.monotonic() - started
+        self.waited += waited
+        return waited
+
+    def cooldown(self, seconds):
+        """收到 429：整个桶暂停发放令牌"""
+        with self._cond:
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            return {"tokens": round(self.tokens, 2), "rate": self.rate, "burst": self.burst,
+                    "cooldown": round(max(0.0, self.cooldown_until - time.monotonic()), 1),
+                    "waiting": {PRIORITY_NAMES[p]: n for p, n in self._waiting.items()},
+                    "waited": round(self.waited, 1)}
+
+
+class RateScheduler:
+    """
+    scheduler.call("tavily", api_key, client.search, query=..., cost=2)
+    按 服务商 + Key 分桶限速、记每日用量、遇到 429 / 超时自动退避重试
+    """
+
+    def __init__(self, limits=None, quota_file=QUOTA_FILE):
+        self.limits = {name: dict(limit) for name, limit in (limits or PROVIDER_LIMITS).items()}
+        self.quota_file = quota_file
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._usage = self._load_usage()
+        self.retries = 0
+        self.rate_limited = 0
+
+    # --- 配置 ---
+
+    def configure(self, provider, rate=None, burst=None, daily=None):
+        with self._lock:
+            limit = self.limits.setdefault(provider, dict(PROVIDER_LIMITS.get(provider, {"rate": 1.0, "burst": 1,
+                                                                                            "daily": 0})))
+            for key, value in (("rate", rate), ("burst", burst), ("daily", daily)):
+                if value is not None:
+                    limit[key] = value
+            # 已有的桶按新参数重建
+            for (name, key_id) in list(self._buckets):
+                if name == provider:
+                    del self._buckets[(name, key_id)]
+
+    @staticmethod
+    def key_id(api_key):
+        return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+
+    def _bucket(self, provider, key_id):
+        with self._lock:
+            bucket = self._buckets.get((provider, key_id))
+            if bucket is None:
+                limit = self.limits[provider]
+                bucket = self._buckets[(provider, key_id)] = TokenBucket(limit["rate"], limit["burst"])
+            return bucket
+
+    # --- 每日配额 ---
+
+    def _load_usage(self):
+        try:
+            with open(self.quota_file, "r", encoding="utf-8") as f:
+                usage = json.load(f)
+        except (OSError, ValueError):
+            return {"date": time.strftime("%Y-%m-%d"), "counts": {}}
+        if usage.get("date") != time.strftime("%Y-%m-%d"):
+            return {"date": time.strftime("%Y-%m-%d"), "counts": {}}
+        return usage
+
+    def _save_usage(self):
+        try:
+            os.makedirs(os.path.dirname(self.quota_file) or ".", exist_ok=True)
+            tmp = f"{self.quota_file}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._usage, f)
+            os.replace(tmp, self.quota_file)
+        except OSError:
+            pass
+
+    def _reserve(self, provider, key_id, cost, priority):
+        """记账；超出配额抛 QuotaExceeded（后台任务在剩余 20% 时就停手）"""
+        with self._lock:
+            today = time.strftime("%Y-%m-%d")
+            if self._usage["date"] != today:
+                self._usage = {"date": today, "counts": {}}
+            counts = self._usage["counts"]
+            name = f"{provider}:{key_id}"
+            used = counts.get(name, 0)
+            daily = self.limits[provider].get("daily") or 0
+            if daily:
+                limit = daily if priority == CRITICAL else daily * (1 - RESERVE_RATIO)
+                if used + cost > limit:
+                    raise QuotaExceeded(f"{provider} 今日配额已用完 ({used}/{daily})",
+                                        retry_after=_seconds_to_midnight())
+            counts[name] = used + cost
+            self._save_usage()
+
+    def _refund(self, provider, key_id, cost):
+        """被 429 拒掉的请求服务端没有受理，不占配额"""
+        with self._lock:
+            counts = self._usage["counts"]
+            name = f"{provider}:{key_id}"
+            if counts.get(name):
+                counts[name] = max(0, counts[name] - cost)
+                self._save_usage()
+
+    # --- 调用 ---
+
+    def call(self, provider, api_key, fn, *args, cost=1, priority=None, retries=MAX_RETRIES, **kwargs):
+        if priority is None:
+            priority = current_priority()
+        key_id = self.key_id(api_key)
+        bucket = self._bucket(provider, key_id)
+        attempt = 0
+        while True:
+            waited = bucket.acquire(priority)
+            if waited > 5:
+                print(f"⏳ {provider} 限速排队 {waited:.0f}s ({PRIORITY_NAMES[priority]})")
+            self._reserve(provider, key_id, cost, priority)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                limited = is_rate_limited(e)
+                if limited:
+                    self._refund(provider, key_id, cost)
+                if not (limited or is_transient(e)) or attempt >= retries:
+                    raise
+                delay = (retry_after(e) if limited else None) or backoff_delay(attempt)
+                attempt += 1
+                self.retries += 1
+                if limited:
+                    self.rate_limited += 1
+                    bucket.cooldown(delay)
+                print(f"⚠️ {provider} {'触发限流 429' if limited else f'临时错误 {type(e).__name__}'}，"
+                      f"{delay:.1f}s 后重试（第 {attempt}/{retries} 次）")
+                if not limited:
+                    time.sleep(delay)
+
+    def usage(self):
+        with self._lock:
+            counts = dict(self._usage["counts"])
+            buckets = {f"{p}:{k}": b for (p, k), b in self._buckets.items()}
+            daily = {p: limit.get("daily") or 0 for p, limit in self.limits.items()}
+        return {
+            "date": self._usage["date"],
+            "counts": counts,
+            "daily": daily,
+            "buckets": {name: b.stats() for name, b in buckets.items()},
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+        }
+
+
+class RateLimitedSearch:
+    """包一层 TavilyClient：advanced 搜索按 2 次计费"""
+
+    def __init__(self, client, api_key, scheduler=None):
+        self.client = client
+        self.api_key = api_key
+        self.scheduler = scheduler or get_scheduler()
+
+    def search(self, **kwargs):
+        cost = 2 if kwargs.get("search_depth") == "advanced" else 1
+        return self.scheduler.call("tavily", self.api_key, self.client.search, cost=cost, **kwargs)
+
+
+class RateLimitedLLM:
+    """包一层 ChatOpenAI：invoke() 经过调度器"""
+
+    def __init__(self, llm, api_key, scheduler=None):
+        self.llm = llm
+        self.api_key = api_key
+        self.scheduler = scheduler or get_scheduler()
+
+    def invoke(self, *args, **kwargs):
+        return self.scheduler.call("deepseek", self.api_key, self.llm.invoke, *args, **kwargs)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """进程内共享的调度器（所有频道、所有 CryptoBrain 共用）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateScheduler()
+        return _scheduler
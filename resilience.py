@@ -0,0 +1,282 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from rate_limiter import QuotaExceeded, current_priority, request_priority
+from deadline import current_deadline
+
+# 🔥 外部调用的长尾控制
+# 对冲请求：一次调用超过该服务最近的 p95 耗时还没回来，就再发一份一模一样的，谁先回来用谁
+#           （对冲次数有预算，最多占总调用的 10%，不会把慢变成更慢）
+# 熔断器：同一服务连续失败 N 次就断开，之后的调用直接抛 CircuitOpen 走兜底，
+#         不再每次白等 120 秒超时；冷却后放一个探测请求，成功就恢复
+# 开播期限：调用方线程上挂了 deadline 时最多等到期限，超时抛 DeadlineExceeded（请求留在后台自生自灭）
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+WINDOW = 100               # 每个服务保留最近 100 次成功调用的耗时
+MIN_SAMPLES = 10           # 样本不够时用 hedge_default
+HEDGE_WORKERS = 16
+
+# hedge_default / hedge_min 单位秒
+PROVIDER_OPTIONS = {
+    "tavily": {"hedge": True, "hedge_default": 8.0, "hedge_min": 2.0, "hedge_budget": 0.1,
+               "failure_threshold": 5, "reset_timeout": 60},
+    "deepseek": {"hedge": True, "hedge_default": 90.0, "hedge_min": 20.0, "hedge_budget": 0.1,
+                 "failure_threshold": 3, "reset_timeout": 120},
+}
+DEFAULT_OPTIONS = {"hedge": False, "hedge_default": 10.0, "hedge_min": 2.0, "hedge_budget": 0.1,
+                   "failure_threshold": 5, "reset_timeout": 60}
+
+
+class CircuitOpen(RuntimeError):
+    """熔断中：调用方直接走兜底逻辑；retry_after 为距离下次探测的秒数"""
+
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} 熔断中，{retry_after:.0f}s 后重试")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """返回 (是否放行, 距离下次探测的秒数)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True, 0.0
+            remaining = self.opened_at + self.reset_timeout - time.time()
+            if self.state == OPEN and remaining <= 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                # 冷却结束：只放一个探测请求
+                self._probing = True
+                return True, 0.0
+            return False, max(remaining, 1.0)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                print("✅ 熔断恢复")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """探测请求没有真正打到服务（例如本地配额拦截），把探测机会还回去"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        """返回 True 表示这次失败让熔断器断开"""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                tripped = self.state != OPEN
+                self.state = OPEN
+                self.opened_at = time.time()
+                if tripped:
+                    self.trips += 1
+                return tripped
+            return False
+
+
+class Resilience:
+    """
+    resilience.call("tavily", client.search, query=...)
+    按服务商统计耗时、对冲慢请求、熔断连续失败
+    """
+
+    def __init__(self, options=None):
+        self.options = {name: dict(opts) for name, opts in (options or PROVIDER_OPTIONS).items()}
+        self._executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._providers = {}
+
+    def configure(self, provider, **options):
+        """修改某个服务的参数（hedge / hedge_default / hedge_min / hedge_budget / failure_threshold / reset_timeout）"""
+        with self._lock:
+            opts = self.options.setdefault(provider, dict(DEFAULT_OPTIONS))
+            unknown = set(options) - set(DEFAULT_OPTIONS)
+            if unknown:
+                raise ValueError(f"未知的容错参数: {', '.join(sorted(unknown))}")
+            if any(opts.get(k) != v for k, v in options.items()):
+                # 参数有变化才重建（不清空每次启动都会重复下发的同一份配置的统计）
+                opts.update(options)
+                self._providers.pop(provider, None)
+
+    def _state(self, provider):
+        with self._lock:
+            state = self._providers.get(provider)
+            if state is None:
+                opts = self.options.setdefault(provider, dict(DEFAULT_OPTIONS))
+                state = self._providers[provider] = {
+                    "opts": opts,
+                    "breaker": CircuitBreaker(opts["failure_threshold"], opts["reset_timeout"]),
+                    "latency": deque(maxlen=WINDOW),
+                    "calls": 0, "failures": 0, "hedged": 0, "hedge_wins": 0, "short_circuited": 0, "timed_out": 0,
+                }
+            return state
+
+    def hedge_delay(self, provider):
+        state = self._state(provider)
+        opts = state["opts"]
+        with self._lock:
+            samples = list(state["latency"])
+        if len(samples) < MIN_SAMPLES:
+            return opts["hedge_default"]
+        return max(opts["hedge_min"], _percentile(samples, 0.95))
+
+    def _count(self, state, key):
+        # 计数器在调用方线程和对冲线程池里都会改，统一加锁
+        with self._lock:
+            state[key] += 1
+
+    def _take_hedge(self, state):
+        """对冲预算检查和记账放在同一把锁里：并发的慢请求不会一起越过 10% 预算"""
+        opts = state["opts"]
+        with self._lock:
+            if not opts["hedge"] or state["hedged"] >= max(1.0, opts["hedge_budget"] * state["calls"]):
+                return False
+            state["hedged"] += 1
+            return True
+
+    def call(self, provider, fn, *args, **kwargs):
+        state = self._state(provider)
+        breaker = state["breaker"]
+        allowed, retry_after = breaker.allow()
+        if not allowed:
+            self._count(state, "short_circuited")
+            raise CircuitOpen(provider, retry_after)
+        self._count(state, "calls")
+
+        # 线程池里的请求沿用调用方的排队优先级
+        priority = current_priority()
+
+        def attempt():
+            started = time.time()
+            with request_priority(priority):
+                result = fn(*args, **kwargs)
+            # 对冲输掉的那份也计入耗时分布，p95 不会因为只记赢家而越算越低
+            with self._lock:
+                state["latency"].append(time.time() - started)
+            return result
+
+        deadline = current_deadline()
+
+        def give_up():
+            # 超出开播期限：不算服务故障，探测机会还回去
+            self._count(state, "timed_out")
+            breaker.release_probe()
+            return deadline.exceeded_error()
+
+        primary = self._executor.submit(attempt)
+        pending = {primary}
+        hedge_after = self.hedge_delay(provider)
+        remaining = deadline.remaining() if deadline else None
+        done, _ = wait(pending, timeout=hedge_after if remaining is None else min(hedge_after, remaining))
+        if not done and deadline and deadline.expired():
+            raise give_up()
+        if not done and self._take_hedge(state):
+            print(f"⏱️ {provider} 请求超过 p95 ({self.hedge_delay(provider):.1f}s) 未返回，发出对冲请求")
+            pending.add(self._executor.submit(attempt))
+
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining() if deadline else None,
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise give_up()
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    result = future.result()
+                    if future is not primary:
+                        self._count(state, "hedge_wins")
+                    breaker.record_success()
+                    return result
+                last_error = error
+
+        # 配额用完是本地决定的，不算服务故障
+        if isinstance(last_error, QuotaExceeded):
+            breaker.release_probe()
+        else:
+            self._count(state, "failures")
+            if breaker.record_failure():
+                print(f"🔌 {provider} 连续失败 {breaker.failures} 次，熔断 {breaker.reset_timeout}s")
+        raise last_error
+
+    def is_open(self, provider):
+        breaker = self._state(provider)["breaker"]
+        return breaker.state == OPEN and time.time() < breaker.opened_at + breaker.reset_timeout
+
+    def stats(self):
+        with self._lock:
+            providers = {name: (dict(state), list(state["latency"])) for name, state in self._providers.items()}
+        result = {}
+        for name, (state, samples) in providers.items():
+            breaker = state["breaker"]
+            result[name] = {
+                "state": breaker.state,
+                "trips": breaker.trips,
+                "calls": state["calls"],
+                "failures": state["failures"],
+                "short_circuited": state["short_circuited"],
+                "hedged": state["hedged"],
+                "hedge_wins": state["hedge_wins"],
+                "timed_out": state["timed_out"],
+                "p50": round(_percentile(samples, 0.5), 2) if samples else None,
+                "p95": round(_percentile(samples, 0.95), 2) if samples else None,
+                "hedge_after": round(self.hedge_delay(name), 2),
+            }
+        return result
+
+
+class ResilientSearch:
+    def __init__(self, client, resilience=None):
+        self.client = client
+        self.resilience = resilience or get_resilience()
+
+    def search(self, **kwargs):
+        return self.resilience.call("tavily", self.client.search, **kwargs)
+
+
+class ResilientLLM:
+    def __init__(self, llm, resilience=None):
+        self.llm = llm
+        self.resilience = resilience or get_resilience()
+
+    def invoke(self, *args, **kwargs):
+        return self.resilience.call("deepseek", self.llm.invoke, *args, **kwargs)
+
+
+_resilience = None
+_resilience_lock = threading.Lock()
+
+
+def get_resilience():
+    global _resilience
+    with _resilience_lock:
+        if _resilience is None:
+            _resilience = Resilience()
+        return _resilience
@@ -0,0 +1,82 @@
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# 🔥 共享搜索缓存
+# 多个频道跑在同一个进程里时，关键词 / 证据检索经常是同一个查询。
+# 这里按查询参数缓存 Tavily 结果（短 TTL，新闻要新鲜），
+# 同一个查询正在进行时，其他频道直接等这一次的结果，不重复花 API 额度。
+
+SEARCH_TTL = 600          # 10 分钟内的同一查询直接复用
+MAX_ENTRIES = 256
+
+
+class SearchCache:
+    def __init__(self, ttl=SEARCH_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_fetch(self, key, fetch):
+        """命中直接返回副本；未命中调用 fetch()，同一 key 同时只请求一次；失败不缓存"""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and time.time() - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(entry[1])
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # 别的频道正在查同一个，等它查完再看缓存（它失败了就自己查）
+            pending.wait()
+
+        try:
+            result = fetch()
+            with self._lock:
+                self._entries[key] = (time.time(), result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return copy.deepcopy(result)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class CachedSearch:
+    """包一层 TavilyClient：search() 参数和返回值都不变"""
+
+    def __init__(self, client, cache=None):
+        self.client = client
+        self.cache = cache or get_search_cache()
+
+    def search(self, **kwargs):
+        key = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+        return self.cache.get_or_fetch(key, lambda: self.client.search(**kwargs))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SearchCache()
+        return _cache
@@ -1,7 +1,15 @@
 import subprocess
-import edge_tts
 import os
-import json
+import re
+import time
+import asyncio
+from stream_fanout import FanoutRelay, build_output_targets
+from ffmpeg_supervisor import FFmpegSupervisor
+from encoder_pool import LIVE, PREVIEW
+from audio_analysis import analyze_audio, write_wav
+from tts_cache import cache_key, get_tts_cache
+from tts_normalizer import normalize_text, normalize_spans
+from subtitle_engine import boundary_cues, write_cues, subtitle_filter, read_cues, sentence_spans
 
 # 确保临时文件夹存在
 os.makedirs("temp", exist_ok=True)
@@ -9,234 +17,504 @@ os.makedirs("temp", exist_ok=True)
 def optimize_text_for_tts(text):
     """
     🔥 文本预处理 - 让 TTS 更自然
+    数字 / 日期 / 价格 / 百分比转中文读法，常见缩写展开（规则见 tts_normalizer）
     """
-    import re
-    
-    # 1. 数字转中文
-    def num_to_chinese(num_str):
-        num_map = {"0":"零","1":"一","2":"二","3":"三","4":"四",
-                   "5":"五","6":"六","7":"七","8":"八","9":"九"}
-        return ''.join([num_map.get(c, c) for c in num_str])
-    
-    # 简单替换常见数字（避免复杂转换）
-    text = re.sub(r'\b(\d{1,2})\b', lambda m: num_to_chinese(m.group(1)), text)
-    
-    # 2. 常见缩写展开
-    abbreviations = {
-        "BTC": "比特币",
-        "ETH": "以太坊",
-        "AI": "人工智能",
-        "NFT": "恩艾夫提",
-        "DeFi": "去中心化金融",
-        "USD": "美元",
-        "CEO": "首席执行官"
-    }
-    for abbr, full in abbreviations.items():
-        text = text.replace(abbr, full)
-    
-    # 3. 长句拆分（避免一口气读完）
-    # 在句子超过30字时添加停顿标记
-    sentences = re.split(r'([。！？])', text)
-    result = []
+    return normalize_text(text)
+
+# 🔥 TTS 参数：整篇稿子统一音色和韵律，分段合成时每段都用同一套参数
+DEFAULT_VOICE = "zh-CN-XiaoxiaoNeural"
+DEFAULT_RATE = "-5%"
+DEFAULT_PITCH = "+2Hz"
+
+TTS_CHUNK_CHARS = 300     # 每段最多字数（约 1 分钟语音）
+TTS_WORKERS = 4           # 同时合成的段数
+TTS_RETRIES = 3           # 每段失败重试次数
+
+# Edge TTS 固定输出 audio-24khz-48kbitrate-mono-mp3（CBR），字节数可以精确换算成时长
+MP3_BYTES_PER_SECOND = 48000 // 8
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[。！？!?；;])')
+_CLAUSE_SPLIT = re.compile(r'(?<=[，,、：:])')
+
+
+def split_tts_chunks(text, max_chars=TTS_CHUNK_CHARS):
+    """
+    按段落 / 句子边界把稿子切成若干段，每段不超过 max_chars 字
+    只在句末切分，合成出来的每段开头结尾都是自然停顿
+    """
+    chunks = []
     current = ""
-    for s in sentences:
-        current += s
-        if len(current) > 30 and s in ['。', '！', '？']:
-            result.append(current)
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        sentences = [s for s in _SENTENCE_SPLIT.split(paragraph) if s.strip()]
+        for sentence in sentences:
+            # 超长句子再按逗号切
+            pieces = [sentence] if len(sentence) <= max_chars else [c for c in _CLAUSE_SPLIT.split(sentence) if c]
+            for piece in pieces:
+                if current and len(current) + len(piece) > max_chars:
+                    chunks.append(current)
+                    current = ""
+                current += piece
+        # 段落结束处优先断开（段落本身很短时并入下一段，避免碎片）
+        if len(current) >= max_chars // 2:
+            chunks.append(current)
             current = ""
-    if current:
-        result.append(current)
-    
-    return ''.join(result)
+        elif current:
+            current += "\n"
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+async def _synthesize_chunk(index, text, voice, rate, pitch, semaphore, started_at, cache=None):
+    """合成单段语音（先查缓存），失败重试；返回 (音频字节, 报告)"""
+    key = cache_key(text, voice, rate, pitch) if cache else None
+    if cache:
+        hit = cache.get(key)
+        if hit:
+            audio, meta = hit
+            return audio, {
+                "index": index,
+                "chars": len(text),
+                "bytes": len(audio),
+                "duration": len(audio) / MP3_BYTES_PER_SECOND,
+                "boundaries": meta.get("boundaries", []),
+                "attempts": 0,
+                "cached": True,
+                "synth_seconds": 0.0,
+                "ready_at": round(time.time() - started_at, 3),
+            }
+
+    import edge_tts  # 首次合成时才导入（连带 aiohttp），不拖慢页面 / 进程启动
+
+    async with semaphore:
+        last_error = None
+        for attempt in range(1, TTS_RETRIES + 1):
+            t0 = time.time()
+            try:
+                communicate = edge_tts.Communicate(text, voice=voice, rate=rate, pitch=pitch,
+                                                   boundary="WordBoundary")
+                audio = bytearray()
+                boundaries = []
+                async for message in communicate.stream():
+                    if message["type"] == "audio":
+                        audio.extend(message["data"])
+                    elif message["type"] == "WordBoundary":
+                        # offset / duration 单位是 100ns，相对本段音频开头
+                        boundaries.append({
+                            "text": message["text"],
+                            "offset": message["offset"] / 1e7,
+                            "duration": message["duration"] / 1e7,
+                        })
+                if not audio:
+                    raise RuntimeError("未收到音频数据")
+                report = {
+                    "index": index,
+                    "chars": len(text),
+                    "bytes": len(audio),
+                    "duration": len(audio) / MP3_BYTES_PER_SECOND,
+                    "boundaries": boundaries,
+                    "attempts": attempt,
+                    "cached": False,
+                    "synth_seconds": round(time.time() - t0, 3),
+                    "ready_at": round(time.time() - started_at, 3),
+                }
+                if cache:
+                    cache.put(key, bytes(audio), {"text": text, "voice": voice, "rate": rate,
+                                                  "pitch": pitch, "boundaries": boundaries})
+                return bytes(audio), report
+            except Exception as e:
+                last_error = e
+                print(f"⚠️ 第 {index + 1} 段语音合成失败（第 {attempt} 次）: {e}")
+                if attempt < TTS_RETRIES:
+                    await asyncio.sleep(2 ** (attempt - 1))
+        raise RuntimeError(f"第 {index + 1} 段语音合成失败: {last_error}")
+
 
-async def text_to_speech(text, output_file="temp/output.mp3", use_ssml=True):
+async def text_to_speech(text, output_file="temp/output.mp3", use_ssml=True,
+                         voice=DEFAULT_VOICE, rate=DEFAULT_RATE, pitch=DEFAULT_PITCH,
+                         max_workers=TTS_WORKERS, on_chunk=None, srt_path=None, use_cache=True):
     """
     🔥 TTS生成：优化语音自然度
-    使用 SSML 控制语速、停顿、重音
+    长稿按句子 / 段落切分，有限并发合成，每段独立重试，最后按顺序拼接
+    合成时同步收集逐词时间戳；传入 srt_path 时直接写出精确对齐的字幕（.ass 带样式，.srt 纯文本）
+    on_chunk: 每段完成时回调 on_chunk(report)，可用于首段就绪即开播
+    use_cache: 按段查询 / 写入内容寻址语音缓存（文本 + 音色 + 语速 + 音调）
+    返回合成报告：{"path", "duration", "chunks", "cues", "srt_path", "first_chunk_latency", "elapsed"}
     """
-    # 预处理文本
-    text = optimize_text_for_tts(text)
-    
-    if use_ssml:
-        # 🔥 使用 SSML 增强自然度
-        ssml_text = f"""
-        <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis">
-            <voice name="zh-CN-XiaoxiaoNeural">
-                <prosody rate="-5%" pitch="+2Hz">
-                    {text}
-                </prosody>
-            </voice>
-        </speak>
-        """
-        communicate = edge_tts.Communicate(ssml_text, voice="zh-CN-XiaoxiaoNeural")
-    else:
-        # 简单模式
-        communicate = edge_tts.Communicate(
-            text,
-            voice="zh-CN-XiaoxiaoNeural",
-            rate="-5%",
-            pitch="+2Hz"
-        )
-    
-    await communicate.save(output_file)
-    print(f"✅ 语音生成完成: {output_file}")
-    return output_file
+    # 🔥 语速 / 音调通过 prosody 参数下发（Edge TTS 不接受自定义 SSML，
+    # 直接传 SSML 会被当成普通文本朗读），use_ssml 仅为兼容旧调用保留
+    # 先按原文切段，再逐段规范化（数字展开后变长，不影响断句位置）；
+    # 规范化只改读法，字幕仍按原文显示，所以每段留着原文和替换位置
+    sources = split_tts_chunks(text, TTS_CHUNK_CHARS)
+    spoken = [normalize_spans(chunk) for chunk in sources]
+    chunks = [chunk for chunk, _ in spoken]
+    if not chunks:
+        raise ValueError("文本为空，无法合成语音")
 
-def detect_audio_silence(audio_path):
-    """
-    检测音频开头和结尾的静音时长
-    返回 (开头静音, 结尾静音) 单位：秒
-    """
+    started_at = time.time()
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+    cache = get_tts_cache() if use_cache else None
+    tasks = [
+        asyncio.create_task(_synthesize_chunk(i, chunk, voice, rate, pitch, semaphore, started_at, cache))
+        for i, chunk in enumerate(chunks)
+    ]
+
+    reports = []
     try:
-        # 检测开头静音
-        cmd_start = [
-            'ffmpeg', '-i', audio_path,
-            '-af', 'silencedetect=noise=-30dB:d=0.1',
-            '-f', 'null', '-'
-        ]
-        result = subprocess.run(cmd_start, capture_output=True, text=True)
-        
-        # 从输出中解析静音时间
-        import re
-        silence_start = re.search(r'silence_start: (\d+\.\d+)', result.stderr)
-        silence_end = re.search(r'silence_end: (\d+\.\d+)', result.stderr)
-        
-        start_silence = float(silence_start.group(1)) if silence_start else 0.0
-        end_silence = float(silence_end.group(1)) if silence_end else 0.0
-        
-        return start_silence, end_silence
-    except:
-        return 0.0, 0.0
+        for task in asyncio.as_completed(tasks):
+            _, report = await task
+            reports.append(report)
+            if report["cached"]:
+                print(f"♻️ 第 {report['index'] + 1}/{len(chunks)} 段命中缓存: {report['chars']} 字")
+            else:
+                print(f"🗣️ 第 {report['index'] + 1}/{len(chunks)} 段完成: {report['chars']} 字, "
+                      f"{report['synth_seconds']:.1f}s (第 {report['attempts']} 次)")
+            if on_chunk:
+                on_chunk(report)
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    # 按原顺序拼接：同一音色 / 同一编码参数的 MP3 帧可以直接首尾相接，
+    # 切点都在句末停顿处，不会出现爆音
+    with open(output_file, "wb") as f:
+        for task in tasks:
+            audio, _ = task.result()
+            f.write(audio)
+
+    reports.sort(key=lambda r: r["index"])
+
+    # 每段在整条音频里的起点 = 前面各段时长之和（CBR，按字节精确换算）
+    timeline = []
+    base = 0.0
+    for chunk, (_, spans), source, report in zip(chunks, spoken, sources, reports):
+        timeline.append((chunk, base, report.pop("boundaries"), (source, spans)))
+        base += report["duration"]
+    duration = base
+
+    cues = list(boundary_cues(timeline))
+    if srt_path:
+        if cues:
+            write_cues(cues, srt_path)
+            print(f"✅ 字幕按词边界生成: {len(cues)} 行")
+        else:
+            srt_path = None
+            print("⚠️ 未收到词边界事件，需回退到按时长估算字幕")
+
+    elapsed = time.time() - started_at
+    cached = sum(1 for r in reports if r["cached"])
+    print(f"✅ 语音生成完成: {output_file} | {len(chunks)} 段 (缓存命中 {cached}), 时长 {duration:.1f}s, "
+          f"首段 {reports[0]['ready_at']:.1f}s, 总计 {elapsed:.1f}s")
+    return {
+        "path": output_file,
+        "duration": duration,
+        "chunks": reports,
+        "cached_chunks": cached,
+        "cues": cues,
+        "srt_path": srt_path,
+        "first_chunk_latency": reports[0]["ready_at"],
+        "elapsed": round(elapsed, 3),
+    }
 
 def get_audio_duration(audio_path):
     """
-    🔥 获取音频真实时长 + 检测静音偏移
+    🔥 获取音频真实时长 + 开头静音偏移（一次解码，NumPy 计算）
     """
     try:
-        command = [
-            'ffprobe', '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'json',
-            audio_path
-        ]
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        data = json.loads(result.stdout)
-        duration = float(data['format']['duration'])
-        
-        # 检测静音偏移
-        start_silence, _ = detect_audio_silence(audio_path)
-        
-        print(f"✅ 音频时长: {duration:.2f}秒 | 开头静音: {start_silence:.2f}秒")
-        return duration, start_silence
+        analysis = analyze_audio(audio_path)
+        print(f"✅ 音频时长: {analysis['duration']:.2f}秒 | 开头静音: {analysis['lead_silence']:.2f}秒")
+        return analysis["duration"], analysis["lead_silence"]
     except Exception as e:
         print(f"⚠️ 无法获取音频时长: {e}")
         return None, 0.0
 
-def trim_audio_silence(audio_path, output_path=None):
+def prepare_speech_audio(tts_report, output_path):
     """
-    去除音频开头和结尾的静音段
-    确保字幕与实际语音精确对齐
+    🔥 TTS 后处理：解码一次 → 算出首尾静音 → 裁剪后写成无损 WAV
+    字幕时间轴按实际裁掉的采样数平移，保证与语音精确对齐
+    返回 {"path", "duration", "trim_start", "lead_silence", "trail_silence"}；失败时沿用原音频
     """
-    if output_path is None:
-        output_path = audio_path.replace('.mp3', '_trimmed.mp3')
-    
+    audio_path = tts_report["path"]
     try:
-        command = [
-            'ffmpeg', '-y',
-            '-i', audio_path,
-            '-af', 'silenceremove=start_periods=1:start_silence=0.1:start_threshold=-40dB,areverse,silenceremove=start_periods=1:start_silence=0.1:start_threshold=-40dB,areverse',
-            '-acodec', 'libmp3lame',
-            output_path
+        analysis = analyze_audio(audio_path, duration_hint=tts_report.get("duration"))
+        write_wav(analysis["trimmed"], output_path, analysis["sample_rate"])
+    except Exception as e:
+        print(f"⚠️ 音频分析失败，使用原音频: {e}")
+        return {"path": audio_path, "duration": tts_report.get("duration"), "trim_start": 0.0,
+                "lead_silence": 0.0, "trail_silence": 0.0}
+
+    trim_start = analysis["trim_start"]
+    duration = analysis["trim_end"] - trim_start
+    if tts_report.get("srt_path") and tts_report.get("cues"):
+        shifted = [
+            {"start": max(0.0, c["start"] - trim_start), "end": min(duration, c["end"] - trim_start), "text": c["text"]}
+            for c in tts_report["cues"]
+            if c["end"] - trim_start > 0
         ]
+        write_cues(shifted, tts_report["srt_path"])
+        tts_report["cues"] = shifted
+
+    print(f"✅ 音频静音已去除: {output_path} | 时长 {duration:.2f}s "
+          f"(开头 {analysis['lead_silence']:.2f}s / 结尾 {analysis['trail_silence']:.2f}s)")
+    return {
+        "path": output_path,
+        "duration": duration,
+        "trim_start": trim_start,
+        "lead_silence": analysis["lead_silence"],
+        "trail_silence": analysis["trail_silence"],
+    }
+
+# 🔥 广播音轨：无损 WAV 只在这里编码一次 AAC，预览 / 直播 / 存档全部直接复用（-c:a copy）
+BROADCAST_AUDIO_BITRATE = "192k"
+BROADCAST_SAMPLE_RATE = 48000     # YouTube 推荐 48kHz 立体声
+BROADCAST_AUDIO_EXTS = (".m4a", ".aac")
+
+def encode_broadcast_audio(source_path, output_path=None, bitrate=BROADCAST_AUDIO_BITRATE):
+    """
+    把无损语音编码成广播码率的 AAC（整条链路唯一的一次有损编码）
+    失败时返回原路径，下游会自行转码
+    """
+    if output_path is None:
+        output_path = os.path.splitext(source_path)[0] + ".m4a"
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', source_path,
+        '-c:a', 'aac', '-b:a', bitrate,
+        '-ar', str(BROADCAST_SAMPLE_RATE), '-ac', '2',
+        '-movflags', '+faststart',
+        output_path
+    ]
+    try:
         subprocess.run(command, check=True, capture_output=True)
-        print(f"✅ 音频静音已去除: {output_path}")
+        print(f"✅ 广播音轨编码完成: {output_path} (AAC {bitrate})")
         return output_path
     except Exception as e:
-        print(f"⚠️ 去除静音失败，使用原音频: {e}")
-        return audio_path
+        print(f"⚠️ 音轨编码失败，下游将自行转码: {e}")
+        return source_path
+
+def _thread_args(level):
+    """编码器池分配的线程数（0 = x264 自动）"""
+    return ['-threads', str(level["threads"])] if level.get("threads") else []
+
+def _audio_codec_args(audio_path):
+    """已经是广播 AAC 的音轨直接复制，其他格式才转码"""
+    if audio_path and audio_path.lower().endswith(BROADCAST_AUDIO_EXTS):
+        return ['-c:a', 'copy']
+    return ['-c:a', 'aac', '-b:a', BROADCAST_AUDIO_BITRATE]
 
-def create_preview_video(video_path, audio_path, srt_path, output_path="temp/preview_output.mp4"):
+def create_preview_video(video_path, audio_path, srt_path, output_path="temp/preview_output.mp4",
+                         duration=None, on_progress=None, should_abort=None,
+                         name="preview", priority=PREVIEW, threads=0):
     """
     合成预览视频（带硬字幕）- 用于试听模式
+    由 FFmpegSupervisor 守护：实时回报进度，卡死自动重来
+    priority / threads: 编码器池优先级和线程数（后台预渲染传 PRERENDER）
     """
-    # 获取绝对路径，防止FFmpeg找不到文件
-    abs_srt_path = os.path.abspath(srt_path).replace("\\", "/")
-    
-    # 🔥 字幕样式配置 (抖音/TikTok风格)
-    # Fontsize=18: 字号稍大
-    # MarginV=40: 抬高底部边距，绝对不挡脸
-    # Outline=2: 黑色描边，确保在任何背景下都清晰
-    style = "Fontsize=18,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=2,Shadow=0,Alignment=2,MarginV=40"
-    
-    # 构建滤镜字符串 (注意转义)
-    subtitle_filter = f"subtitles='{abs_srt_path}':force_style='{style}'"
+    # 🔥 字幕样式 (抖音/TikTok风格) 见 subtitle_engine：ASS 自带样式，SRT 用 force_style
+    video_filter = subtitle_filter(srt_path)
 
-    command = [
-        'ffmpeg', '-y',
-        '-stream_loop', '-1', '-i', video_path,  # 输入1: 循环背景
-        '-i', audio_path,                        # 输入2: AI语音
-        '-vf', subtitle_filter,                  # 【关键】烧录硬字幕
-        '-map', '0:v', '-map', '1:a',
-        '-c:v', 'libx264', '-c:a', 'aac',
-        '-shortest',                             # 音频播完视频即停
-        '-preset', 'ultrafast',                  # 追求合成速度
-        output_path
-    ]
+    def build(level, resume_at):
+        return [
+            'ffmpeg', '-y',
+            '-stream_loop', '-1', '-i', video_path,  # 输入1: 循环背景
+            '-i', audio_path,                        # 输入2: AI语音
+            '-vf', video_filter,                     # 【关键】烧录硬字幕
+            '-map', '0:v', '-map', '1:a',
+            '-c:v', 'libx264',
+        ] + _thread_args(level) + _audio_codec_args(audio_path) + [
+            '-shortest',                             # 音频播完视频即停
+            '-preset', 'ultrafast',                  # 追求合成速度
+            output_path
+        ]
     
-    try:
-        # 执行命令，捕获输出
-        result = subprocess.run(command, check=True, capture_output=True, text=True)
+    supervisor = FFmpegSupervisor(build, name=name, realtime=False, duration=duration,
+                                  on_progress=on_progress, should_abort=should_abort,
+                                  resumable=False, max_restarts=1, priority=priority, threads=threads)
+    if supervisor.run():
         print(f"✅ 预览视频生成成功: {output_path}")
         return output_path
-    except subprocess.CalledProcessError as e:
-        print(f"❌ 预览生成失败: {e.stderr}")
-        return None
+    print(f"❌ 预览生成失败: {supervisor.last_error}")
+    return None
+
+# 🔥 快速试听（代理渲染）：360p / 12fps / 高 CRF，只为听音色、看字幕节奏
+# 输出分片 MP4（moov 在文件头、每 2 秒一个关键帧分片），文件写到一半也能播，不用等整段编完
+PROXY_HEIGHT = 360
+PROXY_FPS = 12
+PROXY_CRF = 32
+FRAGMENT_SECONDS = 2
+
+
+def preview_window(srt_path, duration, seconds=0, sentences=""):
+    """
+    试听渲染哪一段：返回 (起点秒数, 时长)
+    sentences: "3" 或 "2-4"（第几句，从 1 开始，按字幕里的句末标点划分），优先于 seconds
+    seconds: 只渲染开头 N 秒；都不填渲染整段
+    """
+    if sentences:
+        try:
+            first, _, last = str(sentences).partition("-")
+            first, last = int(first), int(last or first)
+            spans = list(sentence_spans(read_cues(srt_path)))
+            if spans and 1 <= first <= last:
+                chosen = spans[first - 1:last]
+                if chosen:
+                    start = chosen[0]["start"]
+                    return start, chosen[-1]["end"] - start
+            print(f"⚠️ 试听句子范围无效 ({sentences}，共 {len(spans)} 句)，改为按时长截取")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 试听句子范围解析失败 ({sentences}): {e}")
+    if seconds and (not duration or seconds < duration):
+        return 0.0, float(seconds)
+    return 0.0, duration
+
+
+def create_proxy_preview(video_path, audio_path, srt_path, output_path="temp/preview_proxy.mp4",
+                         start=0.0, duration=None, on_progress=None, should_abort=None,
+                         name="preview", priority=PREVIEW, threads=0):
+    """
+    快速试听：低分辨率 + 低帧率代理渲染，可只渲染 start 起 duration 秒
+    字幕按原时间轴烧录（先把画面时间戳平移到 start，烧完再归零），截取中间一段也对得上
+    """
+    shift = start > 0
+    video_filter = (f"fps={PROXY_FPS},scale=-2:{PROXY_HEIGHT},"
+                    + (f"setpts=PTS+{start:.3f}/TB," if shift else "")
+                    + subtitle_filter(srt_path)
+                    + (",setpts=PTS-STARTPTS" if shift else ""))
+    gop = str(PROXY_FPS * FRAGMENT_SECONDS)
+
+    def build(level, resume_at):
+        return [
+            'ffmpeg', '-y',
+            '-stream_loop', '-1', '-i', video_path,
+        ] + (['-ss', f"{start:.3f}"] if shift else []) + [
+            '-i', audio_path,
+            '-vf', video_filter,
+            '-map', '0:v', '-map', '1:a',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', str(PROXY_CRF), '-r', str(PROXY_FPS),
+            '-g', gop, '-keyint_min', gop, '-sc_threshold', '0',
+        ] + _thread_args(level) + _audio_codec_args(audio_path) + (
+            ['-t', f"{duration:.3f}"] if duration else []
+        ) + [
+            '-shortest',
+            '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+            '-f', 'mp4', output_path
+        ]
+
+    supervisor = FFmpegSupervisor(build, name=name, realtime=False, duration=duration,
+                                  on_progress=on_progress, should_abort=should_abort,
+                                  resumable=False, max_restarts=1, priority=priority, threads=threads)
+    if supervisor.run():
+        print(f"✅ 快速试听生成成功: {output_path}")
+        return output_path
+    print(f"❌ 快速试听生成失败: {supervisor.last_error}")
+    return None
 
-def start_stream(stream_key, video_path, audio_path=None, srt_path=None, is_direct_file=False):
+def read_playable_prefix(path):
+    """
+    正在写的分片 MP4：读出到最后一个完整分片为止的字节（ftyp + moov + 完整的 moof/mdat 对）
+    返回 (bytes, 字节数)；还没有完整分片返回 (None, 0)
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None, 0
+    pos = end = 0
+    fragments = 0
+    while pos + 8 <= len(data):
+        size = int.from_bytes(data[pos:pos + 4], "big")
+        kind = data[pos + 4:pos + 8]
+        if size < 8 or pos + size > len(data):
+            break
+        pos += size
+        if kind == b"mdat":
+            end = pos
+            fragments += 1
+    if not fragments:
+        return None, 0
+    return data[:end], end
+
+
+def start_stream(stream_key, video_path, audio_path=None, srt_path=None, is_direct_file=False, outputs=None,
+                 duration=None, on_progress=None, should_abort=None, name="live", threads=0):
     """
     RTMP 推流核心
+    outputs: 额外推流目标（备用 ingest、第二平台、本地录制文件），
+             有多个目标时只编码一次，再分发给所有目标，每路独立失败、独立重连
+    on_progress: 实时进度回调（fps / speed / bitrate / 当前档位）
+    should_abort: 返回 True 时立即停止推流（跳过当前这条 / 服务退出）
+    name / threads: 编码任务名（多频道时区分实时数据和降档记录）和 x264 线程数
+    编码器由 FFmpegSupervisor 守护：卡死或断线自动从断点续播，主机跟不上实时自动降档
     返回值：True 表示推流成功完成，False 表示失败
     """
-    if not stream_key:
+    targets = build_output_targets(stream_key, outputs)
+    if not targets:
         print("❌ 错误：没有推流码")
         return False
 
-    rtmp_url = f"rtmp://a.rtmp.youtube.com/live2/{stream_key}"
+    # 单一目标直接推；多目标编码成 MPEG-TS 交给分发器
+    relay = FanoutRelay(targets) if len(targets) > 1 else None
+    if relay:
+        sink = ['-f', 'mpegts', 'pipe:1']
+    else:
+        sink = ['-f', targets[0]["format"], targets[0]["url"]]
     
     if is_direct_file:
         # === 模式 A：老视频直接推 ===
         print(f"📡 正在推流历史视频文件: {video_path}")
-        command = [
-            'ffmpeg', '-re',
-            '-i', video_path,
-            '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', '3000k',
-            '-c:a', 'aac', '-b:a', '192k',
-            '-f', 'flv', rtmp_url
-        ]
+
+        def build(level, resume_at):
+            command = ['ffmpeg', '-re']
+            if resume_at:
+                command += ['-ss', f'{resume_at:.3f}']
+            return command + [
+                '-i', video_path,
+                '-c:v', 'libx264', '-preset', level["preset"], '-b:v', level["video_bitrate"],
+            ] + _thread_args(level) + [
+                '-c:a', 'aac', '-b:a', '192k',
+            ] + sink
     else:
         # === 模式 B：AI 合成推流 (带字幕) ===
         print("📡 正在推流 AI 生成内容...")
-        abs_srt_path = os.path.abspath(srt_path).replace("\\", "/")
         # 同样的字幕样式
-        style = "Fontsize=18,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=2,Shadow=0,Alignment=2,MarginV=40"
-        subtitle_filter = f"subtitles='{abs_srt_path}':force_style='{style}'"
-        
-        command = [
-            'ffmpeg', '-re',
-            '-stream_loop', '-1', '-i', video_path,
-            '-i', audio_path,
-            '-vf', subtitle_filter, # 烧录字幕
-            '-map', '0:v', '-map', '1:a',
-            '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', '3000k',
-            '-c:a', 'aac', '-b:a', '192k',
-            '-shortest',
-            '-f', 'flv', rtmp_url
-        ]
+        burn_subtitles = subtitle_filter(srt_path)
+
+        def build(level, resume_at):
+            video_filter = burn_subtitles
+            audio_input = ['-i', audio_path]
+            if resume_at:
+                # 断点续播：音频跳到断点，字幕时间轴同步平移
+                video_filter = f"setpts=PTS+{resume_at:.3f}/TB,{burn_subtitles},setpts=PTS-STARTPTS"
+                audio_input = ['-ss', f'{resume_at:.3f}'] + audio_input
+            return [
+                'ffmpeg', '-re',
+                '-stream_loop', '-1', '-i', video_path,
+            ] + audio_input + [
+                '-vf', video_filter, # 烧录字幕
+                '-map', '0:v', '-map', '1:a',
+                '-c:v', 'libx264', '-preset', level["preset"], '-b:v', level["video_bitrate"],
+            ] + _thread_args(level) + _audio_codec_args(audio_path) + [
+                '-shortest',
+            ] + sink
     
-    try:
-        subprocess.run(command, check=True)
+    supervisor = FFmpegSupervisor(
+        build, name=name, realtime=True, duration=duration, priority=LIVE, threads=threads,
+        stdout_handler=relay.pump if relay else None,
+        should_abort=lambda: bool((should_abort and should_abort()) or (relay and relay.all_failed())),
+        on_progress=on_progress,
+    )
+    if relay:
+        relay.start()
+    ok = supervisor.run()
+    if relay:
+        ok = relay.close() and ok
+
+    if ok:
         print("✅ 推流完成")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ 推流发生错误: {e}")
-        return False
+    else:
+        print(f"❌ 推流发生错误: {supervisor.last_error}")
+    return ok
@@ -0,0 +1,245 @@
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+
+# 🔥 一次编码，多路分发（Simulcast）
+# 编码器只跑一份，把 MPEG-TS 写到 stdout；
+# 每个推流目标由一个独立的 ffmpeg 转封装进程（-c copy）负责，几乎不占 CPU。
+# 每一路都有自己的缓冲队列和重连退避，某一路挂掉不会拖垮其他路。
+
+YOUTUBE_RTMP = "rtmp://a.rtmp.youtube.com/live2/{key}"
+
+CHUNK_SIZE = 188 * 348        # 约 64KB，按 TS 包对齐
+QUEUE_CHUNKS = 256            # 每路最多缓冲约 16MB（3Mbps 下约 40 秒）
+STALL_TIMEOUT = 15            # 某一路持续写不进去超过 15 秒，视为半死连接
+MAX_RESTARTS = 10             # 单段内每路最多重连次数
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+FILE_FORMATS = {
+    ".flv": "flv",
+    ".ts": "mpegts",
+    ".mkv": "matroska",
+    ".mp4": "mp4",
+}
+
+
+def guess_format(url):
+    """根据地址推断输出封装格式"""
+    lower = url.lower()
+    if lower.startswith(("rtmp://", "rtmps://")):
+        return "flv"
+    if lower.startswith(("srt://", "udp://", "rtp://")):
+        return "mpegts"
+    ext = os.path.splitext(lower)[1]
+    return FILE_FORMATS.get(ext, "flv")
+
+
+def build_output_targets(stream_key=None, outputs=None):
+    """
+    汇总推流目标列表
+    stream_key: YouTube 推流码（可选），会作为第一路
+    outputs: 额外目标，支持字符串（每行一个或逗号分隔）或列表；
+             每项可以是 URL/本地路径，或 {"url": ..., "format": ...} 字典
+    """
+    targets = []
+    if stream_key:
+        targets.append({"name": "youtube", "url": YOUTUBE_RTMP.format(key=stream_key), "format": "flv"})
+
+    if isinstance(outputs, str):
+        outputs = re.split(r"[\n,]", outputs)
+
+    for item in outputs or []:
+        if isinstance(item, dict):
+            url = (item.get("url") or "").strip()
+            fmt = item.get("format")
+        else:
+            url = (item or "").strip()
+            fmt = None
+        if not url or url.startswith("#"):
+            continue
+        if any(t["url"] == url for t in targets):
+            continue
+        targets.append({
+            "name": f"out{len(targets) + 1}",
+            "url": url,
+            "format": fmt or guess_format(url),
+        })
+    return targets
+
+
+def _is_file_target(url):
+    return "://" not in url
+
+
+class RelayOutput:
+    """
+    单路转发：MPEG-TS (stdin) → -c copy → 目标
+    自己负责重连，失败只影响这一路
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.name = target["name"]
+        self.queue = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.proc = None
+        self.restarts = 0
+        self.bytes_sent = 0
+        self.dropped_chunks = 0
+        self.gave_up = False
+        self._full_since = None
+        self._thread = None
+
+    def _command(self):
+        url = self.target["url"]
+        fmt = self.target["format"]
+        if _is_file_target(url) and self.restarts:
+            # 本地录制：重连后写新分片，避免覆盖前面的内容
+            root, ext = os.path.splitext(url)
+            url = f"{root}.part{self.restarts}{ext}"
+
+        command = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'mpegts', '-i', 'pipe:0',
+            '-map', '0', '-c', 'copy',
+        ]
+        if fmt in ("flv", "mp4"):
+            command += ['-bsf:a', 'aac_adtstoasc']
+        if fmt == "mp4":
+            # 分片 MP4，进程被杀也能播放
+            command += ['-movflags', '+frag_keyframe+empty_moov']
+        if fmt == "flv" and not _is_file_target(url):
+            command += ['-flvflags', 'no_duration_filesize']
+        command += ['-f', fmt, url]
+        return command
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"relay-{self.name}", daemon=True)
+        self._thread.start()
+
+    def feed(self, chunk):
+        """编码器线程调用：非阻塞，队列满就丢包，绝不拖慢编码器"""
+        if self.gave_up:
+            return
+        try:
+            self.queue.put_nowait(chunk)
+            self._full_since = None
+        except queue.Full:
+            self.dropped_chunks += 1
+            now = time.time()
+            if self._full_since is None:
+                self._full_since = now
+            elif now - self._full_since > STALL_TIMEOUT:
+                # 半死的 RTMP 连接：写不进去也不报错，主动杀掉触发重连
+                print(f"⚠️ [{self.name}] 连接卡死 {STALL_TIMEOUT}s，强制重连")
+                self._full_since = None
+                self._kill()
+
+    def close(self, timeout=10):
+        """编码结束：发送结束标记，等待这一路把缓冲写完"""
+        if self.gave_up:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            self._kill()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._thread and self._thread.is_alive():
+            self._kill()
+
+    def _kill(self):
+        proc = self.proc
+        if proc and proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def _drain_queue(self):
+        """重连后丢掉积压的旧数据，直接追到直播最新位置"""
+        try:
+            while True:
+                if self.queue.get_nowait() is None:
+                    return True
+        except queue.Empty:
+            return False
+
+    def _run(self):
+        while True:
+            self.proc = subprocess.Popen(self._command(), stdin=subprocess.PIPE)
+            finished = False
+            try:
+                while True:
+                    chunk = self.queue.get()
+                    if chunk is None:
+                        finished = True
+                        break
+                    self.proc.stdin.write(chunk)
+                    self.bytes_sent += len(chunk)
+                self.proc.stdin.close()
+                self.proc.wait()
+            except (BrokenPipeError, OSError, ValueError):
+                self._kill()
+                self.proc.wait()
+
+            if finished and self.proc.returncode == 0:
+                return
+
+            if finished:
+                print(f"⚠️ [{self.name}] 结束时异常退出 (code={self.proc.returncode})")
+                return
+
+            # 中途掉线：退避后重连
+            if self.restarts >= MAX_RESTARTS:
+                print(f"❌ [{self.name}] 重连 {MAX_RESTARTS} 次仍失败，本段放弃该路")
+                self.gave_up = True
+                self._drain_queue()
+                return
+            self.restarts += 1
+            backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.restarts - 1))
+            print(f"🔄 [{self.name}] 连接断开，{backoff:.0f}s 后第 {self.restarts} 次重连...")
+            time.sleep(backoff)
+            if self._drain_queue():
+                return
+
+
+class FanoutRelay:
+    """
+    编码一次，推给所有目标
+    用法：relay.start() → 编码器 stdout 交给 relay.pump() → relay.close()
+    编码器命令必须以 ['-f', 'mpegts', 'pipe:1'] 结尾
+    """
+
+    def __init__(self, targets):
+        self.outputs = [RelayOutput(t) for t in targets]
+
+    def start(self):
+        for out in self.outputs:
+            out.start()
+        print(f"📡 单路编码 → {len(self.outputs)} 路分发: " + ", ".join(o.name for o in self.outputs))
+
+    def pump(self, stream):
+        """读取编码器输出并分发；编码器重启时会用新的 stdout 再次调用"""
+        while True:
+            chunk = stream.read1(CHUNK_SIZE)
+            if not chunk:
+                return
+            for out in self.outputs:
+                out.feed(chunk)
+
+    def all_failed(self):
+        return all(out.gave_up for out in self.outputs)
+
+    def close(self):
+        """编码结束，等待各路写完；返回是否至少有一路成功"""
+        for out in self.outputs:
+            out.close()
+        for out in self.outputs:
+            status = "❌ 已放弃" if out.gave_up else "✅"
+            print(f"   {status} [{out.name}] 发送 {out.bytes_sent / 1024 / 1024:.1f}MB | "
+                  f"重连 {out.restarts} 次 | 丢弃 {out.dropped_chunks} 块")
+        return any(not out.gave_up for out in self.outputs)
@@ -0,0 +1,280 @@
+import os
+
+from tts_normalizer import source_offset
+
+# 🔥 字幕引擎
+# 断句 / 计时 / 写文件全部是生成器：字符或词边界事件边到边处理，每个字符只看一次，
+# 字幕行算出来就写出去，不在内存里拼整篇字符串。
+# 烧录用 ASS：抖音风格直接写进 [V4+ Styles]，FFmpeg 不用每次带 force_style，
+# libass 也不用逐行解析覆盖样式；SRT 仍保留给存档和外部播放器。
+
+STRONG_PUNCT = "。！？!?;；"
+WEAK_PUNCT = "，,"
+PUNCT = STRONG_PUNCT + WEAK_PUNCT + "、：:"
+MAX_CHARS = 18            # 超过 18 字强制断句
+WEAK_MIN_CHARS = 8        # 逗号处至少攒够 8 字才断
+HOLD_GAP = 1.0            # 两行之间停顿小于 1 秒时，上一行一直显示到下一行出现
+TAIL_HOLD = 0.3           # 长停顿前 / 最后一行多停留 0.3 秒
+
+# 🔥 字幕样式配置 (抖音/TikTok风格)
+# Fontsize=18: 字号稍大
+# MarginV=40: 抬高底部边距，绝对不挡脸
+# Outline=2: 黑色描边，确保在任何背景下都清晰
+FORCE_STYLE = "Fontsize=18,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=2,Shadow=0,Alignment=2,MarginV=40"
+
+# 与 FFmpeg 把 SRT 转成 ASS 时的默认画布一致（384x288），字号 / 边距的观感和原来完全相同
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 384
+PlayResY: 288
+WrapStyle: 0
+ScaledBorderAndShadow: yes
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,18,&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,40,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def srt_time(t):
+    """SRT 时间格式 00:00:00,000"""
+    ms = int(round(t * 1000))
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02}:{m:02}:{s:02},{ms:03}"
+
+
+def ass_time(t):
+    """ASS 时间格式 0:00:00.00（百分之一秒）"""
+    cs = int(round(t * 100))
+    h, cs = divmod(cs, 360000)
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f"{h}:{m:02}:{s:02}.{cs:02}"
+
+
+def _should_break(last_char, length):
+    return (last_char in STRONG_PUNCT
+            or (last_char in WEAK_PUNCT and length >= WEAK_MIN_CHARS)
+            or length >= MAX_CHARS)
+
+
+def segment_text(pieces):
+    """
+    把字符流切成字幕行（生成器）
+    pieces: 字符串或字符串的可迭代对象（可以边到边切）
+    强标点必断；逗号处攒够 WEAK_MIN_CHARS 字才断；满 MAX_CHARS 字强制断
+    """
+    buf = []
+    length = 0
+    for piece in pieces:
+        for char in piece:
+            if char == "\n":
+                char = " "
+            buf.append(char)
+            length += 1
+            if _should_break(char, length):
+                segment = "".join(buf).strip()
+                if segment:
+                    yield segment
+                buf = []
+                length = 0
+    segment = "".join(buf).strip()
+    if segment:
+        yield segment
+
+
+def estimate_cues(text, audio_duration, start_offset=0.0):
+    """
+    没有词边界时的兜底：按字数占比分配时长（生成器）
+    短句至少 1.5 秒、长句至少 2 秒，但不超过剩余时间的平均值
+    """
+    segments = list(segment_text(text))
+    if not segments:
+        return
+    total_chars = sum(len(seg) for seg in segments)
+    start = start_offset
+    for i, seg in enumerate(segments):
+        duration = audio_duration * len(seg) / total_chars
+        min_duration = 1.5 if len(seg) <= 10 else 2.0
+        remaining = audio_duration - (start - start_offset)
+        if remaining > 0:
+            duration = max(min_duration, min(duration, remaining / (len(segments) - i)))
+        else:
+            duration = min_duration
+        yield {"start": start, "end": start + duration, "text": seg}
+        start += duration
+
+
+def _hold(cues):
+    """短停顿时让上一行停留到下一行出现，避免字幕闪烁（只看后一行，边到边输出）"""
+    prev = None
+    for cue in cues:
+        if prev:
+            if cue["start"] - prev["end"] < HOLD_GAP:
+                prev["end"] = cue["start"]
+            else:
+                prev["end"] += TAIL_HOLD
+            yield prev
+        prev = cue
+    if prev:
+        prev["end"] += TAIL_HOLD
+        yield prev
+
+
+def _raw_boundary_cues(chunks):
+    for text, base, boundaries, *display in chunks:
+        # display: (原文, 替换位置)；词边界是读法文本里的词，显示时换回原文（3.5% 而不是 百分之三点五）
+        source, spans = display[0] if display else (text, [])
+        cursor = 0
+        shown = 0
+        current = None
+        length = 0
+        for b in boundaries:
+            word = b["text"]
+            pos = text.find(word, cursor)
+            if pos >= 0:
+                end_pos = pos + len(word)
+                while end_pos < len(text) and text[end_pos] in PUNCT:
+                    end_pos += 1
+                cursor = end_pos
+                # 同一处替换读成好几个词时，原文整段跟着第一个词出现，后面的词只占时间
+                start_at = max(shown, source_offset(spans, pos))
+                shown = max(start_at, source_offset(spans, end_pos, end=True))
+                piece = source[start_at:shown]
+            else:
+                piece = word
+
+            start = base + b["offset"]
+            end = start + b["duration"]
+            if current is None:
+                current = {"start": start, "end": end, "parts": []}
+                length = 0
+            current["parts"].append(piece)
+            current["end"] = end
+            length += len(piece)
+
+            if piece and _should_break(piece[-1:], length):
+                yield current
+                current = None
+        if current:
+            yield current
+
+
+def boundary_cues(chunks):
+    """
+    🔥 用 TTS 的逐词时间戳生成字幕行（生成器，时间精确到词）
+    chunks: 可迭代的 (段落读法文本, 该段在整条音频里的起始秒数, 词边界列表[, (原文, 替换位置)])
+    词边界不带标点，这里按顺序回到原文里定位，把紧跟的标点一起带上，用来断句；
+    带了原文时字幕显示原文（见 tts_normalizer.normalize_spans）
+    逐个产出 {"start", "end", "text"}
+    """
+    def cleaned():
+        for cue in _raw_boundary_cues(chunks):
+            text = "".join(cue.pop("parts")).replace("\n", " ").strip()
+            if text:
+                cue["text"] = text
+                yield cue
+
+    return _hold(cleaned())
+
+
+def write_srt(cues, output_path):
+    """逐行写 SRT，返回行数"""
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for count, cue in enumerate(cues, 1):
+            f.write(f"{count}\n{srt_time(cue['start'])} --> {srt_time(cue['end'])}\n{cue['text']}\n\n")
+    return count
+
+
+def write_ass(cues, output_path):
+    """逐行写 ASS（样式在文件头里定义一次），返回行数"""
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(ASS_HEADER)
+        for count, cue in enumerate(cues, 1):
+            # 花括号在 ASS 里是覆盖标签，换成全角避免被当成样式
+            text = cue["text"].replace("{", "｛").replace("}", "｝").replace("\n", "\\N")
+            f.write(f"Dialogue: 0,{ass_time(cue['start'])},{ass_time(cue['end'])},Default,,0,0,0,,{text}\n")
+    return count
+
+
+def write_cues(cues, output_path):
+    """按扩展名写 .ass 或 .srt，返回行数"""
+    if output_path.lower().endswith(".ass"):
+        return write_ass(cues, output_path)
+    return write_srt(cues, output_path)
+
+
+def _parse_time(t):
+    """ASS 0:00:00.00 / SRT 00:00:00,000 → 秒"""
+    h, m, sec = t.strip().replace(",", ".").split(":")
+    return int(h) * 3600 + int(m) * 60 + float(sec)
+
+
+def read_cues(subtitle_path):
+    """读回 write_cues 写出的 .ass / .srt，逐行产出 {"start", "end", "text"}"""
+    with open(subtitle_path, "r", encoding="utf-8") as f:
+        if subtitle_path.lower().endswith(".ass"):
+            for line in f:
+                if line.startswith("Dialogue:"):
+                    fields = line[len("Dialogue:"):].rstrip("\n").split(",", 9)
+                    yield {"start": _parse_time(fields[1]), "end": _parse_time(fields[2]),
+                           "text": fields[9].replace("\\N", "\n")}
+            return
+        for block in f.read().split("\n\n"):
+            lines = block.strip().splitlines()
+            if len(lines) >= 3 and "-->" in lines[1]:
+                start, end = lines[1].split("-->")
+                yield {"start": _parse_time(start), "end": _parse_time(end), "text": "\n".join(lines[2:])}
+
+
+def sentence_spans(cues):
+    """字幕行按句末标点合并成整句，产出 {"start", "end", "text"}（试听只渲染选中的几句时用）"""
+    sentence = None
+    for cue in cues:
+        if sentence is None:
+            sentence = dict(cue)
+        else:
+            sentence["end"] = cue["end"]
+            sentence["text"] += cue["text"]
+        if cue["text"].rstrip()[-1:] in STRONG_PUNCT:
+            yield sentence
+            sentence = None
+    if sentence:
+        yield sentence
+
+
+def subtitle_filter(subtitle_path):
+    """FFmpeg 烧录字幕的滤镜：ASS 自带样式，SRT 才需要 force_style"""
+    abs_path = os.path.abspath(subtitle_path).replace("\\", "/")
+    if abs_path.lower().endswith(".ass"):
+        return f"subtitles='{abs_path}'"
+    return f"subtitles='{abs_path}':force_style='{FORCE_STYLE}'"
+
+
+def generate_srt(text, audio_duration, output_path, start_offset=0.0):
+    """
+    将长文案切分为字幕（无词边界时的兜底）
+    🔥 核心修复：基于实际音频时长，而非估算语速
+    🔥 新增：起始偏移，解决字幕语音不同步问题
+    output_path 以 .ass 结尾时写带样式的 ASS
+    """
+    total_chars = len(text.strip())
+    if total_chars == 0:
+        print("⚠️ 文本为空，无法生成字幕")
+        return False
+    print(f"📊 字幕同步参数: 总字数={total_chars}, 音频时长={audio_duration:.2f}s, "
+          f"实际语速={total_chars / audio_duration:.2f}字/秒")
+
+    count = write_cues(estimate_cues(text, audio_duration, start_offset), output_path)
+    if count == 0:
+        print("⚠️ 切分后无有效字幕段")
+        return False
+    print(f"✅ 字幕生成完成: {count} 行，总时长 {audio_duration:.2f}s，起始偏移 {start_offset:.2f}s")
+    return True
@@ -176,7 +176,7 @@ def test_subtitle_generation():
     print("=" * 50)
     
     try:
-        from app import generate_srt
+        from subtitle_engine import generate_srt
         
         test_text = "这是第一句话。这是第二句话，稍微长一点。第三句话也来了！最后一句话结束。"
         test_duration = 10.0  # 假设 10 秒
@@ -253,6 +253,468 @@ def test_text_cleaning():
     print()
     return True
 
+def test_text_normalization():
+    """测试 TTS 文本规范化"""
+    print("=" * 50)
+    print("测试 8: TTS 文本规范化测试")
+    print("=" * 50)
+    
+    from tts_normalizer import normalize_text
+    
+    test_cases = [
+        ("2024年5月1日", "二零二四年五月一日"),
+        ("跌幅3.5%", "跌幅百分之三点五"),
+        ("价格$56,000", "价格五万六千美元"),
+        ("流入$1.2B", "流入十二亿美元"),
+        ("回撤-7.2%", "回撤负百分之七点二"),
+        ("BTC和BTCUSDT", "比特币和比特币泰达币"),
+        ("AIR 不是 AI", "AIR 不是 人工智能"),
+        ("第10010名", "第一万零一十名"),
+        ("募资1.2B美元", "募资十二亿美元"),
+        ("3-5天", "三到五天"),
+    ]
+    
+    all_passed = True
+    for input_text, expected in test_cases:
+        result = normalize_text(input_text)
+        if result == expected:
+            print(f"✅ {input_text} → {result}")
+        else:
+            print(f"❌ {input_text} → {result}（期望 {expected}）")
+            all_passed = False
+    
+    # 字幕显示原文：词边界是读法文本里的词，按替换位置换回原文
+    from tts_normalizer import normalize_spans
+    from subtitle_engine import boundary_cues
+    source = "2024年5月1日跌幅3.5%。"
+    spoken, spans = normalize_spans(source)
+    words = ["二零二四年", "五月", "一日", "跌幅", "百分之", "三点五"]
+    boundaries = [{"text": w, "offset": i * 0.5, "duration": 0.4} for i, w in enumerate(words)]
+    shown = "".join(c["text"] for c in boundary_cues([(spoken, 0.0, boundaries, (source, spans))]))
+    if shown == source:
+        print(f"✅ 字幕显示原文: {shown}")
+    else:
+        print(f"❌ 字幕显示: {shown}（期望 {source}）")
+        all_passed = False
+    
+    print()
+    return all_passed
+
+def test_encoder_pool():
+    """测试编码器池优先级：直播不排队，排队时试听渲染先于后台预渲染"""
+    print("=" * 50)
+    print("测试 9: 编码器池优先级测试")
+    print("=" * 50)
+    
+    import threading
+    import time
+    from encoder_pool import EncoderPool, LIVE, PREVIEW, PRERENDER
+    
+    pool = EncoderPool(capacity=2)
+    order = []
+    
+    def job(priority, name):
+        with pool.slot(priority, threads=2, name=name):
+            order.append(name)
+    
+    holder = pool.acquire(PREVIEW, threads=2, name="holder")
+    threads = [threading.Thread(target=job, args=(PRERENDER, "prerender"))]
+    threads[0].start()
+    time.sleep(0.1)
+    threads.append(threading.Thread(target=job, args=(PREVIEW, "preview")))
+    threads[1].start()
+    time.sleep(0.1)
+    # 配额已满，直播照样立即开始
+    job(LIVE, "live")
+    pool.release(holder)
+    for t in threads:
+        t.join(5)
+    
+    all_passed = order == ["live", "preview", "prerender"] and pool.usage()["used"] == 0
+    print(f"{'✅' if all_passed else '❌'} 执行顺序: {order}")
+    
+    print()
+    return all_passed
+
+def test_knowledge_base():
+    """测试知识库：旧 JSON 导入、窗口内不重复抽题、增量保存保留播出记录"""
+    print("=" * 50)
+    print("测试 10: 备用话题知识库测试")
+    print("=" * 50)
+    
+    import json
+    import tempfile
+    from knowledge_base import KnowledgeBase, RECENT_WINDOW
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "knowledge_db.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([f"话题{i}" for i in range(50)], f, ensure_ascii=False)
+        kb = KnowledgeBase(os.path.join(tmp, "knowledge_db.sqlite3"), legacy_json=legacy)
+        
+        picks = [kb.pick() for _ in range(200)]
+        no_repeat = all(p not in picks[max(0, i - RECENT_WINDOW):i] for i, p in enumerate(picks))
+        print(f"{'✅' if no_repeat else '❌'} {RECENT_WINDOW} 次内不重复")
+        
+        kb.mark_aired("话题1")
+        changes = kb.sync(["话题1", "话题2", "新话题"])
+        aired = {r["topic"]: r["air_count"] for r in kb.rows()}
+        incremental = changes == {"added": 1, "removed": 48, "updated": 0} and aired["话题1"] == 1
+        print(f"{'✅' if incremental else '❌'} 增量保存: {changes}")
+        kb.close()
+    
+    all_passed = no_repeat and incremental
+    print()
+    return all_passed
+
+def test_rate_limiter():
+    """测试 API 调度：排队时高优先级先拿令牌；429 不占配额；最后 20% 只留给直播"""
+    print("=" * 50)
+    print("测试 11: API 调度器测试")
+    print("=" * 50)
+    
+    import tempfile
+    import threading
+    import time
+    from rate_limiter import TokenBucket, RateScheduler, QuotaExceeded, CRITICAL, PREFETCH, BACKGROUND
+    
+    bucket = TokenBucket(rate=5, burst=1)
+    bucket.acquire(CRITICAL)
+    order = []
+    
+    def take(priority, name):
+        bucket.acquire(priority)
+        order.append(name)
+    
+    threads = []
+    for priority, name in ((BACKGROUND, "background"), (PREFETCH, "prefetch"), (CRITICAL, "critical")):
+        threads.append(threading.Thread(target=take, args=(priority, name)))
+        threads[-1].start()
+        time.sleep(0.02)
+    for t in threads:
+        t.join(5)
+    ordered = order == ["critical", "prefetch", "background"]
+    print(f"{'✅' if ordered else '❌'} 取令牌顺序: {order}")
+    
+    class Response:
+        headers = {"retry-after-ms": "10"}
+    
+    class RateLimitError(Exception):
+        status_code = 429
+        response = Response()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        scheduler = RateScheduler({"tavily": {"rate": 100, "burst": 10, "daily": 10}},
+                                  quota_file=os.path.join(tmp, "quota.json"))
+        replies = iter([RateLimitError(), RateLimitError(), "ok"])
+        
+        def flaky():
+            reply = next(replies)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        
+        result = scheduler.call("tavily", "key", flaky, cost=2)
+        used = scheduler.usage()["counts"]
+        refunded = result == "ok" and list(used.values()) == [2] and scheduler.rate_limited == 2
+        print(f"{'✅' if refunded else '❌'} 两次 429 后成功只记一次: {used}")
+        
+        # 已用 2，后台再用 6 到 8 = 80% 之后被拒，直播还能用完剩下的
+        scheduler.call("tavily", "key", lambda: None, cost=6, priority=BACKGROUND)
+        try:
+            scheduler.call("tavily", "key", lambda: None, priority=BACKGROUND)
+            reserved = False
+        except QuotaExceeded:
+            reserved = True
+        scheduler.call("tavily", "key", lambda: None, cost=2, priority=CRITICAL)
+        try:
+            scheduler.call("tavily", "key", lambda: None, priority=CRITICAL)
+            reserved = False
+        except QuotaExceeded:
+            pass
+        print(f"{'✅' if reserved else '❌'} 配额预留: {scheduler.usage()['counts']}")
+    
+    all_passed = ordered and refunded and reserved
+    print()
+    return all_passed
+
+def test_resilience():
+    """测试熔断器：连续失败断开 → 冷却后放一个探测 → 探测成功恢复；慢请求按预算对冲"""
+    print("=" * 50)
+    print("测试 12: 熔断 / 对冲测试")
+    print("=" * 50)
+    
+    import time
+    from resilience import Resilience, CircuitOpen, CLOSED, OPEN, HALF_OPEN
+    
+    resilience = Resilience({"svc": {"hedge": False, "hedge_default": 5.0, "hedge_min": 1.0, "hedge_budget": 0.1,
+                                     "failure_threshold": 2, "reset_timeout": 0.2}})
+    
+    def fail():
+        raise ConnectionError("down")
+    
+    states = []
+    for _ in range(2):
+        try:
+            resilience.call("svc", fail)
+        except ConnectionError:
+            pass
+    states.append(resilience.stats()["svc"]["state"])
+    try:
+        resilience.call("svc", lambda: "unreachable")
+        short_circuited = False
+    except CircuitOpen:
+        short_circuited = True
+    time.sleep(0.25)
+    
+    def probe():
+        # 冷却结束后放进来的探测请求：执行期间熔断器处于半开
+        states.append(resilience.stats()["svc"]["state"])
+        return "ok"
+    
+    result = resilience.call("svc", probe)
+    states.append(resilience.stats()["svc"]["state"])
+    transitions = states == [OPEN, HALF_OPEN, CLOSED] and short_circuited and result == "ok"
+    print(f"{'✅' if transitions else '❌'} 状态变化: {states}，熔断中直接拒绝: {short_circuited}")
+    
+    resilience.configure("slow", hedge=True, hedge_default=0.05, hedge_min=0.05, hedge_budget=0.1,
+                         failure_threshold=5, reset_timeout=60)
+    replies = iter([0.5, 0.0])
+    
+    def slow():
+        delay = next(replies)
+        time.sleep(delay)
+        return delay
+    
+    winner = resilience.call("slow", slow)
+    stats = resilience.stats()["slow"]
+    hedged = winner == 0.0 and stats["hedged"] == 1 and stats["hedge_wins"] == 1
+    print(f"{'✅' if hedged else '❌'} 对冲请求先返回: hedged={stats['hedged']}, wins={stats['hedge_wins']}")
+    
+    all_passed = transitions and hedged
+    print()
+    return all_passed
+
+def test_deadline():
+    """测试开播期限：阶段预算和整轮预算取小，超预算的外部调用按期限放弃，没有期限时不限时"""
+    print("=" * 50)
+    print("测试 13: 开播期限测试")
+    print("=" * 50)
+    
+    import time
+    from deadline import Deadline, DeadlineExceeded, stage, time_left
+    from resilience import Resilience
+    
+    resilience = Resilience({"svc": {"hedge": False, "hedge_default": 5.0, "hedge_min": 1.0, "hedge_budget": 0.1,
+                                     "failure_threshold": 5, "reset_timeout": 60}})
+    deadline = Deadline({"total": 5, "search": 0.1, "generation": 0})
+    with deadline.activate():
+        with stage("search"):
+            search_left = time_left()
+            started = time.time()
+            try:
+                resilience.call("svc", time.sleep, 1)
+                error = None
+            except DeadlineExceeded as e:
+                error = e
+            gave_up = time.time() - started
+        with stage("generation"):
+            generation_left = time_left()
+    
+    budgeted = search_left <= 0.1 and 4 < generation_left <= 5
+    print(f"{'✅' if budgeted else '❌'} 剩余时间: search {search_left:.2f}s, generation {generation_left:.2f}s")
+    exceeded = (error is not None and error.stage == "search" and gave_up < 0.5
+                and deadline.report()["exceeded"] == ["search"] and "search" in deadline.report()["spent"])
+    print(f"{'✅' if exceeded else '❌'} 搜索超预算 {gave_up:.2f}s 后放弃: {error}")
+    
+    total = Deadline({"total": 0.05})
+    time.sleep(0.1)
+    try:
+        total.check()
+        expired = False
+    except DeadlineExceeded as e:
+        expired = e.stage == "total"
+    with stage("search") as none:
+        unlimited = none is None and time_left() is None
+    print(f"{'✅' if expired and unlimited else '❌'} 整轮超时: {expired}，无期限时不限时: {unlimited}")
+    
+    all_passed = budgeted and exceeded and expired and unlimited
+    print()
+    return all_passed
+
+def test_journal():
+    """测试播出日志：写到一半的最后一行被忽略，重放恢复未播轮次和计数，追加多了压缩成快照，两个进程共用不丢记录"""
+    print("=" * 50)
+    print("测试 14: 播出日志测试")
+    print("=" * 50)
+    
+    import tempfile
+    from journal import RoundJournal, SCRIPT, READY
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "journal.jsonl")
+        log = RoundJournal(path)
+        log.save_stats({"round": 3, "success": 2, "error": 1})
+        log.checkpoint({"rid": "r1", "prepared_at": 2, "script": "稿子一"}, SCRIPT)
+        log.checkpoint({"rid": "r2", "prepared_at": 1, "audio_path": "a.wav", "events": ["x"]}, READY)
+        log.checkpoint({"rid": "r3", "prepared_at": 3}, READY)
+        log.done("r3")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"op": "done", "rid": "r1"')   # 写到一半被杀
+        
+        replayed = RoundJournal(path)
+        pending = replayed.pending()
+        replay_ok = ([(e["plan"]["rid"], e["stage"]) for e in pending] == [("r2", READY), ("r1", SCRIPT)]
+                     and "events" not in pending[0]["plan"] and replayed.stats()["round"] == 3)
+        print(f"{'✅' if replay_ok else '❌'} 重放: {[(e['plan']['rid'], e['stage']) for e in pending]}")
+        
+        compacting = RoundJournal(path, compact_every=10)
+        for i in range(25):
+            compacting.save_stats({"round": 4 + i})
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        reopened = RoundJournal(path)
+        compact_ok = (len(lines) < 10 and reopened.stats()["round"] == 28
+                      and [e["plan"]["rid"] for e in reopened.pending()] == ["r2", "r1"])
+        print(f"{'✅' if compact_ok else '❌'} 压缩后 {len(lines)} 行，计数 {reopened.stats()}")
+        
+        # 页面和守护进程写同一份日志：一方压缩时不能丢掉另一方追加的记录
+        first, second = RoundJournal(path, compact_every=2), RoundJournal(path)
+        second.checkpoint({"rid": "r4", "prepared_at": 4}, SCRIPT)
+        first.checkpoint({"rid": "r5", "prepared_at": 5}, SCRIPT)
+        first.done("r1")
+        shared = [e["plan"]["rid"] for e in RoundJournal(path).pending()]
+        shared_ok = shared == ["r2", "r4", "r5"]
+        print(f"{'✅' if shared_ok else '❌'} 两个进程共用: {shared}")
+    
+    all_passed = replay_ok and compact_ok and shared_ok
+    print()
+    return all_passed
+
+def test_batch_farm_config():
+    """测试批量工厂入口：只用环境变量配 Key 时其余设置取直播默认值，不因缺项崩溃"""
+    print("=" * 50)
+    print("测试 15: 批量工厂配置测试")
+    print("=" * 50)
+    
+    import signal
+    import tempfile
+    import batch_farm
+    from pipeline import DEFAULT_CONFIG
+    
+    captured = {}
+    
+    class FakeBrain:
+        def __init__(self, deepseek_key, tavily_key, topic, persona, history, domains, channel=None):
+            captured.update(topic=topic, persona=persona, domains=domains)
+    
+    class FakeFarm:
+        def __init__(self, brain, background, voice, archive_dir, workers, threads):
+            captured.update(voice=voice, archive_dir=archive_dir)
+            self.manifest_path = "manifest.json"
+        
+        def topic_jobs(self, topics):
+            return list(topics)
+        
+        def run(self, jobs):
+            return {"counts": {"done": len(jobs)}, "episodes": jobs, "elapsed": 0, "overlap": None}
+        
+        def stop(self):
+            pass
+    
+    patched = {"CryptoBrain": FakeBrain, "BatchFarm": FakeFarm, "prepare_background": lambda path: path}
+    originals = {name: getattr(batch_farm, name) for name in patched}
+    handlers = {s: signal.getsignal(s) for s in (signal.SIGTERM, signal.SIGINT)}
+    environ = {k: os.environ.get(k) for k in ("DEEPSEEK_API_KEY", "BACKGROUND_VIDEO")}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            os.chdir(tmp)
+            os.environ["DEEPSEEK_API_KEY"] = "sk-test"
+            os.environ.pop("BACKGROUND_VIDEO", None)
+            # 默认背景视频不存在：正常报错退出，而不是 KeyError
+            missing = batch_farm.main(["--topic", "比特币"])
+            
+            os.environ["BACKGROUND_VIDEO"] = os.path.join(tmp, "bg.mp4")
+            open(os.environ["BACKGROUND_VIDEO"], "wb").close()
+            for name, value in patched.items():
+                setattr(batch_farm, name, value)
+            finished = batch_farm.main(["--topic", "比特币"])
+        finally:
+            os.chdir(cwd)
+            for name, value in originals.items():
+                setattr(batch_farm, name, value)
+            for s, handler in handlers.items():
+                signal.signal(s, handler)
+            for k, v in environ.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+    
+    defaults = captured.get("persona") == DEFAULT_CONFIG["persona"] and captured.get("voice") == DEFAULT_CONFIG["voice"]
+    all_passed = missing == 2 and finished == 0 and defaults
+    print(f"{'✅' if all_passed else '❌'} 缺背景返回 {missing}，补齐后返回 {finished}，默认值生效: {defaults}")
+    
+    print()
+    return all_passed
+
+def test_control_api():
+    """测试控制接口：路由和按频道筛选、整组校验不合法时不排队、令牌错误返回 401"""
+    print("=" * 50)
+    print("测试 16: 控制接口测试")
+    print("=" * 50)
+    
+    from control_api import ControlServer, ControlError, control_request
+    from pipeline import BroadcastPipeline
+    
+    pipelines = {name: BroadcastPipeline({"channel": name}) for name in ("cn", "sol")}
+    server = ControlServer(pipelines, 0, token="secret")
+    
+    def status_of(method, path, query=None, body=None):
+        try:
+            return server.handle(method, path, query or {}, body)[0]
+        except ControlError as e:
+            return e.status
+    
+    status, payload = server.handle("POST", "/config", {"channel": ["cn"]}, {"voice": "zh-CN-YunxiNeural", "interval": 90.0})
+    queued = (status == 202 and pipelines["cn"].pending_config == {"voice": "zh-CN-YunxiNeural", "interval": 90}
+              and not pipelines["sol"].pending_config and list(payload) == ["cn"])
+    print(f"{'✅' if queued else '❌'} 只改 cn 频道: {pipelines['cn'].pending_config}")
+    
+    codes = {
+        "unknown_key": status_of("POST", "/config", body={"voice": "zh-CN-YunxiNeural", "yt_key": "x"}),
+        "bad_type": status_of("POST", "/config", body={"interval": "fast"}),
+        "empty": status_of("POST", "/config", body={}),
+        "no_channel": status_of("GET", "/status", {"channel": ["btc"]}),
+        "no_route": status_of("GET", "/nothing"),
+        "not_ready": status_of("POST", "/topics", body={"topics": ["话题"]}),
+        "bad_command": status_of("POST", "/command", body={"command": "reboot"}),
+        "pause": status_of("POST", "/command", body={"command": "pause"}),
+    }
+    expected = {"unknown_key": 400, "bad_type": 400, "empty": 400, "no_channel": 404, "no_route": 404,
+                "not_ready": 409, "bad_command": 400, "pause": 200}
+    validated = (codes == expected and not pipelines["sol"].pending_config
+                 and all(p.paused for p in pipelines.values()))
+    print(f"{'✅' if validated else '❌'} 状态码: {codes}")
+    
+    server.start()
+    try:
+        try:
+            control_request(server.url, "/status")
+            unauthorized = False
+        except RuntimeError as e:
+            unauthorized = str(e) == "令牌错误"
+        status = control_request(server.url, "/status?channel=sol", token="secret")
+        authorized = list(status) == ["sol"] and status["sol"]["paused"] is True
+    finally:
+        server.stop()
+    print(f"{'✅' if unauthorized and authorized else '❌'} 无令牌被拒: {unauthorized}，带令牌可用: {authorized}")
+    
+    all_passed = queued and validated and unauthorized and authorized
+    print()
+    return all_passed
+
 def main():
     """运行所有测试"""
     print("\n" + "=" * 50)
@@ -268,6 +730,15 @@ def main():
     results.append(("目录结构", test_directories()))
     results.append(("FFmpeg 工具", test_ffmpeg()))
     results.append(("文本清洗", test_text_cleaning()))
+    results.append(("文本规范化", test_text_normalization()))
+    results.append(("编码器池", test_encoder_pool()))
+    results.append(("知识库", test_knowledge_base()))
+    results.append(("API 调度", test_rate_limiter()))
+    results.append(("熔断对冲", test_resilience()))
+    results.append(("开播期限", test_deadline()))
+    results.append(("播出日志", test_journal()))
+    results.append(("批量工厂配置", test_batch_farm_config()))
+    results.append(("控制接口", test_control_api()))
     
     # 异步测试
     try:
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+# 🔥 语音内容寻址缓存
+# key = hash(预处理后的文本 + 音色 + 语速 + 音调)，按 TTS 分段粒度存储，
+# 稿子只改了几句时，其余段落直接复用；备用话题、固定开场白、重播稿件不再重复合成。
+# 总大小有上限，超出后按最近使用时间（LRU）淘汰。
+
+CACHE_DIR = "cache/tts"
+MAX_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 1            # 文本预处理或输出格式变化时加一，旧缓存自动失效
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def cache_key(text, voice, rate, pitch):
+    normalized = _WHITESPACE.sub(" ", text).strip()
+    raw = f"v{CACHE_VERSION}|{voice}|{rate}|{pitch}|{normalized}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    每条缓存两个文件：{key}.mp3（音频）+ {key}.json（词边界等元数据）
+    文件 mtime 记录最近使用时间，命中时刷新
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".mp3", base + ".json"
+
+    def get(self, key):
+        """命中返回 (音频字节, 元数据)，未命中返回 None"""
+        audio_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(audio_path, "rb") as f:
+                audio = f.read()
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        now = time.time()
+        for path in (audio_path, meta_path):
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        self.hits += 1
+        return audio, meta
+
+    def put(self, key, audio, meta):
+        audio_path, meta_path = self._paths(key)
+        try:
+            # 先写临时文件再改名，进程中途被杀也不会留下半个缓存
+            for path, data, mode in ((audio_path, audio, "wb"), (meta_path, meta, "w")):
+                tmp = f"{path}.{os.getpid()}.tmp"
+                if mode == "wb":
+                    with open(tmp, "wb") as f:
+                        f.write(data)
+                else:
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ 语音缓存写入失败: {e}")
+            return
+
+        with self._lock:
+            if self._total is not None:
+                self._total += len(audio) + os.path.getsize(meta_path)
+            self._evict()
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".mp3"):
+                continue
+            audio_path = os.path.join(self.cache_dir, name)
+            meta_path = audio_path[:-4] + ".json"
+            try:
+                size = os.path.getsize(audio_path)
+                if os.path.exists(meta_path):
+                    size += os.path.getsize(meta_path)
+                entries.append((os.path.getmtime(audio_path), size, audio_path, meta_path))
+            except OSError:
+                continue
+        return entries
+
+    def _evict(self):
+        """超出上限时按最近使用时间淘汰，淘汰到上限的 90%"""
+        if self._total is None:
+            self._total = sum(e[1] for e in self._scan())
+        if self._total <= self.max_bytes:
+            return
+        entries = sorted(self._scan())
+        self._total = sum(e[1] for e in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, audio_path, meta_path in entries:
+            if self._total <= target:
+                break
+            for path in (audio_path, meta_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total -= size
+            removed += 1
+        print(f"🧹 语音缓存淘汰 {removed} 条，当前 {self._total / 1024 / 1024:.0f}MB")
+
+    def stats(self):
+        with self._lock:
+            if self._total is None:
+                self._total = sum(e[1] for e in self._scan())
+            return {"hits": self.hits, "misses": self.misses, "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_tts_cache():
+    """全局共享的缓存实例"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = TTSCache()
+        return _default_cache
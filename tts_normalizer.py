@@ -0,0 +1,250 @@
+import re
+from bisect import bisect_right
+from decimal import Decimal
+from functools import lru_cache
+
+# 🔥 TTS 文本规范化
+# 所有规则在导入时编译一次：一个正则分词器按出现顺序扫描数字 / 日期 / 价格 / 百分比 / 英文词，
+# 英文缩写用前缀树做最长匹配（BTCUSDT → 比特币 + 泰达币），
+# 数字按中文读法展开（2024年 → 二零二四年，3.5% → 百分之三点五，$1.2B → 十二亿美元，3-5天 → 三到五天）。
+# 每个字符只扫描一遍；规范化只改读法，normalize_spans 同时记下每处替换在原文里的位置，
+# 字幕按词边界回到原文取字，屏幕上仍显示 2024年5月1日 / 3.5% / $56,000。
+
+ABBREVIATIONS = {
+    "BTC": "比特币",
+    "ETH": "以太坊",
+    "SOL": "索拉纳",
+    "BNB": "币安币",
+    "USDT": "泰达币",
+    "USDC": "美元稳定币",
+    "AI": "人工智能",
+    "NFT": "恩艾夫提",
+    "DeFi": "去中心化金融",
+    "DAO": "道",
+    "DEX": "去中心化交易所",
+    "CEX": "中心化交易所",
+    "ETF": "一踢艾夫",
+    "SEC": "美国证监会",
+    "USD": "美元",
+    "CEO": "首席执行官",
+}
+
+DIGITS = "零一二三四五六七八九"
+SMALL_UNITS = ["", "十", "百", "千"]
+BIG_UNITS = ["", "万", "亿", "万亿"]
+MAX_READ_AS_NUMBER = 10 ** 16        # 更长的数字串（订单号、地址片段）逐位读
+
+CURRENCY_PREFIX = {"$": "美元", "¥": "元", "￥": "元", "€": "欧元", "£": "英镑"}
+MAGNITUDE_SUFFIX = {"K": 10 ** 3, "k": 10 ** 3, "M": 10 ** 6, "B": 10 ** 9, "T": 10 ** 12}
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+
+_TOKEN = re.compile(
+    rf"(?=[\d$¥￥€£A-Za-z-])"      # 先看首字符，中文字符直接跳过，不逐个尝试每条规则
+    rf"(?:(?P<date>(?P<y>\d{{4}})(?:年(?P<m1>\d{{1,2}})月(?:(?P<d1>\d{{1,2}})[日号])?|[-/](?P<m2>\d{{1,2}})[-/](?P<d2>\d{{1,2}})(?!\d)))"
+    rf"|(?P<year>\d{{4}})(?=年)"
+    rf"|(?P<price>(?P<cur>[$¥￥€£])(?P<pnum>{_NUMBER})(?P<mag>[KkMBT](?![A-Za-z]))?)"
+    rf"|(?P<range>(?P<lo>{_NUMBER})(?P<lopct>%)?\s*[-~～–—]\s*(?P<hi>{_NUMBER})(?P<hipct>%)?(?![-/\d]))"
+    rf"|(?P<percent>(?P<psign>(?<![A-Za-z0-9.])-)?(?P<pct>{_NUMBER})%)"
+    rf"|(?P<number>(?P<sign>(?<![A-Za-z0-9.])-)?(?P<num>{_NUMBER})(?P<nmag>[KkMBT](?![A-Za-z]))?)"
+    rf"|(?P<word>[A-Za-z][A-Za-z0-9]*))"
+)
+
+# --- 前缀树 ---
+
+def _build_trie(words):
+    root = {}
+    for word, reading in words.items():
+        node = root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[None] = reading
+    return root
+
+
+_ABBR_TRIE = _build_trie(ABBREVIATIONS)
+
+
+@lru_cache(maxsize=4096)
+def _segment_word(word):
+    """
+    整个英文词能被缩写完整覆盖时才替换（BTCUSDT → 比特币泰达币），
+    否则原样保留（AIR 不会被读成"人工智能R"）
+    """
+    n = len(word)
+    # best[i]: word[i:] 的切分读法；从后往前做一遍，每个位置取最长匹配优先
+    best = [None] * n + [""]
+    for start in range(n - 1, -1, -1):
+        node = _ABBR_TRIE
+        i = start
+        while i < n and word[i] in node:
+            node = node[word[i]]
+            i += 1
+            if None in node and best[i] is not None:
+                best[start] = node[None] + best[i]
+    return best[0] if best[0] is not None else word
+
+
+# --- 数字读法 ---
+
+def _read_group(n, leading):
+    """
+    读 1-9999；leading 表示整个数字的最高一组：
+    最高组 10-19 读"十几"（不读"一十几"），最高位的 2 在百 / 千前读"两"
+    """
+    digits = f"{n:04d}"
+    out = []
+    zero = False
+    for pos, ch in enumerate(digits):
+        d = int(ch)
+        unit = SMALL_UNITS[3 - pos]
+        if d == 0:
+            zero = bool(out)
+            continue
+        if zero:
+            out.append("零")
+            zero = False
+        if leading and not out and d == 1 and unit == "十":
+            out.append("十")
+        elif leading and not out and d == 2 and unit in ("百", "千"):
+            out.append("两" + unit)
+        else:
+            out.append(DIGITS[d] + unit)
+    return "".join(out)
+
+
+@lru_cache(maxsize=4096)
+def read_integer(n):
+    """整数的中文读法：12345 → 一万二千三百四十五，20000 → 两万"""
+    if n == 0:
+        return "零"
+    if n >= MAX_READ_AS_NUMBER:
+        return read_digits(str(n))
+    groups = []
+    while n:
+        groups.append(n % 10000)
+        n //= 10000
+    out = []
+    gap = False
+    for i in range(len(groups) - 1, -1, -1):
+        group = groups[i]
+        if group == 0:
+            gap = True
+            continue
+        leading = not out
+        if not leading and (gap or group < 1000):
+            out.append("零")
+        if leading and group == 2 and i > 0:
+            text = "两"
+        else:
+            text = _read_group(group, leading)
+        out.append(text + BIG_UNITS[i])
+        gap = False
+    return "".join(out)
+
+
+def read_digits(s):
+    """逐位读：2024 → 二零二四"""
+    return "".join(DIGITS[int(c)] if c.isdigit() else c for c in s)
+
+
+@lru_cache(maxsize=4096)
+def read_number(s):
+    """读整数或小数（可带千分位逗号）：1,234.56 → 一千二百三十四点五六"""
+    s = s.replace(",", "")
+    integer, _, fraction = s.partition(".")
+    if len(integer) > 1 and integer.startswith("0"):
+        return read_digits(s).replace(".", "点")
+    text = read_integer(int(integer))
+    if fraction:
+        text += "点" + read_digits(fraction)
+    return text
+
+
+def _read_magnitude(s, magnitude):
+    """$1.2B → 十二亿：把 K/M/B/T 乘进去，再按整数或小数读"""
+    value = Decimal(s.replace(",", "")) * magnitude
+    if value == value.to_integral_value():
+        return read_integer(int(value))
+    return read_number(format(value.normalize(), "f"))
+
+
+def _replace(match):
+    kind = match.lastgroup
+    if kind == "word":
+        return _segment_word(match.group("word"))
+    if kind == "number":
+        sign = "负" if match.group("sign") else ""
+        magnitude = match.group("nmag")
+        number = match.group("num")
+        return sign + (_read_magnitude(number, MAGNITUDE_SUFFIX[magnitude]) if magnitude else read_number(number))
+    if kind == "range":
+        # 3-5天 → 三到五天；2024-2025年 逐位读；3%-5% → 百分之三到百分之五
+        lo, hi = match.group("lo"), match.group("hi")
+        if len(lo) == len(hi) == 4 and match.string.startswith("年", match.end()):
+            return f"{read_digits(lo)}到{read_digits(hi)}"
+        if match.group("lopct") or match.group("hipct"):
+            return f"百分之{read_number(lo)}到百分之{read_number(hi)}"
+        return f"{read_number(lo)}到{read_number(hi)}"
+    if kind == "percent":
+        sign = "负" if match.group("psign") else ""
+        return f"{sign}百分之{read_number(match.group('pct'))}"
+    if kind == "price":
+        number = match.group("pnum")
+        magnitude = match.group("mag")
+        text = _read_magnitude(number, MAGNITUDE_SUFFIX[magnitude]) if magnitude else read_number(number)
+        return text + CURRENCY_PREFIX[match.group("cur")]
+    if kind == "year":
+        return read_digits(match.group("year"))
+    # 日期
+    month = match.group("m1") or match.group("m2")
+    day = match.group("d1") or match.group("d2")
+    text = f"{read_digits(match.group('y'))}年{read_integer(int(month))}月"
+    if day:
+        text += f"{read_integer(int(day))}{'号' if match.group(0).endswith('号') else '日'}"
+    return text
+
+
+def normalize_text(text):
+    """规范化整段文本（一次正则扫描）"""
+    return _TOKEN.sub(_replace, text)
+
+
+def normalize_spans(text):
+    """
+    规范化并记录替换位置（一次正则扫描）
+    返回 (读法文本, spans)，spans: [(读法起点, 读法终点, 原文起点, 原文终点), ...]，只含改动过的片段
+    """
+    out = []
+    spans = []
+    last = 0
+    length = 0
+    for match in _TOKEN.finditer(text):
+        reading = _replace(match)
+        if reading == match.group(0):
+            continue
+        plain = text[last:match.start()]
+        out.append(plain)
+        length += len(plain)
+        spans.append((length, length + len(reading), match.start(), match.end()))
+        out.append(reading)
+        length += len(reading)
+        last = match.end()
+    out.append(text[last:])
+    return "".join(out), spans
+
+
+def source_offset(spans, pos, end=False):
+    """
+    读法文本里的位置 → 原文位置
+    落在某处替换中间时：起点对到原文片段开头，终点对到原文片段结尾（整段原文跟着第一个词出现）
+    """
+    i = bisect_right(spans, (pos, float("inf"))) - 1
+    if i >= 0:
+        spoken_start, spoken_end, src_start, src_end = spans[i]
+        if pos < spoken_end:
+            if pos == spoken_start:
+                return src_start
+            return src_end if end else src_start
+        return src_end + (pos - spoken_end)
+    return pos